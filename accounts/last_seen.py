@@ -0,0 +1,96 @@
+"""
+buffered last-seen tracking.
+
+requests only record a coarsened timestamp in a redis hash, at most once per
+user and LAST_SEEN_GRANULARITY seconds. the flush_last_seen task writes the
+hash back to CustomUser with one bulk UPDATE.
+"""
+
+import time
+import uuid
+from datetime import datetime, timezone
+
+import redis
+from django.conf import settings
+from loguru import logger
+
+from accounts.models import CustomUser
+from helpers.redis import get_async_redis, get_redis
+
+REDIS_KEY = "accounts:last_seen"
+# users already recorded in the current bucket by this process
+_recorded = {}
+_RECORDED_LIMIT = 10000
+
+
+def bucket(now=None):
+    granularity = settings.LAST_SEEN_GRANULARITY
+    now = time.time() if now is None else now
+    return int(now // granularity * granularity)
+
+
+def _remember(user_id, current):
+    if len(_recorded) >= _RECORDED_LIMIT:
+        _recorded.clear()
+    _recorded[user_id] = current
+
+
+def touch(user_id, now=None):
+    current = bucket(now)
+    if _recorded.get(user_id) == current:
+        return
+    try:
+        get_redis().hset(REDIS_KEY, user_id, current)
+    except Exception as e:
+        logger.warning("=== [LAST SEEN] could not record user {}: {}", user_id, e)
+        return
+    _remember(user_id, current)
+
+
+async def atouch(user_id, now=None):
+    current = bucket(now)
+    if _recorded.get(user_id) == current:
+        return
+    try:
+        await get_async_redis().hset(REDIS_KEY, user_id, current)
+    except Exception as e:
+        logger.warning("=== [LAST SEEN] could not record user {}: {}", user_id, e)
+        return
+    _remember(user_id, current)
+
+
+def flush(batch_size=500):
+    """
+    move the buffered timestamps to the database, returns the number of users
+    updated
+    """
+    client = get_redis()
+    flushing = f"{REDIS_KEY}:flushing:{uuid.uuid4().hex}"
+    try:
+        # requests keep writing to a fresh hash while this one is flushed
+        client.rename(REDIS_KEY, flushing)
+    except redis.ResponseError:
+        # nothing buffered
+        return 0
+
+    seen = {}
+    try:
+        seen = client.hgetall(flushing)
+        users = [
+            CustomUser(
+                id=int(user_id),
+                last_seen=datetime.fromtimestamp(int(timestamp), tz=timezone.utc),
+            )
+            for user_id, timestamp in seen.items()
+        ]
+        CustomUser.objects.bulk_update(users, ["last_seen"], batch_size=batch_size)
+    except Exception:
+        # put them back without overwriting anything newer
+        pipe = client.pipeline()
+        for user_id, timestamp in seen.items():
+            pipe.hsetnx(REDIS_KEY, user_id, timestamp)
+        pipe.execute()
+        raise
+    finally:
+        client.delete(flushing)
+    return len(users)
@@ -1,35 +1,67 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.http import HttpRequest
-from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, empty
+
+from accounts import last_seen
 
 # import datetime
 
 # from .models import UserAccount
 
 
-class UserLastSeenMiddleware:
+class HybridMiddleware:
+    """
+    runs in whichever mode the middleware chain is in, so async views are
+    not switched to a thread and back for it. subclasses implement
+    __call__ and __acall__.
+    """
+
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
-        # One-time configuration and initialization.
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
+
+class UserLastSeenMiddleware(HybridMiddleware):
     def __call__(self, request: HttpRequest):
-        # Code to be executed for each request before
-        # the view (and later middleware) are called.
-        if request.user.is_authenticated:
-            request.user.last_seen = timezone.now()
-            request.user.save()
+        if self.async_mode:
+            return self.__acall__(request)
         response = self.get_response(request)
 
-        # Code to be executed for each request/response after
-        # the view is called.
+        # checked after the view so users authenticated by DRF (JWT) count
+        # too. the timestamp is buffered and written by flush_last_seen.
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            last_seen.touch(user.pk)
         return response
 
+    async def __acall__(self, request: HttpRequest):
+        response = await self.get_response(request)
+
+        user = getattr(request, "user", None)
+        if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+            # the view never looked at the session user, load it off the loop
+            user = await request.auser()
+        if user is not None and user.is_authenticated:
+            await last_seen.atouch(user.pk)
+        return response
 
-class CustomCorsMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
 
+class CustomCorsMiddleware(HybridMiddleware):
     def __call__(self, request):
-        response = self.get_response(request)
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.cors(self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.cors(await self.get_response(request))
+
+    @staticmethod
+    def cors(response):
         response["Access-Control-Allow-Origin"] = "*"
         response["Access-Control-Allow-Headers"] = "*"
         return response
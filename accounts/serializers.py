@@ -1,6 +1,7 @@
 from django.http import HttpRequest
 from rest_framework import serializers
 
+from helpers import audit
 from helpers.access_guradian import log_access_guardian
 from .models import (
     CustomUser,
@@ -16,7 +17,6 @@ from django.core.exceptions import ObjectDoesNotExist
 from accounts.tasks import generic_send_mail
 from phonenumber_field.serializerfields import PhoneNumberField
 from django.core.cache import cache
-import user_agents
 from t24.t24_requests import T24Requests
 from .tasks import count_visit
 from loguru import logger
@@ -148,27 +148,12 @@ class CustomLoginSerializer(LoginSerializer):
         return ip
 
     def log_access_guardian(self, request, log_type, phone_number=""):
-        try:
-            x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-            user_agent_string = request.META.get("HTTP_USER_AGENT", "")
-            channel = request.META.get("HTTP_CHANNEL", "Other")
-            agent = user_agents.parse(user_agent_string)
-            if x_forwarded_for:
-                ip = x_forwarded_for.split(",")[0]
-            else:
-                ip = request.META.get("REMOTE_ADDR")
-            AccessGuardian.objects.create(
-                log_type=log_type,
-                phone_number=phone_number,
-                device=channel,
-                browser=agent.browser.family,
-                browser_version=agent.browser.version_string,
-                os=agent.os.family,
-                os_version=agent.os.version_string,
-                ip_address=ip,
-            )
-        except Exception:
-            pass
+        audit.log_access_guardian(
+            request,
+            log_type,
+            phone_number=phone_number,
+            channel=request.META.get("HTTP_CHANNEL", "Other"),
+        )
 
     def validate(self, attrs):
         request: HttpRequest = self.context.get("request")
@@ -63,3 +63,12 @@ def count_visit(user_id):
     # ).exists():
     #     DigitalPlatformVisits.objects.create(user=user)
     pass
+
+
+@shared_task
+def flush_last_seen():
+    from accounts import last_seen
+
+    updated = last_seen.flush()
+    logger.info(f"flushed last seen for {updated} users")
+    return updated
@@ -0,0 +1,6 @@
+"""
+end-to-end API benchmarks for the customer journeys of the mobile app.
+
+run with `python manage.py run_benchmarks`. results are written as JSON and
+compared against `benchmarks/baseline.json`.
+"""
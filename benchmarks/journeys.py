@@ -0,0 +1,215 @@
+"""
+user journeys exercised by the benchmark suite.
+
+each journey is one API call made the way the mobile app makes it. fixtures
+are created once per worker so every iteration hits the same customer and
+accounts, which keeps numbers comparable between runs.
+"""
+
+import io
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Callable
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import CustomerProfile, CustomUser
+from cbs import models
+
+PASSWORD = "Bench-Mark-2024"
+FIRST_CUSTOMER = 100000
+
+
+@dataclass
+class Fixture:
+    worker: int
+    user: CustomUser
+    token: str
+    accounts: list
+    biller: models.PaymentBiller
+    payees: list = field(default_factory=list)
+
+    @property
+    def customer_number(self):
+        return self.user.customer_profile.t24_customer_id
+
+
+def create_fixture(worker: int, accounts_per_customer: int, payees: int) -> Fixture:
+    """
+    a customer with T24 accounts matching the simulator's numbering, a biller
+    and enough pending bill sharing requests for every iteration
+    """
+    customer_number = FIRST_CUSTOMER + worker
+    user = CustomUser.objects.create_user(
+        username=f"bench{worker}",
+        email=f"bench{worker}@benchmarks.local",
+        password=PASSWORD,
+        fullname=f"Bench Customer {worker}",
+        phone_number=f"+23998{customer_number:05d}",
+    )
+    CustomerProfile.objects.create(
+        user_account=user,
+        nationality="Sao Tome and Principe",
+        gender=CustomerProfile.Gender.MALE,
+        t24_customer_id=str(customer_number),
+    )
+    accounts = [
+        models.BankAccount.objects.create(
+            user=user,
+            account_number=f"{customer_number:07d}{i:03d}",
+            account_name=user.fullname,
+            account_category="Current Account",
+            currency="STN",
+            default=i == 0,
+        )
+        for i in range(accounts_per_customer)
+    ]
+    biller = models.PaymentBiller.objects.create(
+        name=f"Bench Utility {worker}", biller_account="9990000001"
+    )
+    bill_sharing = models.BillSharing.objects.create(
+        title="Bench dinner",
+        initiator=user,
+        merchant_number="9990000002",
+        merchant_name="Bench Restaurant",
+        bill_amount=Decimal("10") * payees,
+    )
+    pending = models.BillSharingPyee.objects.bulk_create(
+        models.BillSharingPyee(
+            bill_sharing=bill_sharing, user=user, amount=Decimal("10")
+        )
+        for _ in range(payees)
+    )
+    token = str(RefreshToken.for_user(user).access_token)
+    return Fixture(worker, user, token, accounts, biller, list(pending))
+
+
+def _document_image():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (1024, 640), (220, 220, 220)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@dataclass
+class Journey:
+    name: str
+    method: str
+    path: Callable[[Fixture, int], str]
+    payload: Callable[[Fixture, int], dict] = lambda fixture, iteration: None
+    authenticated: bool = True
+    multipart: bool = False
+    # "postgres" needs the production database, "live_services" needs the
+    # LLM, OCR provider and storage the journey calls out to
+    requires: tuple = ()
+
+
+def _statement_range(fixture, iteration):
+    end = date.today()
+    return {
+        "start_date": str(end - timedelta(days=30)),
+        "end_date": str(end),
+    }
+
+
+def _transfer(fixture, iteration):
+    return {
+        "source_account": fixture.accounts[0].id,
+        "recipient_account": fixture.accounts[-1].account_number,
+        "recipient_name": fixture.user.fullname,
+        "amount": "1.00",
+        "transfer_type": models.Transfer.TransferType.OWN_ACCOUNT_TRANSFER,
+        "purpose_of_transaction": "Benchmark transfer",
+    }
+
+
+def _payment(fixture, iteration):
+    return {
+        "payment_type": models.Payment.PaymentType.BILL_PAYMENT,
+        "biller": fixture.biller.id,
+        "source_account": fixture.accounts[0].id,
+        "amount": "1.00",
+        "purpose_of_transaction": "Benchmark bill payment",
+    }
+
+
+def _ocr_document(fixture, iteration):
+    image = _document_image()
+    return {
+        "email": f"bench-ocr-{uuid.uuid4().hex[:12]}@benchmarks.local",
+        "document_type": "national_id",
+        "image_front": SimpleUploadedFile("front.jpg", image, "image/jpeg"),
+        "selfie": SimpleUploadedFile("selfie.jpg", image, "image/jpeg"),
+    }
+
+
+JOURNEYS = {
+    journey.name: journey
+    for journey in (
+        Journey(
+            "login",
+            "post",
+            lambda fixture, iteration: "/auth/login/",
+            lambda fixture, iteration: {
+                "username": fixture.user.username,
+                "password": PASSWORD,
+            },
+            authenticated=False,
+        ),
+        Journey(
+            "account_list",
+            "get",
+            lambda fixture, iteration: "/cbs/bank-accounts/",
+        ),
+        Journey(
+            "mini_statement",
+            "post",
+            lambda fixture, iteration: (
+                f"/cbs/bank-accounts/{fixture.accounts[0].id}/mini-statement/"
+            ),
+            _statement_range,
+        ),
+        Journey(
+            "transfer_create",
+            "post",
+            lambda fixture, iteration: "/cbs/transfer/",
+            _transfer,
+        ),
+        Journey(
+            "payment_create",
+            "post",
+            lambda fixture, iteration: "/cbs/payments/",
+            _payment,
+        ),
+        Journey(
+            "bill_sharing_payment",
+            "post",
+            lambda fixture, iteration: (
+                f"/cbs/bill-sharing-payee/{fixture.payees[iteration].id}/make-payment/"
+            ),
+            lambda fixture, iteration: {
+                "account_number": fixture.accounts[0].account_number
+            },
+        ),
+        Journey(
+            "chatbot_stream",
+            "post",
+            lambda fixture, iteration: "/chatbot/chat/stream/",
+            lambda fixture, iteration: {"message": "What is my account balance?"},
+            requires=("postgres", "live_services"),
+        ),
+        Journey(
+            "ocr_onboarding",
+            "post",
+            lambda fixture, iteration: "/ocr/documents/upload/",
+            _ocr_document,
+            authenticated=False,
+            multipart=True,
+            requires=("live_services",),
+        ),
+    )
+}
@@ -0,0 +1,140 @@
+"""
+summary statistics, JSON persistence and baseline comparison for benchmark
+results.
+"""
+
+import json
+import math
+from collections import Counter
+from pathlib import Path
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# metrics compared against the baseline, lower is better for all of them
+COMPARED_METRICS = (
+    ("latency_ms", "p50"),
+    ("latency_ms", "p95"),
+    ("latency_ms", "p99"),
+    ("db_queries", "mean"),
+)
+
+
+def percentile(values, pct):
+    """
+    nearest-rank percentile of `values`
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples, elapsed, t24_calls):
+    """
+    `samples` is a list of (latency_seconds, status_code, query_count)
+    """
+    latencies = [sample[0] * 1000 for sample in samples]
+    queries = [sample[2] for sample in samples]
+    statuses = Counter(str(sample[1]) for sample in samples)
+    requests = len(samples)
+    return {
+        "requests": requests,
+        "errors": sum(
+            count for code, count in statuses.items() if not code.startswith("2")
+        ),
+        "status_codes": dict(sorted(statuses.items())),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(sum(latencies) / requests, 2) if requests else 0.0,
+            "max": round(max(latencies), 2) if latencies else 0.0,
+        },
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "db_queries": {
+            "mean": round(sum(queries) / requests, 2) if requests else 0.0,
+            "max": max(queries) if queries else 0,
+        },
+        "t24_calls": {
+            "per_request": (
+                round(sum(t24_calls.values()) / requests, 2) if requests else 0.0
+            ),
+            "operations": dict(sorted(t24_calls.items())),
+        },
+    }
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(results, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results, baseline, threshold):
+    """
+    per journey and metric deltas against `baseline`. a metric regresses when
+    it grew by more than `threshold` percent.
+    """
+    rows = []
+    for name, current in results["journeys"].items():
+        previous = baseline.get("journeys", {}).get(name)
+        if "skipped" in current or not previous or "skipped" in previous:
+            continue
+        for group, metric in COMPARED_METRICS:
+            before = previous[group][metric]
+            after = current[group][metric]
+            if before:
+                change = (after - before) / before * 100
+            else:
+                change = 0.0 if not after else math.inf
+            rows.append(
+                {
+                    "journey": name,
+                    "metric": f"{group}.{metric}",
+                    "baseline": before,
+                    "current": after,
+                    "change_pct": round(change, 1),
+                    "regression": change > threshold,
+                }
+            )
+    return rows
+
+
+def format_results(results):
+    lines = [
+        f"{'journey':<22}{'req':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'p99 ms':>10}{'rps':>8}{'queries':>9}{'t24':>6}"
+    ]
+    for name, journey in results["journeys"].items():
+        if "skipped" in journey:
+            lines.append(f"{name:<22}skipped: {journey['skipped']}")
+            continue
+        latency = journey["latency_ms"]
+        lines.append(
+            f"{name:<22}{journey['requests']:>6}{journey['errors']:>5}"
+            f"{latency['p50']:>10.1f}{latency['p95']:>10.1f}{latency['p99']:>10.1f}"
+            f"{journey['throughput_rps']:>8.1f}{journey['db_queries']['mean']:>9.1f}"
+            f"{journey['t24_calls']['per_request']:>6.1f}"
+        )
+    return "\n".join(lines)
+
+
+def format_comparison(rows):
+    lines = [
+        f"{'journey':<22}{'metric':<18}{'baseline':>10}{'current':>10}{'change':>10}"
+    ]
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(
+            f"{row['journey']:<22}{row['metric']:<18}{row['baseline']:>10.1f}"
+            f"{row['current']:>10.1f}{row['change_pct']:>9.1f}%{flag}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,206 @@
+"""
+drives the journeys through the full django stack (middleware, auth,
+serializers, database) against an in-process T24 simulator.
+
+the run uses a throwaway test database, a local memory cache and an in
+memory celery broker unless `live_services` is set, so it never touches
+the configured redis, broker or T24.
+"""
+
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+import cbs.views
+import t24.async_requests
+import t24.t24_requests
+from config import celery_app
+from t24.resilience import resilience
+from t24.simulator import SimulatorConfig, T24Simulator
+
+from . import report
+from .journeys import JOURNEYS, create_fixture
+
+BASE_URL_MODULES = (t24.t24_requests, t24.async_requests, cbs.views)
+
+
+@contextmanager
+def benchmark_environment(simulator_config: SimulatorConfig, live_services=False):
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    simulator = T24Simulator(("127.0.0.1", 0), simulator_config)
+    simulator.start_in_thread()
+    overrides = {"T24_BASE_URL": simulator.base_url}
+    if not live_services:
+        overrides["CACHES"] = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        }
+        celery_app.conf.update(broker_url="memory://", result_backend="cache+memory://")
+    base_urls = [module.base_url for module in BASE_URL_MODULES]
+    for module in BASE_URL_MODULES:
+        module.base_url = simulator.base_url
+    resilience.reset()
+
+    try:
+        with override_settings(**overrides):
+            yield simulator
+    finally:
+        for module, base_url in zip(BASE_URL_MODULES, base_urls):
+            module.base_url = base_url
+        simulator.shutdown()
+        simulator.server_close()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+async def drain(content):
+    async for _ in content:
+        pass
+
+
+class BenchmarkRunner:
+    def __init__(
+        self,
+        journeys=None,
+        iterations=50,
+        warmup=5,
+        concurrency=1,
+        live_services=False,
+        simulator_config: SimulatorConfig = None,
+    ):
+        self.journeys = journeys or list(JOURNEYS)
+        self.iterations = iterations
+        self.warmup = warmup
+        self.concurrency = concurrency
+        self.live_services = live_services
+        self.simulator_config = simulator_config or SimulatorConfig()
+
+    def skip_reason(self, journey):
+        if "postgres" in journey.requires and connection.vendor != "postgresql":
+            return f"needs postgresql, running on {connection.vendor}"
+        if "live_services" in journey.requires and not self.live_services:
+            return "needs --live-services"
+        return None
+
+    def run(self):
+        results = {"meta": self.meta(), "journeys": {}}
+        with benchmark_environment(
+            self.simulator_config, self.live_services
+        ) as simulator:
+            per_worker = self.warmup + self.iterations
+            fixtures = [
+                create_fixture(
+                    worker,
+                    self.simulator_config.accounts_per_customer,
+                    payees=per_worker,
+                )
+                for worker in range(self.concurrency)
+            ]
+            for name in self.journeys:
+                journey = JOURNEYS[name]
+                reason = self.skip_reason(journey)
+                if reason:
+                    results["journeys"][name] = {"skipped": reason}
+                    continue
+                results["journeys"][name] = self.run_journey(
+                    journey, fixtures, simulator
+                )
+        return results
+
+    def run_journey(self, journey, fixtures, simulator):
+        samples = []
+        lock = threading.Lock()
+
+        def worker(fixture, iterations, record):
+            client = Client()
+            headers = {}
+            if journey.authenticated:
+                headers["HTTP_AUTHORIZATION"] = f"Bearer {fixture.token}"
+            for iteration in iterations:
+                sample = self.request(client, journey, fixture, iteration, headers)
+                if record:
+                    with lock:
+                        samples.append(sample)
+
+        self._spread(worker, fixtures, range(self.warmup), record=False)
+        simulator.reset_calls()
+        started = time.perf_counter()
+        self._spread(
+            worker,
+            fixtures,
+            range(self.warmup, self.warmup + self.iterations),
+            record=True,
+        )
+        elapsed = time.perf_counter() - started
+        return report.summarize(samples, elapsed, simulator.reset_calls())
+
+    def _spread(self, worker, fixtures, iterations, record):
+        if len(fixtures) == 1:
+            worker(fixtures[0], iterations, record)
+            return
+        threads = [
+            threading.Thread(target=worker, args=(fixture, iterations, record))
+            for fixture in fixtures
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    @staticmethod
+    def request(client, journey, fixture, iteration, headers):
+        path = journey.path(fixture, iteration)
+        payload = journey.payload(fixture, iteration)
+        kwargs = dict(headers)
+        if payload is not None and not journey.multipart:
+            kwargs["content_type"] = "application/json"
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, journey.method)(path, payload, **kwargs)
+            if response.streaming:
+                # time the whole stream, not just the first byte
+                if response.is_async:
+                    async_to_sync(drain)(response.streaming_content)
+                else:
+                    b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return elapsed, response.status_code, len(queries)
+
+    def meta(self):
+        config = self.simulator_config
+        return {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "debug": settings.DEBUG,
+            "iterations": self.iterations,
+            "warmup": self.warmup,
+            "concurrency": self.concurrency,
+            "live_services": self.live_services,
+            "t24_simulator": {
+                "latency_dist": config.latency_dist,
+                "latency_mean_ms": config.latency_mean,
+                "latency_stddev_ms": config.latency_stddev,
+                "error_rate": config.error_rate,
+                "accounts_per_customer": config.accounts_per_customer,
+                "statement_entries_per_day": config.statement_entries_per_day,
+                "seed": config.seed,
+            },
+        }
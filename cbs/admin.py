@@ -294,6 +294,34 @@ class BankStatementAdmin(ModelAdmin):
     list_display = ("id", "user", "source_account", "date_created")
 
 
+@admin.register(models.StatementJob)
+class StatementJobAdmin(ModelAdmin):
+    list_display = (
+        "uuid",
+        "user",
+        "bank_account",
+        "start_date",
+        "end_date",
+        "status",
+        "progress",
+        "date_created",
+    )
+    list_filter = ("status",)
+    search_fields = ("uuid", "bank_account__account_number", "user__email")
+
+
+@admin.register(models.StatementSync)
+class StatementSyncAdmin(ModelAdmin):
+    list_display = (
+        "bank_account",
+        "start_date",
+        "end_date",
+        "last_synced_at",
+        "reconciled_at",
+    )
+    search_fields = ("bank_account__account_number",)
+
+
 @admin.register(models.Complaint)
 class ComplaintAdmin(ModelAdmin):
     list_display = [
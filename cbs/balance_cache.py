@@ -0,0 +1,110 @@
+"""
+cache of T24 account details keyed by account number.
+
+entries younger than BALANCE_CACHE_TTL are served as is. older entries are
+still served, up to BALANCE_CACHE_MAX_STALENESS, while a celery task fetches
+a fresh copy in the background. past that the entry expires and the caller
+has to go to T24.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from loguru import logger
+
+KEY_PREFIX = "t24:balance"
+REFRESH_LOCK_PREFIX = "t24:balance-refresh"
+
+
+def cache_key(account_number):
+    return f"{KEY_PREFIX}:{account_number}"
+
+
+def _entry(details):
+    return {"details": details, "fetched_at": time.time()}
+
+
+def is_fresh(entry):
+    return time.time() - entry["fetched_at"] < settings.BALANCE_CACHE_TTL
+
+
+def get(account_number):
+    return cache.get(cache_key(account_number))
+
+
+async def aget(account_number):
+    return await cache.aget(cache_key(account_number))
+
+
+def get_many(account_numbers):
+    """
+    returns {account_number: entry} for the accounts that are cached
+    """
+    keys = {cache_key(number): number for number in account_numbers}
+    return {keys[key]: entry for key, entry in cache.get_many(list(keys)).items()}
+
+
+def store(account_number, details):
+    cache.set(
+        cache_key(account_number),
+        _entry(details),
+        timeout=settings.BALANCE_CACHE_MAX_STALENESS,
+    )
+
+
+async def astore(account_number, details):
+    await cache.aset(
+        cache_key(account_number),
+        _entry(details),
+        timeout=settings.BALANCE_CACHE_MAX_STALENESS,
+    )
+
+
+def store_many(details_by_account):
+    cache.set_many(
+        {
+            cache_key(number): _entry(details)
+            for number, details in details_by_account.items()
+        },
+        timeout=settings.BALANCE_CACHE_MAX_STALENESS,
+    )
+
+
+def invalidate(*account_numbers):
+    """
+    drop cached details after a posting so the next read goes to T24
+    """
+    cache.delete_many([cache_key(number) for number in account_numbers if number])
+
+
+def invalidate_quietly(*account_numbers):
+    """
+    invalidate() that only logs when the cache is down, for callers past
+    the point where T24 may have booked the posting. stale entries still
+    expire after BALANCE_CACHE_MAX_STALENESS
+    """
+    try:
+        invalidate(*account_numbers)
+    except Exception as e:
+        logger.warning(
+            "=== [BALANCE CACHE] could not invalidate {}: {}", account_numbers, e
+        )
+
+
+def schedule_refresh(account_numbers):
+    """
+    enqueue a background refresh, at most one in flight per account
+    """
+    from cbs.tasks import refresh_account_balances
+
+    account_numbers = [
+        number
+        for number in set(account_numbers)
+        if cache.add(
+            f"{REFRESH_LOCK_PREFIX}:{number}", 1, timeout=settings.BALANCE_CACHE_TTL
+        )
+    ]
+    if account_numbers:
+        refresh_account_balances.delay(account_numbers=account_numbers)
+    return account_numbers
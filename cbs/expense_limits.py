@@ -0,0 +1,258 @@
+"""
+expense limit counters.
+
+the running spend of every active ExpenseLimit is kept in redis, in cents,
+next to the spend not yet written back to the database. reserve() checks a
+transfer or payment against all the limits that apply to it and adds it to
+their counters in a single lua script, so concurrent requests cannot both
+get under a limit that only has room for one of them. release() gives back
+a reservation whose posting failed.
+
+a missing counter is seeded from ExpenseLimit.amount_spent plus the pending
+spend. the reconcile_expense_limits task moves the pending spend into
+amount_spent and resets each counter to the database value plus whatever
+was reserved since, which also picks up edits made to amount_spent.
+
+when redis cannot be reached the limits are checked and updated in the
+database instead, under SELECT ... FOR UPDATE.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from loguru import logger
+
+from helpers.redis import get_redis
+
+from .models import ExpenseLimit
+
+KEY_PREFIX = "cbs:expense-limit"
+# ended limits keep being reconciled for a while, for spend reserved late
+RECONCILE_AFTER_END = timedelta(days=7)
+
+# KEYS: spent and pending key of each limit
+# ARGV: amount, counter ttl, then limit and amount_spent of each limit
+# returns 0, or the position of the first limit the amount does not fit in
+RESERVE = """
+local amount = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+local count = #KEYS / 2
+for i = 1, count do
+    local spent = redis.call("GET", KEYS[2 * i - 1])
+    if not spent then
+        spent = tonumber(ARGV[2 * i + 2])
+            + tonumber(redis.call("GET", KEYS[2 * i]) or "0")
+        redis.call("SET", KEYS[2 * i - 1], spent, "EX", ttl)
+    end
+    if tonumber(spent) + amount > tonumber(ARGV[2 * i + 1]) then
+        return i
+    end
+end
+for i = 1, count do
+    redis.call("INCRBY", KEYS[2 * i - 1], amount)
+    redis.call("EXPIRE", KEYS[2 * i - 1], ttl)
+    redis.call("INCRBY", KEYS[2 * i], amount)
+end
+return 0
+"""
+
+# KEYS: spent and pending key of each limit, ARGV: amount
+RELEASE = """
+local amount = tonumber(ARGV[1])
+for i = 1, #KEYS / 2 do
+    if redis.call("EXISTS", KEYS[2 * i - 1]) == 1 then
+        redis.call("DECRBY", KEYS[2 * i - 1], amount)
+    end
+    redis.call("DECRBY", KEYS[2 * i], amount)
+end
+return 0
+"""
+
+# KEYS: pending keys, returns their values and clears them
+DRAIN = """
+local pending = {}
+for i, key in ipairs(KEYS) do
+    pending[i] = redis.call("GET", key) or "0"
+    redis.call("DEL", key)
+end
+return pending
+"""
+
+# KEYS: spent and pending key of each limit, ARGV: amount_spent of each
+RESYNC = """
+for i = 1, #KEYS / 2 do
+    if redis.call("EXISTS", KEYS[2 * i - 1]) == 1 then
+        local pending = tonumber(redis.call("GET", KEYS[2 * i]) or "0")
+        redis.call("SET", KEYS[2 * i - 1], tonumber(ARGV[i]) + pending, "KEEPTTL")
+    end
+end
+return 0
+"""
+
+_scripts = {}
+
+
+class ExpenseLimitExceeded(Exception):
+    def __init__(self, expense_limit):
+        self.expense_limit = expense_limit
+        super().__init__(f"expense limit {expense_limit.id} exceeded")
+
+
+def _script(source):
+    # registered per client, get_redis() hands out a new one after a fork
+    client = get_redis()
+    script = _scripts.get(source)
+    if script is None or script.registered_client is not client:
+        script = _scripts[source] = client.register_script(source)
+    return script
+
+
+def _keys(limit_ids):
+    keys = []
+    for limit_id in limit_ids:
+        keys += [f"{KEY_PREFIX}:{limit_id}:spent", f"{KEY_PREFIX}:{limit_id}:pending"]
+    return keys
+
+
+def _cents(amount):
+    return int(Decimal(amount).scaleb(2).to_integral_value())
+
+
+def applicable(account_id, transaction_purpose):
+    """
+    the active account budgets of the account and its budgets for the
+    purpose of the transaction, in one query
+    """
+    today = timezone.localdate()
+    return list(
+        ExpenseLimit.objects.filter(
+            Q(limit_type=ExpenseLimit.ExpenseLimitType.ACCOUNT_BUDGET)
+            | Q(
+                limit_type=ExpenseLimit.ExpenseLimitType.CATEGORICAL_BUDGET,
+                category__name=(transaction_purpose or "").strip(),
+            ),
+            account_id=account_id,
+            status=ExpenseLimit.Status.ACTIVE,
+            start_date__lte=today,
+            end_date__gte=today,
+        ).order_by("id")
+    )
+
+
+def _reserve_in_db(limits, amount):
+    with transaction.atomic():
+        locked = ExpenseLimit.objects.select_for_update().filter(
+            pk__in=[limit.id for limit in limits]
+        )
+        for limit in locked.order_by("id"):
+            if limit.amount_spent + amount > limit.limit_amount:
+                raise ExpenseLimitExceeded(limit)
+        locked.update(amount_spent=F("amount_spent") + amount)
+
+
+def reserve(account_id, transaction_purpose, amount):
+    """
+    count `amount` against every limit that applies, all or nothing. returns
+    the ids of the limits reserved for release(), raises
+    ExpenseLimitExceeded when the amount does not fit in one of them
+    """
+    limits = applicable(account_id, transaction_purpose)
+    if not limits:
+        return []
+
+    args = [_cents(amount), settings.EXPENSE_LIMIT_COUNTER_TTL]
+    for limit in limits:
+        args += [_cents(limit.limit_amount), _cents(limit.amount_spent)]
+    try:
+        over = _script(RESERVE)(keys=_keys(limit.id for limit in limits), args=args)
+    except Exception as e:
+        logger.warning("=== [EXPENSE LIMIT] redis unavailable, using the db: {}", e)
+        _reserve_in_db(limits, amount)
+    else:
+        if over:
+            raise ExpenseLimitExceeded(limits[over - 1])
+    return [limit.id for limit in limits]
+
+
+def release(limit_ids, amount):
+    """
+    give back a reservation, e.g. when T24 refused the posting
+    """
+    if not limit_ids:
+        return
+    try:
+        _script(RELEASE)(keys=_keys(limit_ids), args=[_cents(amount)])
+    except Exception as e:
+        logger.warning("=== [EXPENSE LIMIT] redis unavailable, using the db: {}", e)
+        ExpenseLimit.objects.filter(pk__in=limit_ids).update(
+            amount_spent=F("amount_spent") - amount
+        )
+
+
+def posting_uncertain(error, response=None):
+    """
+    whether T24 may have booked a posting that failed with `error`, before
+    or after `response` came back. a read timeout or a gateway timeout keeps
+    the reservation: spend that did happen must never be given back, while
+    a hold that was not needed only lasts until the limit's period ends.
+    anything else, from a refused connection to an unreadable answer, means
+    nothing was booked and the reservation is released
+    """
+    if response is not None:
+        return response.status_code == 504
+    return isinstance(error, requests.ReadTimeout)
+
+
+def _reconcile_batch(limit_ids):
+    keys = _keys(limit_ids)
+    pending_keys = keys[1::2]
+    pending = [int(value) for value in _script(DRAIN)(keys=pending_keys)]
+    try:
+        with transaction.atomic():
+            for limit_id, cents in zip(limit_ids, pending):
+                if cents:
+                    ExpenseLimit.objects.filter(pk=limit_id).update(
+                        amount_spent=F("amount_spent") + Decimal(cents).scaleb(-2)
+                    )
+    except Exception:
+        # put the spend back for the next run
+        pipe = get_redis().pipeline()
+        for key, cents in zip(pending_keys, pending):
+            if cents:
+                pipe.incrby(key, cents)
+        pipe.execute()
+        raise
+
+    spent = dict(
+        ExpenseLimit.objects.filter(pk__in=limit_ids).values_list("id", "amount_spent")
+    )
+    _script(RESYNC)(
+        keys=keys,
+        args=[_cents(spent.get(limit_id, 0)) for limit_id in limit_ids],
+    )
+    return sum(1 for cents in pending if cents)
+
+
+def reconcile(batch_size=settings.EXPENSE_LIMIT_RECONCILE_BATCH):
+    """
+    write the pending spend of the active limits back to amount_spent,
+    returns the number of limits updated
+    """
+    limit_ids = ExpenseLimit.objects.filter(
+        status=ExpenseLimit.Status.ACTIVE,
+        end_date__gte=timezone.localdate() - RECONCILE_AFTER_END,
+    ).values_list("id", flat=True)
+
+    updated, last_id = 0, 0
+    while True:
+        batch = list(limit_ids.filter(id__gt=last_id).order_by("id")[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]
+        updated += _reconcile_batch(batch)
+    return updated
@@ -0,0 +1,276 @@
+"""
+local ledger of T24 account statements.
+
+each account keeps its statement entries in StatementEntry for one
+contiguous range of booking dates, recorded in its StatementSync. before a
+range is read, sync() fetches from T24 only what the ledger is missing: the
+days before its first day, and the days from its last day (which may have
+been synced while still open) to the end of the range. the open tail is
+fetched again at most every STATEMENT_LEDGER_FRESHNESS seconds. a range
+that ends before the ledger's first day, with days in between, is fetched
+on its own and stored without moving the ledger's range, so a request for
+an old month does not pull in every day up to the ledger.
+
+missing days are fetched in windows of at most STATEMENT_LEDGER_SYNC_DAYS.
+each window is read from T24 with no transaction open and no lock held; the
+StatementSync row is only locked to swap the window's rows in and advance
+the range, so a long first sync neither holds a connection in a transaction
+nor blocks readers of the account. a window whose ledger was moved by
+another sync while it was being fetched is dropped and the missing days are
+worked out again.
+
+reconcile() fetches again one window of STATEMENT_LEDGER_RECONCILE_DAYS per
+account and run, walking back from the newest day and starting over from it
+once the oldest is reached, so corrections T24 makes to booked entries find
+their way into the ledger.
+"""
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from loguru import logger
+
+from t24.statements import statement_pages
+
+from .models import StatementEntry, StatementSync
+
+ONE_DAY = timedelta(days=1)
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(str(value), "%Y%m%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _fetch(bank_account, start_date, end_date):
+    """
+    the entries of [start_date, end_date] from T24, as unsaved rows. runs
+    outside any transaction
+    """
+    positions = {}
+    rows = []
+    pages = statement_pages(
+        bank_account.account_number,
+        start_date.strftime("%Y%m%d"),
+        end_date.strftime("%Y%m%d"),
+    )
+    for page, _ in pages:
+        for entry in page:
+            booking_date = (
+                parse_date(entry.get("bookingDate"))
+                or parse_date(entry.get("valueDate"))
+                or start_date
+            )
+            if not start_date <= booking_date <= end_date:
+                continue
+            sequence = positions.get(booking_date, 0)
+            positions[booking_date] = sequence + 1
+            rows.append(
+                StatementEntry(
+                    bank_account=bank_account,
+                    booking_date=booking_date,
+                    sequence=sequence,
+                    transaction_ref=str(entry.get("transactionRef") or "")[:100],
+                    data=entry,
+                )
+            )
+    return rows
+
+
+def _swap(bank_account, start_date, end_date, rows):
+    """
+    replace the stored days of [start_date, end_date] with `rows`. runs
+    inside the caller's transaction
+    """
+    StatementEntry.objects.filter(
+        bank_account=bank_account,
+        booking_date__gte=start_date,
+        booking_date__lte=end_date,
+    ).delete()
+    StatementEntry.objects.bulk_create(rows, batch_size=1000)
+
+
+def _locked(bank_account):
+    return StatementSync.objects.select_for_update().get(bank_account=bank_account)
+
+
+def _state(ledger):
+    return ledger.start_date, ledger.end_date, ledger.last_synced_at
+
+
+def _missing(ledger, start_date, end_date, now):
+    """
+    the next window sync() has to fetch for [start_date, end_date], as
+    (first day, last day), or None when the ledger covers it
+    """
+    window = timedelta(days=settings.STATEMENT_LEDGER_SYNC_DAYS - 1)
+    if ledger.start_date is None:
+        return max(start_date, end_date - window), end_date
+
+    # the last day stays open until it has been synced on a later day
+    tail_open = ledger.end_date >= timezone.localdate(ledger.last_synced_at)
+    stale = (now - ledger.last_synced_at).total_seconds() >= (
+        settings.STATEMENT_LEDGER_FRESHNESS
+    )
+    if end_date > ledger.end_date or (
+        end_date == ledger.end_date and tail_open and stale
+    ):
+        first_day = ledger.end_date if tail_open else ledger.end_date + ONE_DAY
+        return first_day, min(end_date, first_day + window)
+
+    if start_date < ledger.start_date:
+        last_day = ledger.start_date - ONE_DAY
+        return max(start_date, last_day - window), last_day
+    return None
+
+
+def sync(bank_account, start_date, end_date):
+    """
+    make the ledger cover [start_date, end_date], up to today. raises
+    StatementUnavailable when T24 cannot be read
+    """
+    today = timezone.localdate()
+    end_date = min(end_date, today)
+    if start_date > end_date:
+        return None
+
+    ledger, _ = StatementSync.objects.get_or_create(bank_account=bank_account)
+    if ledger.start_date is not None and end_date < ledger.start_date - ONE_DAY:
+        _sync_detached(bank_account, start_date, end_date)
+        return ledger
+    while True:
+        window = _missing(ledger, start_date, end_date, timezone.now())
+        if window is None:
+            return ledger
+        first_day, last_day = window
+        rows = _fetch(bank_account, first_day, last_day)
+
+        with transaction.atomic():
+            locked = _locked(bank_account)
+            if _state(locked) == _state(ledger):
+                _swap(bank_account, first_day, last_day, rows)
+                if locked.start_date is None or last_day >= locked.end_date:
+                    locked.end_date = last_day
+                    locked.last_synced_at = timezone.now()
+                if locked.start_date is None or first_day < locked.start_date:
+                    locked.start_date = first_day
+                locked.save(update_fields=["start_date", "end_date", "last_synced_at"])
+        # changed under us or advanced, either way look again
+        ledger = locked
+
+
+def _sync_detached(bank_account, start_date, end_date):
+    """
+    store [start_date, end_date] without recording it on the ledger, which
+    only holds one contiguous range. it is fetched again on the next read,
+    or taken in when the ledger grows back to it
+    """
+    window = timedelta(days=settings.STATEMENT_LEDGER_SYNC_DAYS - 1)
+    first_day = start_date
+    while first_day <= end_date:
+        last_day = min(end_date, first_day + window)
+        rows = _fetch(bank_account, first_day, last_day)
+        with transaction.atomic():
+            # serialised with the other swaps of the account
+            _locked(bank_account)
+            _swap(bank_account, first_day, last_day, rows)
+        first_day = last_day + ONE_DAY
+
+
+def entries(bank_account, start_date, end_date):
+    """
+    the stored entries of [start_date, end_date] in T24 order, as returned
+    by T24. call sync() first
+    """
+    return (
+        StatementEntry.objects.filter(
+            bank_account=bank_account,
+            booking_date__gte=start_date,
+            booking_date__lte=end_date,
+        )
+        .order_by("booking_date", "sequence")
+        .values_list("data", flat=True)
+    )
+
+
+def entry_pages(bank_account, start_date, end_date, size):
+    page = []
+    for entry in entries(bank_account, start_date, end_date).iterator(size):
+        page.append(entry)
+        if len(page) >= size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+async def aentry_pages(bank_account, start_date, end_date, size):
+    page = []
+    async for entry in entries(bank_account, start_date, end_date).aiterator(size):
+        page.append(entry)
+        if len(page) >= size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def reconcile_one(ledger_id, days=settings.STATEMENT_LEDGER_RECONCILE_DAYS):
+    ledger = StatementSync.objects.select_related("bank_account").get(pk=ledger_id)
+    if ledger.start_date is None:
+        return 0
+    cursor = ledger.reconcile_cursor
+    if cursor is None or not ledger.start_date <= cursor <= ledger.end_date:
+        cursor = ledger.end_date
+    window_start = max(cursor - timedelta(days=days - 1), ledger.start_date)
+    rows = _fetch(ledger.bank_account, window_start, cursor)
+
+    with transaction.atomic():
+        # the range only grows, so the window is still inside it
+        ledger = _locked(ledger.bank_account)
+        before = StatementEntry.objects.filter(
+            bank_account=ledger.bank_account,
+            booking_date__gte=window_start,
+            booking_date__lte=cursor,
+        ).count()
+        _swap(ledger.bank_account, window_start, cursor, rows)
+        if before != len(rows):
+            logger.warning(
+                f"=== [STATEMENT LEDGER] {ledger.bank_account.account_number} "
+                f"{window_start} - {cursor}: {before} entries, T24 has {len(rows)}"
+            )
+
+        # wrap around to the newest days once the oldest are done
+        next_cursor = window_start - ONE_DAY
+        if next_cursor < ledger.start_date:
+            next_cursor = ledger.end_date
+        ledger.reconcile_cursor = next_cursor
+        ledger.reconciled_at = timezone.now()
+        ledger.save(update_fields=["reconcile_cursor", "reconciled_at"])
+    return len(rows)
+
+
+def reconcile(batch_size=settings.STATEMENT_LEDGER_RECONCILE_BATCH):
+    """
+    reconcile one window of the `batch_size` ledgers least recently
+    reconciled, returns how many were done
+    """
+    ledger_ids = list(
+        StatementSync.objects.filter(start_date__isnull=False)
+        .order_by(F("reconciled_at").asc(nulls_first=True), "id")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    done = 0
+    for ledger_id in ledger_ids:
+        try:
+            reconcile_one(ledger_id)
+            done += 1
+        except Exception as e:
+            # the next run retries it
+            logger.error(f"=== [STATEMENT LEDGER] reconcile {ledger_id} failed: {e}")
+    return done
@@ -0,0 +1,94 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+
+from cbs.models import Payment, TransactionHistory, Transfer
+
+FIELDS = [
+    "category",
+    "amount",
+    "currency",
+    "status",
+    "reference",
+    "account_number",
+    "counterparty_name",
+    "counterparty_account",
+]
+
+RELATED = {
+    Transfer: ["source_account"],
+    Payment: ["source_account", "biller"],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy amount, currency, status, reference and counterparty of the "
+        "transfer or payment onto transaction history rows that lack them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="history rows updated per query",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="refresh every row, not only those never filled",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        content_types = ContentType.objects.get_for_models(Transfer, Payment)
+        models_by_ct = {ct.id: model for model, ct in content_types.items()}
+
+        rows = TransactionHistory.objects.filter(history_ct__in=models_by_ct)
+        if not options["all"]:
+            rows = rows.filter(amount__isnull=True)
+
+        last_id, updated, orphans = 0, 0, 0
+        while True:
+            batch = list(
+                rows.filter(id__gt=last_id)
+                .order_by("id")
+                .only(
+                    "id",
+                    "history_ct",
+                    "history_id",
+                    "credit_debit_status",
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            targets = {}
+            for ct_id, model in models_by_ct.items():
+                ids = [row.history_id for row in batch if row.history_ct_id == ct_id]
+                if ids:
+                    objs = model.objects.select_related(*RELATED[model])
+                    targets[ct_id] = objs.in_bulk(ids)
+
+            changed = []
+            for row in batch:
+                obj = targets.get(row.history_ct_id, {}).get(row.history_id)
+                if obj is None:
+                    orphans += 1
+                    continue
+                for name, value in TransactionHistory.snapshot(
+                    obj, row.credit_debit_status
+                ).items():
+                    setattr(row, name, value)
+                changed.append(row)
+
+            TransactionHistory.objects.bulk_update(changed, FIELDS)
+            updated += len(changed)
+            self.stdout.write(f"{updated} rows updated")
+
+        if orphans:
+            self.stdout.write(
+                self.style.WARNING(f"{orphans} rows point at deleted transactions")
+            )
+        self.stdout.write(self.style.SUCCESS("Transaction history backfilled"))
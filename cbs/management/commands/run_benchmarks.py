@@ -0,0 +1,117 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import report
+from benchmarks.journeys import JOURNEYS
+from benchmarks.runner import BenchmarkRunner
+from t24.simulator import SimulatorConfig
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main customer journeys end to end against the T24 "
+        "simulator and compare p50/p95/p99 latency and query counts with the "
+        "committed baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="parallel clients, each with its own customer",
+        )
+        parser.add_argument(
+            "--journeys",
+            nargs="+",
+            choices=list(JOURNEYS),
+            default=list(JOURNEYS),
+        )
+        parser.add_argument(
+            "--output", default="benchmark-results.json", help="results file"
+        )
+        parser.add_argument("--baseline", default=str(report.BASELINE_PATH))
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="also write the results to the baseline file",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=20.0,
+            help="percent increase over the baseline counted as a regression",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="exit with an error when any metric regresses",
+        )
+        parser.add_argument(
+            "--live-services",
+            action="store_true",
+            help="use the configured cache, broker, LLM and OCR services",
+        )
+        parser.add_argument(
+            "--t24-latency-dist",
+            default="fixed",
+            choices=("fixed", "uniform", "normal", "lognormal", "exponential"),
+        )
+        parser.add_argument(
+            "--t24-latency-mean", type=float, default=50.0, help="milliseconds"
+        )
+        parser.add_argument(
+            "--t24-latency-stddev", type=float, default=20.0, help="milliseconds"
+        )
+        parser.add_argument("--t24-error-rate", type=float, default=0.0)
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--iterations and --concurrency must be at least 1")
+
+        runner = BenchmarkRunner(
+            journeys=options["journeys"],
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+            concurrency=options["concurrency"],
+            live_services=options["live_services"],
+            simulator_config=SimulatorConfig(
+                latency_dist=options["t24_latency_dist"],
+                latency_mean=options["t24_latency_mean"],
+                latency_stddev=options["t24_latency_stddev"],
+                error_rate=options["t24_error_rate"],
+            ),
+        )
+        results = runner.run()
+        self.stdout.write(report.format_results(results))
+
+        report.save(results, options["output"])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if options["save_baseline"]:
+            report.save(results, options["baseline"])
+            self.stdout.write(
+                self.style.SUCCESS(f"Baseline written to {options['baseline']}")
+            )
+            return
+
+        try:
+            baseline = report.load(options["baseline"])
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING("No baseline to compare against"))
+            return
+
+        rows = report.compare(results, baseline, options["threshold"])
+        self.stdout.write(report.format_comparison(rows))
+        regressions = [row for row in rows if row["regression"]]
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(
+                f"{len(regressions)} metric(s) regressed more than "
+                f"{options['threshold']}% over the baseline"
+            )
+        if regressions:
+            self.stdout.write(
+                self.style.WARNING(f"{len(regressions)} metric(s) regressed")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("No regressions"))
@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from t24.simulator import SimulatorConfig, T24Simulator
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local T24 stand-in serving the /party/... endpoints, with "
+        "configurable latency, error rate and data volume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8024)
+        parser.add_argument(
+            "--latency-dist",
+            default="lognormal",
+            choices=("fixed", "uniform", "normal", "lognormal", "exponential"),
+        )
+        parser.add_argument(
+            "--latency-mean", type=float, default=80.0, help="milliseconds"
+        )
+        parser.add_argument(
+            "--latency-stddev", type=float, default=40.0, help="milliseconds"
+        )
+        parser.add_argument(
+            "--operation-latency",
+            action="append",
+            default=[],
+            metavar="OPERATION=MS",
+            help="mean latency override for one operation, can be repeated",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="share of calls answered with an error, 0 to 1",
+        )
+        parser.add_argument("--accounts-per-customer", type=int, default=3)
+        parser.add_argument("--statement-entries-per-day", type=float, default=4.0)
+        parser.add_argument("--loan-products", type=int, default=12)
+        parser.add_argument("--seed", type=int, default=24)
+        parser.add_argument("--verbose", action="store_true")
+
+    def handle(self, *args, **options):
+        operation_latency = {}
+        for item in options["operation_latency"]:
+            operation, _, value = item.partition("=")
+            try:
+                operation_latency[operation] = float(value)
+            except ValueError:
+                raise CommandError(f"Invalid --operation-latency value: {item}")
+
+        config = SimulatorConfig(
+            latency_dist=options["latency_dist"],
+            latency_mean=options["latency_mean"],
+            latency_stddev=options["latency_stddev"],
+            operation_latency=operation_latency,
+            error_rate=options["error_rate"],
+            accounts_per_customer=options["accounts_per_customer"],
+            statement_entries_per_day=options["statement_entries_per_day"],
+            loan_products=options["loan_products"],
+            seed=options["seed"],
+        )
+        server = T24Simulator(
+            (options["host"], options["port"]), config, verbose=options["verbose"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"T24 simulator listening on {server.base_url} "
+                f"(set T24_BASE_URL={server.base_url})"
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
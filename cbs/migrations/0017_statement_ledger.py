@@ -0,0 +1,77 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cbs", "0016_statementjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatementSync",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start_date", models.DateField(blank=True, null=True)),
+                ("end_date", models.DateField(blank=True, null=True)),
+                ("last_synced_at", models.DateTimeField(blank=True, null=True)),
+                ("reconcile_cursor", models.DateField(blank=True, null=True)),
+                ("reconciled_at", models.DateTimeField(blank=True, null=True)),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "bank_account",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="statement_sync",
+                        to="cbs.bankaccount",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StatementEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("booking_date", models.DateField()),
+                ("sequence", models.PositiveIntegerField()),
+                ("transaction_ref", models.CharField(blank=True, max_length=100)),
+                ("data", models.JSONField()),
+                (
+                    "bank_account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="statement_entries",
+                        to="cbs.bankaccount",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("booking_date", "sequence"),
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("bank_account", "booking_date", "sequence"),
+                        name="unique_statement_entry_position",
+                    )
+                ],
+            },
+        ),
+    ]
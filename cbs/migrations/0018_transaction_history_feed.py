@@ -0,0 +1,70 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cbs", "0017_statement_ledger"),
+        ("contenttypes", "0002_remove_content_type_name"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transactionhistory",
+            name="account_number",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="transactionhistory",
+            name="amount",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=19, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="transactionhistory",
+            name="category",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="transactionhistory",
+            name="counterparty_account",
+            field=models.CharField(blank=True, max_length=240, null=True),
+        ),
+        migrations.AddField(
+            model_name="transactionhistory",
+            name="counterparty_name",
+            field=models.CharField(blank=True, max_length=240, null=True),
+        ),
+        migrations.AddField(
+            model_name="transactionhistory",
+            name="currency",
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name="transactionhistory",
+            name="reference",
+            field=models.CharField(blank=True, max_length=400, null=True),
+        ),
+        migrations.AddField(
+            model_name="transactionhistory",
+            name="status",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="transactionhistory",
+            index=models.Index(
+                fields=["user", "-date_created", "-id"], name="transaction_history_feed"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transactionhistory",
+            index=models.Index(
+                fields=["history_ct", "history_id"], name="transaction_history_target"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:13
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_date_created(apps, schema_editor):
+    # rows the backfill could not match to a transfer or payment
+    TransactionHistory = apps.get_model("cbs", "TransactionHistory")
+    TransactionHistory.objects.filter(date_created__isnull=True).update(
+        date_created=F("obj_date")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cbs", "0018_transaction_history_feed"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_date_created, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="transactionhistory",
+            name="date_created",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cbs", "0019_transaction_history_date_created"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="statementjob",
+            name="unique_active_statement_job",
+        ),
+        migrations.AddConstraint(
+            model_name="statementjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("status__in", ["Queued", "Fetching", "Rendering", "Sending"])
+                ),
+                fields=(
+                    "user",
+                    "bank_account",
+                    "start_date",
+                    "end_date",
+                    "recipient_email",
+                ),
+                name="unique_active_statement_job",
+            ),
+        ),
+    ]
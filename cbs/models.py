@@ -8,6 +8,9 @@ from datatable import models as data_tables
 from phonenumber_field.modelfields import PhoneNumberField
 from creditcards.models import CardNumberField, CardExpiryField, SecurityCodeField
 from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 
 # Create your models here.
 
@@ -198,15 +201,117 @@ class TransactionHistory(models.Model):
         null=True,
         blank=True,
     )
-    date_created = models.DateTimeField(null=True, blank=True)
+    # the feed pages on it, never null
+    date_created = models.DateTimeField(default=timezone.now)
     last_updated = models.DateTimeField(auto_now=True)
     obj_date = models.DateTimeField(auto_now_add=True)
 
+    # copied from the transfer or payment so the feed never resolves it
+    category = models.CharField(max_length=100, null=True, blank=True)
+    amount = models.DecimalField(max_digits=19, decimal_places=2, null=True, blank=True)
+    currency = models.CharField(max_length=10, null=True, blank=True)
+    status = models.CharField(max_length=50, null=True, blank=True)
+    reference = models.CharField(max_length=400, null=True, blank=True)
+    account_number = models.CharField(max_length=100, null=True, blank=True)
+    counterparty_name = models.CharField(max_length=240, null=True, blank=True)
+    counterparty_account = models.CharField(max_length=240, null=True, blank=True)
+
     def __str__(self):
         return str(self.user)
 
+    # fields of a transfer or payment copied to the same columns on both
+    # sides of its history, refreshed whenever one of them is saved
+    SHARED_SOURCE_FIELDS = frozenset(
+        ("amount", "currency", "status", "reference", "transfer_type", "payment_type")
+    )
+
+    @staticmethod
+    def shared_snapshot(obj):
+        """
+        the feed columns of a transfer or payment that do not depend on
+        the side of the history row
+        """
+        return {
+            "category": (
+                obj.transfer_type if isinstance(obj, Transfer) else obj.payment_type
+            ),
+            "amount": obj.amount,
+            "currency": obj.currency,
+            "status": obj.status,
+            "reference": obj.reference,
+        }
+
+    @staticmethod
+    def snapshot(obj, credit_debit_status):
+        """
+        the feed columns of a transfer or payment, as seen by the debited
+        or the credited customer
+        """
+        fields = {
+            **TransactionHistory.shared_snapshot(obj),
+            "account_number": obj.source_account.account_number,
+        }
+        if isinstance(obj, Transfer):
+            if credit_debit_status == TransactionHistory.CreditDebitStatus.CREDIT:
+                fields["account_number"] = obj.recipient_account
+                fields["counterparty_name"] = obj.source_account.account_name
+                fields["counterparty_account"] = obj.source_account.account_number
+            else:
+                fields["counterparty_name"] = obj.recipient_name
+                fields["counterparty_account"] = obj.recipient_account
+        else:
+            fields["counterparty_name"] = obj.beneficiary_name or (
+                obj.biller.name if obj.biller_id else None
+            )
+            fields["counterparty_account"] = obj.beneficiary
+        return fields
+
+    @classmethod
+    def rows_of(cls, obj):
+        return cls.objects.filter(
+            history_ct=ContentType.objects.get_for_model(obj),
+            history_id=obj.pk,
+        )
+
+    @classmethod
+    def refresh(cls, obj):
+        """
+        copy every feed column again, e.g. after a transfer was edited
+        """
+        rows = cls.rows_of(obj)
+        for credit_debit_status in cls.CreditDebitStatus.values:
+            rows.filter(credit_debit_status=credit_debit_status).update(
+                **cls.snapshot(obj, credit_debit_status)
+            )
+
+    @classmethod
+    def record(cls, user, obj, credit_debit_status, date_created=None):
+        return cls.objects.create(
+            user=user,
+            history_id=obj.id,
+            history_model=obj,
+            credit_debit_status=credit_debit_status,
+            history_type=(
+                cls.TransactionType.TRANSFER
+                if isinstance(obj, Transfer)
+                else cls.TransactionType.PAYMENT
+            ),
+            date_created=date_created or timezone.now(),
+            **cls.snapshot(obj, credit_debit_status),
+        )
+
     class Meta:
         ordering = ("-date_created",)
+        indexes = [
+            models.Index(
+                fields=["user", "-date_created", "-id"],
+                name="transaction_history_feed",
+            ),
+            models.Index(
+                fields=["history_ct", "history_id"],
+                name="transaction_history_target",
+            ),
+        ]
 
 
 class PaymentBiller(models.Model):
@@ -368,6 +473,132 @@ class BankStatement(models.Model):
         ordering = ("-date_created",)
 
 
+class StatementJob(models.Model):
+    """
+    an e-statement being generated and emailed by the generate_statement task
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "Queued"
+        FETCHING = "Fetching"
+        RENDERING = "Rendering"
+        SENDING = "Sending"
+        COMPLETED = "Completed"
+        FAILED = "Failed"
+
+    ACTIVE_STATUSES = (
+        Status.QUEUED,
+        Status.FETCHING,
+        Status.RENDERING,
+        Status.SENDING,
+    )
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="statement_jobs",
+    )
+    bank_account = models.ForeignKey(
+        BankAccount,
+        on_delete=models.CASCADE,
+        related_name="statement_jobs",
+    )
+    start_date = models.DateField()
+    end_date = models.DateField()
+    recipient_email = models.EmailField()
+    status = models.CharField(
+        choices=Status.choices,
+        max_length=50,
+        default=Status.QUEUED,
+    )
+    progress = models.PositiveSmallIntegerField(default=0)
+    entries = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    uuid = models.UUIDField(unique=True, default=uuid.uuid4, editable=False)
+    date_created = models.DateTimeField(auto_now_add=True)
+    last_updated = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.bank_account} {self.start_date} - {self.end_date}"
+
+    class Meta:
+        ordering = ("-date_created",)
+        constraints = [
+            # one job at a time per request, other users or recipients of the
+            # same statement get their own
+            models.UniqueConstraint(
+                fields=[
+                    "user",
+                    "bank_account",
+                    "start_date",
+                    "end_date",
+                    "recipient_email",
+                ],
+                condition=models.Q(
+                    status__in=[
+                        "Queued",
+                        "Fetching",
+                        "Rendering",
+                        "Sending",
+                    ]
+                ),
+                name="unique_active_statement_job",
+            ),
+        ]
+
+
+class StatementSync(models.Model):
+    """
+    the range of booking dates of an account held in StatementEntry
+    """
+
+    bank_account = models.OneToOneField(
+        BankAccount,
+        on_delete=models.CASCADE,
+        related_name="statement_sync",
+    )
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    # newest day of the next window to reconcile
+    reconcile_cursor = models.DateField(null=True, blank=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.bank_account} {self.start_date} - {self.end_date}"
+
+
+class StatementEntry(models.Model):
+    """
+    a T24 statement entry, kept as returned by getAccountStatement
+    """
+
+    bank_account = models.ForeignKey(
+        BankAccount,
+        on_delete=models.CASCADE,
+        related_name="statement_entries",
+    )
+    booking_date = models.DateField()
+    # position within the day, in T24 order
+    sequence = models.PositiveIntegerField()
+    transaction_ref = models.CharField(max_length=100, blank=True)
+    data = models.JSONField()
+
+    def __str__(self):
+        return f"{self.bank_account} {self.booking_date} {self.transaction_ref}"
+
+    class Meta:
+        ordering = ("booking_date", "sequence")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bank_account", "booking_date", "sequence"],
+                name="unique_statement_entry_position",
+            ),
+        ]
+
+
 class Beneficiary(models.Model):
     class BeneficiaryType(models.TextChoices):
         AIRTME = "Airtime"
@@ -1390,3 +1621,20 @@ class BankCharges(models.Model):
 
     def __str__(self):
         return str(self.charge_type)
+
+
+@receiver(post_save, sender=Transfer)
+@receiver(post_save, sender=Payment)
+def refresh_transaction_history(sender, instance, created, update_fields, **kwargs):
+    # keep the copied status, amount and reference in step, in one UPDATE
+    # for both sides. the counterparty columns only change when a transfer
+    # is edited, which refreshes them itself
+    if created:
+        return
+    if update_fields is not None and not (
+        TransactionHistory.SHARED_SOURCE_FIELDS & set(update_fields)
+    ):
+        return
+    TransactionHistory.rows_of(instance).update(
+        **TransactionHistory.shared_snapshot(instance)
+    )
@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TransactionHistoryCursorPagination(CursorPagination):
+    # keyset over the (user, date_created, id) index
+    ordering = ("-date_created", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
@@ -102,6 +102,27 @@ class TransferSerializer(serializers.ModelSerializer):
         )
 
 
+class TransactionHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.TransactionHistory
+        fields = (
+            "id",
+            "history_type",
+            "history_id",
+            "category",
+            "credit_debit_status",
+            "amount",
+            "currency",
+            "status",
+            "reference",
+            "account_number",
+            "counterparty_name",
+            "counterparty_account",
+            "date_created",
+        )
+        read_only_fields = fields
+
+
 class PaymentBillerSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.PaymentBiller
@@ -201,6 +222,30 @@ class BankStatementSerializer(serializers.ModelSerializer):
         )
 
 
+class StatementJobSerializer(serializers.ModelSerializer):
+    account_number = serializers.CharField(
+        source="bank_account.account_number", read_only=True
+    )
+
+    class Meta:
+        model = models.StatementJob
+        fields = (
+            "uuid",
+            "bank_account",
+            "account_number",
+            "start_date",
+            "end_date",
+            "recipient_email",
+            "status",
+            "progress",
+            "entries",
+            "error",
+            "date_created",
+            "completed_at",
+        )
+        read_only_fields = fields
+
+
 class BeneficiarySerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Beneficiary
@@ -0,0 +1,176 @@
+"""
+e-statement pipeline.
+
+a request only records a StatementJob and queues generate_statement, which
+brings the statement ledger up to date for the range, renders the entries
+into PDF parts of STATEMENT_PDF_CHUNK_SIZE entries, joins and encrypts the
+parts in memory and emails the result. the job's status and progress are
+updated as it goes so the app can poll it. a request that matches a job
+still running, same user, account, range and recipient, gets that job back
+instead of a second one. the encrypted PDF is cached per account and range
+for STATEMENT_PDF_CACHE_TTL seconds, so sending the same statement to
+someone else skips the rendering entirely.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.db import IntegrityError, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from loguru import logger
+
+from . import ledger
+from .models import StatementJob
+from .utils import encrypt_pdf_parts, generate_pdf_from_html
+
+
+def pdf_cache_key(job):
+    return f"statement-pdf:{job.bank_account_id}:{job.start_date}:{job.end_date}"
+
+
+def _active_job(user, bank_account, start_date, end_date, recipient_email):
+    return StatementJob.objects.filter(
+        user=user,
+        bank_account=bank_account,
+        start_date=start_date,
+        end_date=end_date,
+        recipient_email=recipient_email,
+        status__in=StatementJob.ACTIVE_STATUSES,
+    ).first()
+
+
+def request_statement(user, bank_account, start_date, end_date, recipient_email):
+    """
+    returns (job, created), queueing the job when it is a new one
+    """
+    from .tasks import generate_statement
+
+    job = _active_job(user, bank_account, start_date, end_date, recipient_email)
+    if job is not None:
+        return job, False
+    try:
+        with transaction.atomic():
+            job = StatementJob.objects.create(
+                user=user,
+                bank_account=bank_account,
+                start_date=start_date,
+                end_date=end_date,
+                recipient_email=recipient_email,
+            )
+    except IntegrityError:
+        # a concurrent request created it first
+        job = _active_job(user, bank_account, start_date, end_date, recipient_email)
+        if job is None:
+            raise
+        return job, False
+
+    transaction.on_commit(lambda: generate_statement.delay(job.id))
+    return job, True
+
+
+def _update(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    StatementJob.objects.filter(pk=job.pk).update(last_updated=timezone.now(), **fields)
+
+
+def _render_part(context, entries, continued, more):
+    context = {
+        **context,
+        "statements": entries,
+        "continued": continued,
+        "more": more,
+    }
+    template_path = os.path.join(settings.BASE_DIR, "templates", "bank_statement.html")
+    return generate_pdf_from_html(render_to_string(template_path, context))
+
+
+def _pdf_parts(job, context):
+    """
+    PDFs of STATEMENT_PDF_CHUNK_SIZE entries each, read from the statement
+    ledger a chunk at a time. only the first part has the header and only
+    the last one the footer
+    """
+    bank_account = job.bank_account
+    total = ledger.entries(bank_account, job.start_date, job.end_date).count()
+    _update(job, status=StatementJob.Status.RENDERING, progress=40, entries=total)
+
+    size = settings.STATEMENT_PDF_CHUNK_SIZE
+    pages = ledger.entry_pages(bank_account, job.start_date, job.end_date, size)
+    chunk, rendered = next(pages, []), 0
+    for following in pages:
+        yield _render_part(context, chunk, continued=rendered > 0, more=True)
+        rendered += len(chunk)
+        _update(job, progress=40 + 35 * rendered // total)
+        chunk = following
+    yield _render_part(context, chunk, continued=rendered > 0, more=False)
+
+
+def _render(job):
+    account_number = job.bank_account.account_number
+
+    # only what the ledger does not hold yet comes from T24
+    _update(job, status=StatementJob.Status.FETCHING, progress=10)
+    ledger.sync(job.bank_account, job.start_date, job.end_date)
+
+    context = {
+        "bank_name": "Family Bank",
+        "logo": "https://www.consolidated-bank.com/images/consolidated_bank_logo.png",
+        "customer_name": str(job.user.fullname).upper(),
+        "account_number": account_number,
+        "generated_date": timezone.now(),
+    }
+    password = str(account_number)[-6:]
+    return encrypt_pdf_parts(_pdf_parts(job, context), password)
+
+
+def _send(job, pdf):
+    start_date = job.start_date.strftime("%Y%m%d")
+    end_date = job.end_date.strftime("%Y%m%d")
+    subject = "Account Statement from {} to {}".format(start_date, end_date)
+    body = (
+        f"Your bank statement from {start_date} to {end_date} is attached. "
+        "The PDF is password protected. \n"
+        "Use the last 6 characters of your bank account,for example 200000XXXXXX"
+    )
+    email = EmailMessage(
+        subject,
+        body,
+        settings.DEFAULT_FROM_EMAIL,
+        [job.recipient_email],
+    )
+    email.attach("bank_statement.pdf", pdf, "application/pdf")
+    email.send()
+
+
+def generate(job_id):
+    job = StatementJob.objects.select_related("user", "bank_account").get(pk=job_id)
+    if job.status not in StatementJob.ACTIVE_STATUSES:
+        return job
+
+    try:
+        key = pdf_cache_key(job)
+        pdf = cache.get(key)
+        if pdf is None:
+            pdf = _render(job)
+            cache.set(key, pdf, settings.STATEMENT_PDF_CACHE_TTL)
+        else:
+            logger.info(f"=== [E-STATEMENT] job {job.uuid} served from cache")
+
+        _update(job, status=StatementJob.Status.SENDING, progress=90)
+        _send(job, pdf)
+    except Exception as e:
+        logger.error(f"=== [E-STATEMENT] job {job.uuid} failed: {e}")
+        _update(job, status=StatementJob.Status.FAILED, error=str(e))
+        return job
+
+    _update(
+        job,
+        status=StatementJob.Status.COMPLETED,
+        progress=100,
+        completed_at=timezone.now(),
+    )
+    return job
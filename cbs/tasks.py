@@ -4,9 +4,9 @@ from t24.t24_requests import T24Requests
 from config import celery_app
 from django.conf import settings
 from loguru import logger
-import requests
-from .models import ExpenseLimit, BankAccount
-from datatable.models import TransactionPurpose
+from t24.transport import t24_http
+from .models import BankAccount
+from . import balance_cache
 
 
 @celery_app.task
@@ -38,6 +38,19 @@ def update_customer_bank_accounts(customer_id):
         print("=== no response in other accounts")
 
 
+@celery_app.task
+def refresh_account_balances(account_numbers):
+    accounts = list(BankAccount.objects.filter(account_number__in=account_numbers))
+    T24Requests.bulk_update_account_details(accounts)
+
+    # accounts not held with us, e.g. a balance check on a third party account
+    held = {obj.account_number for obj in accounts}
+    for account_number in set(account_numbers) - held:
+        response = T24Requests.get_account_details(account_number=account_number)
+        if response:
+            balance_cache.store(account_number, response[0])
+
+
 @celery_app.task
 def get_loan_products():
     page_size = 200
@@ -46,7 +59,7 @@ def get_loan_products():
 
     url = f"{base_url}?page_size={page_size}&page_start={page_start}"
     headers = {"Content-Type": "application/json", "companyId": "ST0010001"}
-    response = requests.get(url, headers=headers)
+    response = t24_http.get(url, headers=headers)
 
     # If the response is not successful, break the loop
     if response.status_code == 200:
@@ -82,36 +95,24 @@ def get_loan_products():
 
 
 @celery_app.task
-def update_expense_limit(account_id, transaction_purpose, amount):
-    print("== entered function")
-    try:
-        account = BankAccount.objects.get(id=account_id)
-        purpose = TransactionPurpose.objects.get(name=transaction_purpose.strip())
-
-        # check account limit
-        if account.expense_limits:
-            expense_limit = account.expense_limits.filter(
-                limit_type=ExpenseLimit.ExpenseLimitType.ACCOUNT_BUDGET,
-                status=ExpenseLimit.Status.ACTIVE,
-            )
-            if expense_limit.exists():
-                expense_limit = expense_limit.first()
-                expense_limit.amount_spent += amount
-                expense_limit.save()
-
-        # check limit for transaction puprose
-        if account.expense_limits:
-            expense_limit = account.expense_limits.filter(
-                limit_type=ExpenseLimit.ExpenseLimitType.CATEGORICAL_BUDGET,
-                category=purpose,
-                status=ExpenseLimit.Status.ACTIVE,
-            )
-            if expense_limit.exists():
-                expense_limit = expense_limit.first()
-                expense_limit.amount_spent += amount
-                expense_limit.save()
-
-        return "Expense limit updated successfully"
-    except Exception as e:
-        logger.warning(f"An updating expense limit amount {str(e)}")
-        return "Error updating expense limit"
+def generate_statement(job_id):
+    from . import statements
+
+    job = statements.generate(job_id)
+    return f"E-statement job {job.uuid}: {job.status}"
+
+
+@celery_app.task
+def reconcile_statement_ledgers():
+    from . import ledger
+
+    done = ledger.reconcile()
+    return f"Reconciled {done} statement ledger(s)"
+
+
+@celery_app.task
+def reconcile_expense_limits():
+    from . import expense_limits
+
+    updated = expense_limits.reconcile()
+    return f"Wrote back the spend of {updated} expense limit(s)"
@@ -1,3 +1,571 @@
-# from django.test import TestCase
+import asyncio
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import httpx
+import redis
+import requests
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse_lazy
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from datatable.models import TransactionPurpose
+from helpers.redis import get_redis
+from t24 import async_requests
+from t24.async_requests import AsyncT24Requests
+from t24.resilience import Bulkhead, resilience
+from t24.singleflight import AsyncSingleFlight, SingleFlight
+from t24.transport import t24_http
+
+from . import balance_cache, expense_limits, ledger, statements
+from .models import (
+    BankAccount,
+    ExpenseLimit,
+    Payment,
+    PaymentBiller,
+    StatementEntry,
+    StatementJob,
+    StatementSync,
+    TransactionHistory,
+    Transfer,
+)
+
+
+def redis_available():
+    try:
+        return get_redis().ping()
+    except redis.RedisError:
+        return False
+
+
+class ExpenseLimitTestCase(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(
+            username="limits", email="limits@example.com", fullname="Limits"
+        )
+        self.account = BankAccount.objects.create(
+            user=user,
+            account_number="EXP0000001",
+            account_name="Limits",
+            currency="GHS",
+        )
+        self.rent = TransactionPurpose.objects.create(name="Rent")
+        today = timezone.localdate()
+        self.budget = ExpenseLimit.objects.create(
+            limit_type=ExpenseLimit.ExpenseLimitType.ACCOUNT_BUDGET,
+            user=user,
+            account=self.account,
+            limit_amount=Decimal("100.00"),
+            amount_spent=Decimal("10.00"),
+            start_date=today,
+            end_date=today,
+        )
+        self.rent_budget = ExpenseLimit.objects.create(
+            limit_type=ExpenseLimit.ExpenseLimitType.CATEGORICAL_BUDGET,
+            user=user,
+            account=self.account,
+            category=self.rent,
+            limit_amount=Decimal("50.00"),
+            start_date=today,
+            end_date=today,
+        )
+        # neither expired nor for another account
+        ExpenseLimit.objects.create(
+            limit_type=ExpenseLimit.ExpenseLimitType.ACCOUNT_BUDGET,
+            user=user,
+            account=self.account,
+            limit_amount=Decimal("1.00"),
+            start_date=today - timedelta(days=30),
+            end_date=today - timedelta(days=1),
+        )
+
+    def spent(self, limit):
+        limit.refresh_from_db()
+        return limit.amount_spent
+
+
+@skipUnless(redis_available(), "needs the configured redis")
+class ExpenseLimitCounterTests(ExpenseLimitTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = get_redis()
+        self.addCleanup(self.clear_counters)
+        self.clear_counters()
+
+    def clear_counters(self):
+        self.redis.delete(*expense_limits._keys([self.budget.id, self.rent_budget.id]))
+
+    def counters(self, limit):
+        spent, pending = self.redis.mget(expense_limits._keys([limit.id]))
+        return (
+            None if spent is None else int(spent),
+            None if pending is None else int(pending),
+        )
+
+    def test_reserve_counts_against_every_applicable_limit(self):
+        reserved = expense_limits.reserve(self.account.id, " Rent ", Decimal("30"))
+
+        self.assertEqual(reserved, [self.budget.id, self.rent_budget.id])
+        self.assertEqual(self.counters(self.budget), (4000, 3000))
+        self.assertEqual(self.counters(self.rent_budget), (3000, 3000))
+
+    def test_reserve_is_all_or_nothing(self):
+        expense_limits.reserve(self.account.id, "Rent", Decimal("30"))
+
+        with self.assertRaises(expense_limits.ExpenseLimitExceeded) as raised:
+            expense_limits.reserve(self.account.id, "Rent", Decimal("30"))
+
+        self.assertEqual(raised.exception.expense_limit, self.rent_budget)
+        # the account budget had room but was not charged either
+        self.assertEqual(self.counters(self.budget), (4000, 3000))
+        self.assertEqual(self.counters(self.rent_budget), (3000, 3000))
+
+    def test_missing_counter_is_seeded_from_database_and_pending(self):
+        expense_limits.reserve(self.account.id, "Food", Decimal("20"))
+        self.redis.delete(f"{expense_limits.KEY_PREFIX}:{self.budget.id}:spent")
+
+        expense_limits.reserve(self.account.id, "Food", Decimal("5"))
+
+        # 10.00 stored, 20.00 still pending, 5.00 reserved now
+        self.assertEqual(self.counters(self.budget), (3500, 2500))
+
+    def test_release_gives_the_reservation_back(self):
+        reserved = expense_limits.reserve(self.account.id, "Rent", Decimal("30"))
+
+        expense_limits.release(reserved, Decimal("30"))
+
+        self.assertEqual(self.counters(self.budget), (1000, 0))
+        self.assertEqual(self.counters(self.rent_budget), (0, 0))
+        expense_limits.reserve(self.account.id, "Rent", Decimal("50"))
+
+    def test_release_without_counter_only_reduces_pending(self):
+        reserved = expense_limits.reserve(self.account.id, "Food", Decimal("30"))
+        self.redis.delete(f"{expense_limits.KEY_PREFIX}:{self.budget.id}:spent")
+
+        expense_limits.release(reserved, Decimal("30"))
+
+        self.assertEqual(self.counters(self.budget), (None, 0))
+
+    def test_concurrent_reservations_never_exceed_the_limit(self):
+        script = expense_limits._script(expense_limits.RESERVE)
+        keys = expense_limits._keys([self.budget.id])
+        args = [100, settings.EXPENSE_LIMIT_COUNTER_TTL, 10000, 1000]
+        results = []
+        lock = threading.Lock()
+
+        def reserve():
+            for _ in range(20):
+                over = script(keys=keys, args=args)
+                with lock:
+                    results.append(over)
+
+        threads = [threading.Thread(target=reserve) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 90.00 of room, 1.00 at a time
+        self.assertEqual(results.count(0), 90)
+        self.assertEqual(self.counters(self.budget), (10000, 9000))
+
+    def test_reconcile_writes_pending_spend_back(self):
+        expense_limits.reserve(self.account.id, "Rent", Decimal("30"))
+        ExpenseLimit.objects.filter(pk=self.rent_budget.pk).update(
+            amount_spent=Decimal("5")
+        )
+
+        expense_limits.reconcile()
+
+        self.assertEqual(self.spent(self.budget), Decimal("40.00"))
+        self.assertEqual(self.spent(self.rent_budget), Decimal("35.00"))
+        # edits made to amount_spent reach the counter
+        self.assertEqual(self.counters(self.budget), (4000, None))
+        self.assertEqual(self.counters(self.rent_budget), (3500, None))
+
+
+class ExpenseLimitDatabaseFallbackTests(ExpenseLimitTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(
+            expense_limits,
+            "_script",
+            side_effect=redis.ConnectionError("redis is down"),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reserve_updates_amount_spent(self):
+        reserved = expense_limits.reserve(self.account.id, "Rent", Decimal("30"))
+
+        self.assertEqual(reserved, [self.budget.id, self.rent_budget.id])
+        self.assertEqual(self.spent(self.budget), Decimal("40.00"))
+        self.assertEqual(self.spent(self.rent_budget), Decimal("30.00"))
+
+    def test_reserve_is_all_or_nothing(self):
+        with self.assertRaises(expense_limits.ExpenseLimitExceeded):
+            expense_limits.reserve(self.account.id, "Rent", Decimal("60"))
+
+        self.assertEqual(self.spent(self.budget), Decimal("10.00"))
+        self.assertEqual(self.spent(self.rent_budget), Decimal("0.00"))
+
+    def test_release_updates_amount_spent(self):
+        reserved = expense_limits.reserve(self.account.id, "Rent", Decimal("30"))
+
+        expense_limits.release(reserved, Decimal("30"))
+
+        self.assertEqual(self.spent(self.budget), Decimal("10.00"))
+        self.assertEqual(self.spent(self.rent_budget), Decimal("0.00"))
+
+
+class PostingUncertainTests(TestCase):
+    def response(self, status_code):
+        response = requests.Response()
+        response.status_code = status_code
+        return response
+
+    def test_timeouts_keep_the_reservation(self):
+        self.assertTrue(expense_limits.posting_uncertain(requests.ReadTimeout()))
+        self.assertTrue(
+            expense_limits.posting_uncertain(ValueError(), self.response(504))
+        )
+
+    def test_definite_failures_release_it(self):
+        self.assertFalse(expense_limits.posting_uncertain(requests.ConnectionError()))
+        self.assertFalse(expense_limits.posting_uncertain(requests.ConnectTimeout()))
+        self.assertFalse(
+            expense_limits.posting_uncertain(ValueError(), self.response(502))
+        )
+        self.assertFalse(expense_limits.posting_uncertain(KeyError("header")))
+
+
+class BookedPostingTests(TestCase):
+    """
+    a posting T24 booked stays booked whatever fails after it
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(
+            username="poster", email="poster@example.com", fullname="Poster"
+        )
+        self.account = BankAccount.objects.create(
+            user=self.user,
+            account_number="PST0000001",
+            account_name="Poster",
+            currency="STN",
+        )
+        self.client.force_login(self.user)
+
+        booked = requests.Response()
+        booked.status_code = 200
+        booked._content = b'{"header": {"status": "success", "id": "FT001"}}'
+        for patcher in (
+            mock.patch.object(t24_http, "post", return_value=booked),
+            mock.patch.object(expense_limits, "reserve", return_value=[7]),
+            mock.patch.object(
+                balance_cache.cache,
+                "delete_many",
+                side_effect=redis.ConnectionError("cache is down"),
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(expense_limits, "release")
+        self.release = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_transfer_survives_a_cache_outage(self):
+        response = self.client.post(
+            "/cbs/transfer/",
+            {
+                "source_account": self.account.id,
+                "recipient_account": "PST0000002",
+                "amount": "5.00",
+                "transfer_type": Transfer.TransferType.OWN_ACCOUNT_TRANSFER,
+                "purpose_of_transaction": "Rent",
+            },
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["status"], "success")
+        transfer = Transfer.objects.get()
+        self.assertEqual(transfer.status, "Success")
+        self.assertEqual(transfer.t24_reference, "FT001")
+        self.release.assert_not_called()
+
+    def test_payment_survives_a_cache_outage(self):
+        biller = PaymentBiller.objects.create(name="Power", biller_account="999")
+        response = self.client.post(
+            "/cbs/payments/",
+            {
+                "payment_type": Payment.PaymentType.BILL_PAYMENT,
+                "biller": biller.id,
+                "source_account": self.account.id,
+                "amount": "5.00",
+                "purpose_of_transaction": "Power",
+            },
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["status"], "success")
+        payment = Payment.objects.get()
+        self.assertEqual(payment.status, "Success")
+        self.assertEqual(payment.failed_reason, "")
+        self.release.assert_not_called()
+
+
+@override_settings(METRICS_TOKEN="scrape")
+class T24HealthViewTests(TestCase):
+    url = reverse_lazy("cbs:t24-health")
+
+    def setUp(self):
+        resilience.reset()
+        self.addCleanup(resilience.reset)
+        patcher = mock.patch.object(t24_http, "get")
+        self.t24_get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_anonymous_users_are_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        user = CustomUser.objects.create(username="customer", email="c@example.com")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_staff_and_the_metrics_token_are_let_in(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer scrape")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["reachable"])
+
+        staff = CustomUser.objects.create(
+            username="staff", email="s@example.com", is_staff=True
+        )
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.t24_get.assert_not_called()
+
+    def test_an_open_breaker_reports_unavailable(self):
+        breaker = resilience.breaker("getGtCustomerInfo")
+        for _ in range(breaker.min_calls):
+            breaker.record(False)
+
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer scrape")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(
+            response.json()["breakers"]["getGtCustomerInfo"]["state"], "open"
+        )
+        self.t24_get.assert_not_called()
+
+
+class MetricsViewTests(TestCase):
+    def test_denied_without_staff_or_token(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+        with override_settings(METRICS_TOKEN="scrape"):
+            response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer nope")
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer scrape")
+            self.assertEqual(response.status_code, 200)
+
+        staff = CustomUser.objects.create(
+            username="staff", email="s@example.com", is_staff=True
+        )
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get("/metrics/").status_code, 200)
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    async def test_identical_reads_share_one_call(self):
+        calls = []
+
+        async def handler(request):
+            calls.append(request.url.params["accountNumber"])
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={"header": {}, "body": [{"id": 1}]})
+
+        flight = AsyncSingleFlight()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with mock.patch.object(
+                async_requests, "get_async_client", return_value=client
+            ), mock.patch.object(
+                async_requests, "singleflight", flight
+            ), mock.patch.object(
+                async_requests, "base_url", "http://t24.test"
+            ):
+                details = await asyncio.gather(
+                    *[AsyncT24Requests.get_account_details("111") for _ in range(20)],
+                    AsyncT24Requests.get_account_details("222"),
+                )
+
+        self.assertEqual(sorted(calls), ["111", "222"])
+        self.assertEqual(details[0], [{"id": 1}])
+        self.assertEqual(flight._calls[asyncio.get_running_loop()], {})
+
+    def test_key_needs_no_base_url(self):
+        key = SingleFlight.make_key("GET", "/party/x", {"b": 2, "a": 1})
+        self.assertEqual(
+            key, SingleFlight.make_key("get", "/party/x", [("a", 1), ("b", 2)])
+        )
+        self.assertNotEqual(
+            key, SingleFlight.make_key("GET", "/party/x", {"a": 1, "b": 3})
+        )
+
+
+class AsyncBulkheadTests(SimpleTestCase):
+    def setUp(self):
+        resilience.reset()
+        self.addCleanup(resilience.reset)
+
+    async def test_full_bulkhead_answers_unavailable(self):
+        resilience.bulkheads["reads"] = Bulkhead("reads", 1, wait=0.01)
+
+        async def handler(request):
+            await asyncio.sleep(0.1)
+            return httpx.Response(200, json={"header": {}, "body": []})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with mock.patch.object(
+                async_requests, "get_async_client", return_value=client
+            ), mock.patch.object(
+                async_requests, "singleflight", None
+            ), mock.patch.object(
+                async_requests, "base_url", "http://t24.test"
+            ):
+                first, second = await asyncio.gather(
+                    AsyncT24Requests._get("party/getGtiAccountDetails"),
+                    AsyncT24Requests._get("party/getGtiAccountDetails"),
+                )
+                # postings have their own bulkhead
+                posting = await AsyncT24Requests._post("party/createTransfer", {})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 503)
+        self.assertEqual(
+            second.json()["error"]["errorDetails"][0]["message"],
+            "T24 reads bulkhead is full",
+        )
+        self.assertEqual(posting.status_code, 200)
+        self.assertEqual(resilience.status()["bulkheads"]["reads"]["in_flight"], 0)
+
+
+class TransactionHistoryFeedTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(
+            username="feed", email="feed@example.com", fullname="Feed"
+        )
+        account = BankAccount.objects.create(
+            user=self.user, account_number="FED0000001", account_name="Feed"
+        )
+        moment = timezone.now()
+        for i in range(5):
+            transfer = Transfer.objects.create(
+                user=self.user,
+                source_account=account,
+                recipient_account=f"FED00000{i + 10}",
+                amount=Decimal(i + 1),
+            )
+            # the same date_created for all, only the id breaks the tie
+            TransactionHistory.record(
+                self.user,
+                transfer,
+                TransactionHistory.CreditDebitStatus.DEBIT,
+                date_created=moment,
+            )
+        self.client.force_login(self.user)
+
+    def test_pages_ignore_ordering(self):
+        seen, url = [], "/cbs/transaction-history/?page_size=2&ordering=amount"
+        while url:
+            page = self.client.get(url).json()
+            seen += [row["id"] for row in page["results"]]
+            url = page["next"]
+
+        expected = list(
+            TransactionHistory.objects.order_by("-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+
+class StatementJobDedupTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(
+            username="statements", email="owner@example.com", fullname="Owner"
+        )
+        self.account = BankAccount.objects.create(
+            user=self.user, account_number="STM0000001", account_name="Owner"
+        )
+        self.end = timezone.localdate()
+        self.start = self.end - timedelta(days=30)
+
+    def request(self, recipient_email):
+        return statements.request_statement(
+            self.user, self.account, self.start, self.end, recipient_email
+        )
+
+    def test_same_request_gets_the_running_job(self):
+        job, created = self.request("owner@example.com")
+        again, created_again = self.request("owner@example.com")
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.pk, job.pk)
+
+    def test_other_recipient_gets_its_own_job(self):
+        job, _ = self.request("owner@example.com")
+        other, created = self.request("accountant@example.com")
+
+        self.assertTrue(created)
+        self.assertNotEqual(other.pk, job.pk)
+        self.assertEqual(
+            set(StatementJob.objects.values_list("recipient_email", flat=True)),
+            {"owner@example.com", "accountant@example.com"},
+        )
+
+
+class StatementLedgerTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username="ledger", email="l@example.com")
+        self.account = BankAccount.objects.create(
+            user=user, account_number="LED0000001", account_name="Ledger"
+        )
+        self.today = timezone.localdate()
+        self.ledger = StatementSync.objects.create(
+            bank_account=self.account,
+            start_date=self.today - timedelta(days=30),
+            end_date=self.today,
+            last_synced_at=timezone.now(),
+        )
+        patcher = mock.patch.object(ledger, "statement_pages")
+        self.statement_pages = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_old_range_is_fetched_on_its_own(self):
+        start = self.today - timedelta(days=3 * 365)
+        end = start + timedelta(days=9)
+        self.statement_pages.return_value = [
+            ([{"bookingDate": start.strftime("%Y%m%d"), "transactionRef": "FT1"}], 1)
+        ]
+
+        ledger.sync(self.account, start, end)
+
+        self.statement_pages.assert_called_once_with(
+            "LED0000001", start.strftime("%Y%m%d"), end.strftime("%Y%m%d")
+        )
+        self.ledger.refresh_from_db()
+        self.assertEqual(self.ledger.start_date, self.today - timedelta(days=30))
+        self.assertEqual(
+            list(ledger.entries(self.account, start, end)),
+            [{"bookingDate": start.strftime("%Y%m%d"), "transactionRef": "FT1"}],
+        )
+        self.assertEqual(StatementEntry.objects.count(), 1)
+
+
+class MiniStatementUrlTests(TestCase):
+    def test_non_numeric_pk_is_not_found(self):
+        user = CustomUser.objects.create(username="mini", email="m@example.com")
+        self.client.force_login(user)
+        response = self.client.post("/cbs/bank-accounts/abc/mini-statement/")
+        self.assertEqual(response.status_code, 404)
@@ -9,9 +9,15 @@ router = DefaultRouter()
 
 router.register("bank-accounts", views.BankAccountViewset, basename="bank-accounts")
 router.register("transfer", views.TransferViewset, basename="transfer")
+router.register(
+    "transaction-history",
+    views.TransactionHistoryViewset,
+    basename="transaction-history",
+)
 router.register("payment-billers", views.PaymentBiller, basename="payment-billers")
 router.register("payments", views.PaymentViewset, basename="payments")
 router.register("bank-statement", views.BankStatementViewset, basename="bank-statement")
+router.register("statement-jobs", views.StatementJobViewset, basename="statement-jobs")
 router.register("beneficiary", views.BeneficiaryViewset, basename="beneficiary")
 router.register("standing-order", views.StandingOrderViewset, basename="standing-order")
 router.register("cheque-request", views.ChequeRequestViewset, basename="cheque-request")
@@ -51,6 +57,21 @@ router.register(
 )
 router.register("service-charges", views.BankChargesViewset, basename="service-charges")
 urlpatterns = [
+    path(
+        "t24-health/",
+        views.T24HealthView.as_view(),
+        name="t24-health",
+    ),
+    path(
+        "bank-accounts/check-balance/",
+        views.AccountBalanceView.as_view(),
+        name="bank-accounts-check-balance",
+    ),
+    path(
+        "bank-accounts/<int:pk>/mini-statement/",
+        views.MiniStatementView.as_view(),
+        name="bank-accounts-mini-statement",
+    ),
     path(
         "fx-rates/",
         views.ForexViewset.as_view(),
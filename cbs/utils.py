@@ -1,11 +1,8 @@
 from weasyprint import HTML
 from PyPDF2 import PdfReader, PdfWriter
 import io
-import tempfile
-from cbs.models import BankAccount, ExpenseLimit
-from datatable.models import TransactionPurpose
-from django.utils import timezone
-from loguru import logger
+from cbs import balance_cache
+from t24.t24_requests import T24Requests
 
 
 def generate_pdf_from_html(html_content):
@@ -16,73 +13,73 @@ def generate_pdf_from_html(html_content):
 
 
 def encrypt_pdf(pdf_data, password):
-    # Use a BytesIO buffer to treat the PDF as a file-like object
-    pdf_buffer = io.BytesIO(pdf_data)
+    return encrypt_pdf_parts([pdf_data], password)
 
-    # Create a PdfReader object from the BytesIO buffer
-    reader = PdfReader(pdf_buffer)
-    writer = PdfWriter()
 
-    # Add all pages to the writer
-    for page in reader.pages:
-        writer.add_page(page)
+def encrypt_pdf_parts(pdf_parts, password):
+    """
+    join PDFs, e.g. a statement rendered a chunk at a time, into one
+    password protected PDF. parts are read one at a time, so a generator
+    keeps a single part in memory
+    """
+    writer = PdfWriter()
+    for pdf_data in pdf_parts:
+        reader = PdfReader(io.BytesIO(pdf_data))
+        for page in reader.pages:
+            writer.add_page(page)
 
     # Encrypt the PDF with the password
-    output_pdf = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
     writer.encrypt(password)
 
-    # Write the encrypted PDF to the file
-    with open(output_pdf.name, "wb") as output_file:
-        writer.write(output_file)
-
-    return output_pdf.name
-
-
-def check_expense_limit(account_id, transaction_purpose, amount):
-    print("=== checking expense limit ===")
-    try:
-        today = timezone.now().date()
-        account = BankAccount.objects.get(id=account_id)
-        purpose = TransactionPurpose.objects.get(name=transaction_purpose.strip())
-
-        print("=== toda: ", today)
-        print(account)
-        print(purpose)
-
-        # check account limit
-        if account.expense_limits:
-            expense_limit = account.expense_limits.filter(
-                limit_type=ExpenseLimit.ExpenseLimitType.ACCOUNT_BUDGET,
-                status=ExpenseLimit.Status.ACTIVE,
-                start_date__lte=today,
-                end_date__gte=today,
-            )
-            if expense_limit.exists():
-                expense_limit = expense_limit.first()
-                if expense_limit.amount_spent + amount > expense_limit.limit_amount:
-                    return False
-
-        # check limit for transaction puprose
-        if account.expense_limits:
-            expense_limit = account.expense_limits.filter(
-                limit_type=ExpenseLimit.ExpenseLimitType.CATEGORICAL_BUDGET,
-                category=purpose,
-                status=ExpenseLimit.Status.ACTIVE,
-                start_date__lte=today,
-                end_date__gte=today,
-            )
-            if expense_limit.exists():
-                expense_limit = expense_limit.first()
-                if expense_limit.amount_spent + amount > expense_limit.limit_amount:
-                    return False
-    except Exception as e:
-        print("=== error checking expense limit ===")
-        logger.error(f"An error ocurred checking expense limit {str(e)}")
-        return True
-    print("== rerturning TRUEEEEE")
-    return True
+    # Write the encrypted PDF to memory, nothing touches the disk
+    output = io.BytesIO()
+    writer.write(output)
+
+    return output.getvalue()
 
 
 def get_absolute_profile_picture_url(request, relative_url):
     absolute_url = request.build_absolute_uri(relative_url)
     return absolute_url
+
+
+def revalidate_account_balances(accounts, customer_number=None):
+    """
+    stale-while-revalidate over the balances of `accounts`.
+
+    accounts with no cached entry are refreshed from T24 before returning;
+    stale ones keep their stored balance and are refreshed in the background.
+    """
+    accounts = list(accounts)
+    entries = balance_cache.get_many(obj.account_number for obj in accounts)
+
+    missing = [obj for obj in accounts if obj.account_number not in entries]
+    if missing:
+        T24Requests.bulk_update_account_details(
+            missing, customer_number=customer_number
+        )
+
+    stale = [
+        number for number, entry in entries.items() if not balance_cache.is_fresh(entry)
+    ]
+    if stale:
+        balance_cache.schedule_refresh(stale)
+    return accounts
+
+
+def get_account_details(account_number):
+    """
+    cached T24 details of a single account, same shape as one item of
+    T24Requests.get_account_details
+    """
+    entry = balance_cache.get(account_number)
+    if entry is None:
+        response = T24Requests.get_account_details(account_number=account_number)
+        if not response:
+            return None
+        balance_cache.store(account_number, response[0])
+        return response[0]
+
+    if not balance_cache.is_fresh(entry):
+        balance_cache.schedule_refresh([account_number])
+    return entry["details"]
@@ -1,33 +1,38 @@
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.http import HttpRequest
+from django.http import HttpRequest, StreamingHttpResponse
 from . import models
 from . import serializers
 from rest_framework.viewsets import ModelViewSet
 from rest_framework import permissions as rest_permissions
 from helpers import exceptions
 from t24.t24_requests import T24Requests
+from t24.async_requests import AsyncT24Requests
+from t24.statements import StatementUnavailable
 from . import tasks as celery_tasks
 from loguru import logger
 from drf_spectacular.utils import extend_schema
 from rest_framework import filters
-from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from django_filters import rest_framework as djangofilters
 import json
-import requests
+from t24.transport import t24_http
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.core.mail import EmailMessage
+from . import balance_cache
+from . import ledger
+from . import statements
+from . import expense_limits
+from .pagination import TransactionHistoryCursorPagination
+from asgiref.sync import sync_to_async
 from .utils import (
-    generate_pdf_from_html,
-    encrypt_pdf,
-    check_expense_limit,
+    revalidate_account_balances,
     get_absolute_profile_picture_url,
 )
-import os
 from rest_framework.views import APIView
+from rest_framework.settings import api_settings
+from helpers.views import AsyncAPIView, IsStaffOrMetricsToken, MetricsTokenAuthentication
+from django.shortcuts import aget_object_or_404
 from django.db.models import Q
 from django.db import transaction
 from accounts.models import CustomUser
@@ -56,17 +61,21 @@ class BankAccountViewset(ModelViewSet):
         logger.info("=== updating bank accounts ==")
         user = self.request.user
         queryset = self.queryset.filter(user=user)
-        # update various account balances
+        if self.action not in ("list", "retrieve"):
+            return queryset
 
-        for obj in queryset:
-            T24Requests.update_account_details(account_number=obj.account_number)
-            obj.refresh_from_db()
+        # update various account balances
+        customer_profile = getattr(user, "customer_profile", None)
+        revalidate_account_balances(
+            queryset,
+            customer_number=getattr(customer_profile, "t24_customer_id", None),
+        )
 
         # update customer bank accounts
-        if hasattr(user, "customer_profile"):
+        if customer_profile:
             logger.info("=== calling getting other accounts")
             celery_tasks.update_customer_bank_accounts.delay(
-                customer_id=user.customer_profile.t24_customer_id
+                customer_id=customer_profile.t24_customer_id
             )
         return queryset
 
@@ -104,42 +113,6 @@ class BankAccountViewset(ModelViewSet):
             status=status.HTTP_200_OK,
         )
 
-    @action(
-        methods=["post"],
-        detail=False,
-        url_path="check-balance",
-        url_name="check-balance",
-        permission_classes=[rest_permissions.IsAuthenticated],
-        serializer_class=serializers.ValidateAccountNumberSerializer,
-    )
-    def check_balance(self, request: HttpRequest):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        account_number = serializer.validated_data["account_number"]
-        response = T24Requests.get_account_details(account_number=account_number)
-
-        if response:
-            data = {
-                "account_number": response[0]["accountNo"],
-                "account_name": response[0]["accountName"],
-                "account_category": response[0]["accountCategory"],
-                "account_balance": (
-                    response[0]["workingBalance"]
-                    if "workingBalance" in response[0]
-                    else 0.00
-                ),
-            }
-        else:
-            data = {
-                "status": False,
-                "message": "This service is not available at the moment",
-            }
-
-        return Response(
-            data=data,
-            status=status.HTTP_200_OK,
-        )
-
     @action(
         methods=["get"],
         detail=True,
@@ -167,58 +140,6 @@ class BankAccountViewset(ModelViewSet):
             status=status.HTTP_200_OK,
         )
 
-    @action(
-        methods=["post"],
-        detail=True,
-        url_path="mini-statement",
-        url_name="mini-statement",
-        permission_classes=[rest_permissions.IsAuthenticated],
-        serializer_class=serializers.AccountStatementSerializer,
-    )
-    def mini_statement(self, request: HttpRequest, pk):
-        bank_account = self.get_object()
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        data = serializer.validated_data
-
-        start_date = data.get("start_date")
-        end_date = data.get("end_date")
-
-        queryset = []
-
-        # Format first and last date
-        start_date = str(start_date).replace("-", "")
-        end_date = str(end_date).replace("-", "")
-
-        # Make a request to get withdrawal and deposit objects
-        headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-
-        params = {
-            "accountNo": bank_account.account_number,
-            "startDate": start_date,
-            "endDate": end_date,
-        }
-
-        account_url = f"{base_url}/party/getAccountStatement"
-        response = requests.get(account_url, headers=headers, params=params)
-        if response.status_code != 200:
-            raise exceptions.GeneralException(
-                detail="Failed to retrieve account statement",
-            )
-        alert_response = json.loads(response.text)
-        body = alert_response.get("body", [])
-        queryset.extend(body)
-        data = {
-            "status": True,
-            "message": "retrieved account statment",
-            "data": queryset,
-        }
-
-        return Response(
-            data=data,
-            status=status.HTTP_200_OK,
-        )
-
     @action(
         methods=["post"],
         detail=True,
@@ -233,63 +154,22 @@ class BankAccountViewset(ModelViewSet):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        start_date = data.get("start_date")
-        end_date = data.get("end_date")
         recipient_email = data.get("email")
-
         if not recipient_email:
             recipient_email = request.user.email
 
-        # Format first and last date
-        start_date = str(start_date).replace("-", "")
-        end_date = str(end_date).replace("-", "")
-
-        # Get the statement from T24
-        statement = T24Requests.get_account_statements(
-            account_number=bank_account.account_number,
-            start_date=start_date,
-            end_date=end_date,
-        )
-
-        # Generate context for the email template
-        context = {
-            "bank_name": "Family Bank",
-            "logo": "https://www.consolidated-bank.com/images/consolidated_bank_logo.png",
-            "customer_name": str(request.user.fullname).upper(),
-            "account_number": bank_account.account_number,
-            "statements": statement,
-            "generated_date": timezone.now(),
-        }
-        template_path = os.path.join(
-            settings.BASE_DIR, "templates", "bank_statement.html"
+        # generated and emailed by a worker, the app polls the job
+        job, _ = statements.request_statement(
+            user=request.user,
+            bank_account=bank_account,
+            start_date=data.get("start_date"),
+            end_date=data.get("end_date"),
+            recipient_email=recipient_email,
         )
-        html_message = render_to_string(template_path, context)
-        pdf_data = generate_pdf_from_html(html_message)
-        password = str(bank_account.account_number)[-6:]
-        encrypted_pdf_path = encrypt_pdf(pdf_data, password)
-
-        # Create the email subject
-        subject = "Account Statement from {} to {}".format(start_date, end_date)
-        body = f"Your bank statement from {start_date} to {end_date} is attached. The PDF is password protected. \nUse the last 6 characters of your bank account,for example 200000XXXXXX"
-        # Create the email message
-        from_email = settings.DEFAULT_FROM_EMAIL
-        email = EmailMessage(
-            subject,
-            body,
-            from_email,
-            [recipient_email],
-        )
-
-        # Attach the encrypted PDF to the email
-        with open(encrypted_pdf_path, "rb") as f:
-            email.attach("bank_statement.pdf", f.read(), "application/pdf")
-
-        # Send the email
-        email.send()
 
         return Response(
-            data=data,
-            status=status.HTTP_200_OK,
+            data=serializers.StatementJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
         )
 
 
@@ -342,36 +222,38 @@ class TransferViewset(ModelViewSet):
         instance = serializer.save(user=self.request.user, channel=channel)
 
         # create transaction history
-        models.TransactionHistory.objects.create(
+        models.TransactionHistory.record(
             user=self.request.user,
-            history_id=instance.id,
-            history_model=instance,
+            obj=instance,
             credit_debit_status=models.TransactionHistory.CreditDebitStatus.DEBIT,
-            history_type=models.TransactionHistory.TransactionType.TRANSFER,
-            date_created=timezone.now(),
         )
-        # update expense limit if any
-        celery_tasks.update_expense_limit.delay(
-            account_id=instance.source_account.id,
-            transaction_purpose=instance.purpose_of_transaction,
-            amount=instance.amount,
-        )
-        return serializer.save()
+        return instance
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        instance = self.perform_create(serializer)
 
-        if not check_expense_limit(
-            account_id=instance.source_account.id,
-            transaction_purpose=instance.purpose_of_transaction,
-            amount=instance.amount,
-        ):
+        # count the amount against the expense limits before posting it
+        try:
+            limit_ids = expense_limits.reserve(
+                account_id=serializer.validated_data["source_account"].id,
+                transaction_purpose=serializer.validated_data[
+                    "purpose_of_transaction"
+                ],
+                amount=serializer.validated_data["amount"],
+            )
+        except expense_limits.ExpenseLimitExceeded:
             raise exceptions.GeneralException(
                 detail="Your limit for this transaction has been exceeded"
             )
+        try:
+            instance = self.perform_create(serializer)
+        except Exception:
+            expense_limits.release(limit_ids, serializer.validated_data["amount"])
+            raise
 
+        # booked stays None until T24 has said whether it booked the posting
+        response, booked = None, None
         try:
             if instance.transfer_type in [
                 "Other Bank Transfer",
@@ -394,13 +276,16 @@ class TransferViewset(ModelViewSet):
 
             url = f"{base_url}/party/creategtiFundsTransfer"
             headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-            response = requests.post(
+            response = t24_http.post(
                 url, headers=headers, json=json.dumps({"body": payload})
             )
             data = json.loads(response.text)
 
             req_status = data["header"]["status"]
             errorcode = ""
+            booked = req_status.lower() == "success"
+            if not booked:
+                expense_limits.release(limit_ids, instance.amount)
 
             if response.status_code != 200:
                 if "error" in data:
@@ -425,6 +310,10 @@ class TransferViewset(ModelViewSet):
             )
             instance.status = req_status.title()
             instance.save()
+            # after the save, a cache outage must not fail a booked posting
+            balance_cache.invalidate_quietly(
+                payload["debitAccountId"], payload["creditAccountId"]
+            )
 
             # create a credit notificaiton to the recipeient account
             if req_status == "success":
@@ -459,13 +348,10 @@ class TransferViewset(ModelViewSet):
                     if recipient_account:
                         # account_number = recipient_account.first()
                         user_account = recipient_account.user
-                        models.TransactionHistory.objects.create(
+                        models.TransactionHistory.record(
                             user=user_account,
-                            history_id=instance.id,
-                            history_model=instance,
+                            obj=instance,
                             credit_debit_status=models.TransactionHistory.CreditDebitStatus.CREDIT,
-                            history_type=models.TransactionHistory.TransactionType.TRANSFER,
-                            date_created=timezone.now(),
                         )
                 except Exception:
                     pass
@@ -482,6 +368,11 @@ class TransferViewset(ModelViewSet):
 
         except Exception as e:
             print("===== T24 REQUEST ERROR: ", str(e))
+            if booked is None and not expense_limits.posting_uncertain(e, response):
+                expense_limits.release(limit_ids, instance.amount)
+                instance.status = models.Transfer.TransferStatus.FAILED
+                instance.failed_reason = str(e)
+                instance.save()
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -505,6 +396,8 @@ class TransferViewset(ModelViewSet):
             transfer=instance,
             edit_trail=differences.strip(),
         )
+        # the recipient may have changed, copy the history columns again
+        models.TransactionHistory.refresh(instance)
 
         return super().perform_update(serializer)
 
@@ -580,37 +473,38 @@ class PaymentViewset(ModelViewSet):
         instance = serializer.save(user=self.request.user, channel=channel)
 
         # create transaction history
-        models.TransactionHistory.objects.create(
+        models.TransactionHistory.record(
             user=self.request.user,
-            history_id=instance.id,
-            history_model=instance,
+            obj=instance,
             credit_debit_status=models.TransactionHistory.CreditDebitStatus.DEBIT,
-            history_type=models.TransactionHistory.TransactionType.PAYMENT,
-            date_created=timezone.now(),
-        )
-
-        # update expense limit if any
-        celery_tasks.update_expense_limit.delay(
-            account_id=instance.source_account.id,
-            transaction_purpose=instance.purpose_of_transaction,
-            amount=instance.amount,
         )
-        return serializer.save()
+        return instance
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        instance = self.perform_create(serializer)
 
-        if not check_expense_limit(
-            account_id=instance.source_account.id,
-            transaction_purpose=instance.purpose_of_transaction,
-            amount=instance.amount,
-        ):
+        # count the amount against the expense limits before posting it
+        try:
+            limit_ids = expense_limits.reserve(
+                account_id=serializer.validated_data["source_account"].id,
+                transaction_purpose=serializer.validated_data[
+                    "purpose_of_transaction"
+                ],
+                amount=serializer.validated_data["amount"],
+            )
+        except expense_limits.ExpenseLimitExceeded:
             raise exceptions.GeneralException(
                 detail="Your limit for this transaction has been exceeded"
             )
+        try:
+            instance = self.perform_create(serializer)
+        except Exception:
+            expense_limits.release(limit_ids, serializer.validated_data["amount"])
+            raise
 
+        # booked stays None until T24 has said whether it booked the posting
+        response, booked = None, None
         try:
             if instance.payment_type in ["Airtime", "Data"]:
                 gl_account = settings.UNITEL_GL_ACCOUNT
@@ -629,13 +523,16 @@ class PaymentViewset(ModelViewSet):
 
             url = f"{base_url}/party/creategtiFundsTransfer"
             headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-            response = requests.post(
+            response = t24_http.post(
                 url, headers=headers, json=json.dumps({"body": payload})
             )
             data = json.loads(response.text)
 
             req_status = data["header"]["status"]
             errorcode = ""
+            booked = req_status.lower() == "success"
+            if not booked:
+                expense_limits.release(limit_ids, instance.amount)
 
             if response.status_code != 200:
                 if "error" in data:
@@ -660,6 +557,10 @@ class PaymentViewset(ModelViewSet):
             )
             instance.status = req_status.title()
             instance.save()
+            # after the save, a cache outage must not fail a booked posting
+            balance_cache.invalidate_quietly(
+                payload["debitAccountId"], payload["creditAccountId"]
+            )
 
             if req_status != "Success":
                 payload = {
@@ -694,6 +595,9 @@ class PaymentViewset(ModelViewSet):
             )
 
         except Exception as e:
+            if booked is None and not expense_limits.posting_uncertain(e, response):
+                expense_limits.release(limit_ids, instance.amount)
+                instance.status = models.Payment.PaymentStatus.FAILED.value
             instance.failed_reason = str(e)
             instance.save()
             print("===== T24 REQUEST ERROR: ", str(e))
@@ -716,6 +620,39 @@ class BankStatementViewset(ModelViewSet):
         return self.queryset.filter(user=self.request.user)
 
 
+@extend_schema(tags=["E-Statement Jobs"])
+class StatementJobViewset(ModelViewSet):
+    queryset = models.StatementJob.objects.select_related("bank_account")
+    serializer_class = serializers.StatementJobSerializer
+    permission_classes = [rest_permissions.IsAuthenticated]
+    http_method_names = ["get"]
+    lookup_field = "uuid"
+    filterset_fields = ["status", "bank_account"]
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user)
+
+
+@extend_schema(tags=["Transaction History"])
+class TransactionHistoryViewset(ModelViewSet):
+    """
+    the customer's transfers and payments, newest first, from the history
+    table alone
+    """
+
+    queryset = models.TransactionHistory.objects.all()
+    serializer_class = serializers.TransactionHistorySerializer
+    permission_classes = [rest_permissions.IsAuthenticated]
+    pagination_class = TransactionHistoryCursorPagination
+    http_method_names = ["get"]
+    # no OrderingFilter, ?ordering= would break the keyset the cursor pages on
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["history_type", "credit_debit_status", "account_number"]
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user)
+
+
 @extend_schema(tags=["Beneficiary"])
 class BeneficiaryViewset(ModelViewSet):
     queryset = models.Beneficiary.objects.all()
@@ -1001,14 +938,125 @@ class EmailIndemnityViewset(ModelViewSet):
         return serializer.save(user=self.request.user)
 
 
+@extend_schema(tags=["Health"])
+class T24HealthView(APIView):
+    authentication_classes = [
+        MetricsTokenAuthentication,
+        *api_settings.DEFAULT_AUTHENTICATION_CLASSES,
+    ]
+    permission_classes = [IsStaffOrMetricsToken]
+
+    def get(self, request):
+        data = T24Requests.health_status()
+        return Response(
+            data=data,
+            status=(
+                status.HTTP_200_OK
+                if data["reachable"]
+                else status.HTTP_503_SERVICE_UNAVAILABLE
+            ),
+        )
+
+
+@extend_schema(tags=["Bank Accounts"])
+class AccountBalanceView(AsyncAPIView):
+    permission_classes = [rest_permissions.IsAuthenticated]
+    serializer_class = serializers.ValidateAccountNumberSerializer
+
+    async def post(self, request: HttpRequest):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        account_number = serializer.validated_data["account_number"]
+
+        entry = await balance_cache.aget(account_number)
+        if entry is None:
+            response = await AsyncT24Requests.get_account_details(
+                account_number=account_number
+            )
+            details = response[0] if response else None
+            if details:
+                await balance_cache.astore(account_number, details)
+        else:
+            details = entry["details"]
+            if not balance_cache.is_fresh(entry):
+                await sync_to_async(balance_cache.schedule_refresh)([account_number])
+
+        if details:
+            data = {
+                "account_number": details["accountNo"],
+                "account_name": details["accountName"],
+                "account_category": details["accountCategory"],
+                "account_balance": (
+                    details["workingBalance"] if "workingBalance" in details else 0.00
+                ),
+            }
+        else:
+            data = {
+                "status": False,
+                "message": "This service is not available at the moment",
+            }
+
+        return Response(
+            data=data,
+            status=status.HTTP_200_OK,
+        )
+
+
+@extend_schema(tags=["Bank Accounts"])
+class MiniStatementView(AsyncAPIView):
+    permission_classes = [rest_permissions.IsAuthenticated]
+    serializer_class = serializers.AccountStatementSerializer
+
+    async def post(self, request: HttpRequest, pk):
+        bank_account = await aget_object_or_404(
+            models.BankAccount, pk=pk, user=request.user
+        )
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        start_date = data.get("start_date")
+        end_date = data.get("end_date")
+
+        # T24 is only asked for what the statement ledger does not hold yet
+        try:
+            await sync_to_async(ledger.sync)(bank_account, start_date, end_date)
+        except StatementUnavailable:
+            raise exceptions.GeneralException(
+                detail="Failed to retrieve account statement",
+            )
+
+        pages = ledger.aentry_pages(
+            bank_account, start_date, end_date, settings.T24_STATEMENT_PAGE_SIZE
+        )
+        return StreamingHttpResponse(
+            self.stream(pages),
+            content_type="application/json",
+        )
+
+    @staticmethod
+    async def stream(pages):
+        """
+        the usual {"status", "message", "data"} body, written a page at a
+        time
+        """
+        yield '{"data": ['
+        separator = ""
+        async for entries in pages:
+            yield separator + ", ".join(map(json.dumps, entries))
+            separator = ", "
+        result = {"status": True, "message": "retrieved account statment"}
+        yield "], " + json.dumps(result)[1:]
+
+
 @extend_schema(tags=["FX Rates"])
-class ForexViewset(APIView):
+class ForexViewset(AsyncAPIView):
     permission_classes = [rest_permissions.IsAuthenticated]
 
-    def get(self, request):
+    async def get(self, request):
         # get transa
         exchange_rates = []
-        response = T24Requests.get_exchange_rate()
+        response = await AsyncT24Requests.get_exchange_rate()
         if response:
             for data in response:
                 if "ccy" in data:
@@ -1134,9 +1182,12 @@ class BillSharingPayeeViewset(ModelViewSet):
 
             url = f"{base_url}/party/creategtiFundsTransfer"
             headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-            response = requests.post(
+            response = t24_http.post(
                 url, headers=headers, json=json.dumps({"body": payload})
             )
+            balance_cache.invalidate_quietly(
+                payload["debitAccountId"], payload["creditAccountId"]
+            )
             data = json.loads(response.text)
 
             errorcode = ""
@@ -1326,9 +1377,12 @@ class CardViewset(ModelViewSet):
 
         url = f"{base_url}/party/creategtiFundsTransfer"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-        response = requests.post(
+        response = t24_http.post(
             url, headers=headers, json=json.dumps({"body": payload})
         )
+        balance_cache.invalidate_quietly(
+            payload["debitAccountId"], payload["creditAccountId"]
+        )
         data = json.loads(response.text)
 
         errorcode = ""
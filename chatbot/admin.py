@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ConversationThread, ConversationEntry, Escalation
+from .models import CachedAnswer, ConversationThread, ConversationEntry, Escalation
 
 
 @admin.register(ConversationThread)
@@ -45,3 +45,11 @@ class EscalationAdmin(admin.ModelAdmin):
     list_filter = ("is_urgent", "customer_sentiment", "status", "created_at")
     search_fields = ("user__username", "user__email", "issue_summary")
     readonly_fields = ("id", "created_at", "updated_at")
+
+
+@admin.register(CachedAnswer)
+class CachedAnswerAdmin(admin.ModelAdmin):
+    list_display = ("question", "language", "audience", "hits", "created_at")
+    list_filter = ("language", "audience", "created_at")
+    search_fields = ("question", "answer")
+    readonly_fields = ("id", "normalized_question", "embedding", "hits", "created_at")
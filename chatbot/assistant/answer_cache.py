@@ -0,0 +1,211 @@
+"""
+opt-in cache of answers to general chatbot questions (CHATBOT_ANSWER_CACHE).
+
+only the first question of a thread is looked up or stored, so an answer
+never depends on earlier turns. an answer is stored only when the turn
+called no tool, since every tool is account scoped or location based, and
+when the reply mentions nothing of the customer. questions match on their
+normalized text first, then on the cosine similarity of their embeddings,
+always within the same language and audience (customer or not).
+
+embeddings live in the CachedAnswer table and are searched in process.
+storing an answer bumps a stored key, and on their next lookup workers add
+the answers created since they last read the table to their index.
+deleting one bumps a version key so every worker reloads the whole index.
+expired answers are deleted by the prune_answer_cache task.
+"""
+
+import math
+import operator
+import re
+import threading
+import unicodedata
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from loguru import logger
+
+from helpers import metrics
+
+VERSION_KEY = "chatbot:answer-cache-version"
+STORED_KEY = "chatbot:answer-cache-stored"
+# answers are committed a moment after their created_at is set
+STORE_LAG = timedelta(seconds=5)
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def invalidate():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def prune():
+    """
+    delete the answers older than CHATBOT_ANSWER_CACHE_TTL, returns how many
+    """
+    from chatbot.models import CachedAnswer
+
+    cutoff = timezone.now() - timedelta(seconds=settings.CHATBOT_ANSWER_CACHE_TTL)
+    deleted, _ = CachedAnswer.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _dot(a, b):
+    return sum(map(operator.mul, a, b))
+
+
+def _record(result, language):
+    metrics.registry.increment(
+        "digital_chatbot_answer_cache_total",
+        {"result": result, "language": language},
+    )
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        embeddings=None,
+        threshold=settings.CHATBOT_ANSWER_CACHE_THRESHOLD,
+        ttl=settings.CHATBOT_ANSWER_CACHE_TTL,
+        max_entries=settings.CHATBOT_ANSWER_CACHE_SIZE,
+    ):
+        if embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+
+            # short vectors keep the in-process search cheap
+            embeddings = OpenAIEmbeddings(
+                model="text-embedding-3-small", dimensions=256
+            )
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (language, audience) -> [(answer id, embedding)]
+        self._index = {}
+        self._ids = set()
+        self._version = None
+        self._stored = None
+        # answers created from here on are not in the index yet
+        self._since = None
+
+    def _fresh(self):
+        from chatbot.models import CachedAnswer
+
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        return CachedAnswer.objects.filter(created_at__gte=cutoff)
+
+    def _load_index(self):
+        version = cache.get_or_set(VERSION_KEY, uuid.uuid4().hex, None)
+        stored = cache.get(STORED_KEY)
+        if version == self._version and stored == self._stored:
+            return
+        with self._lock:
+            if version != self._version:
+                self._reload()
+                self._version = version
+            elif stored != self._stored:
+                self._append()
+            self._stored = stored
+
+    def _rows(self, answers):
+        return answers.values_list("id", "language", "audience", "embedding")
+
+    def _reload(self):
+        since = timezone.now() - STORE_LAG
+        index, ids = defaultdict(list), set()
+        rows = self._rows(self._fresh().order_by("-hits", "-created_at"))
+        for pk, language, audience, embedding in rows[: self.max_entries]:
+            index[(language, audience)].append((pk, embedding))
+            ids.add(pk)
+        self._index, self._ids, self._since = index, ids, since
+        logger.debug(f"Answer cache index loaded, {len(ids)} answers")
+
+    def _append(self):
+        since = timezone.now() - STORE_LAG
+        rows = self._rows(
+            self._fresh().filter(created_at__gte=self._since).order_by("created_at")
+        )
+        added = 0
+        for pk, language, audience, embedding in rows:
+            if pk in self._ids or len(self._ids) >= self.max_entries:
+                continue
+            self._index.setdefault((language, audience), []).append((pk, embedding))
+            self._ids.add(pk)
+            added += 1
+        self._since = since
+        logger.debug(f"Answer cache index grew by {added} answers")
+
+    def _nearest(self, vector, language, audience):
+        self._load_index()
+        best, best_score = None, self.threshold
+        for pk, embedding in self._index.get((language, audience), []):
+            score = _dot(vector, embedding)
+            if score >= best_score:
+                best, best_score = pk, score
+        return best
+
+    def lookup(self, question, language, audience):
+        """
+        returns (CachedAnswer or None, embedding of the question or None)
+        """
+        normalized = normalize(question)
+        if not normalized:
+            return None, None
+        answers = self._fresh().filter(language=language, audience=audience)
+        answer = answers.filter(normalized_question=normalized[:500]).first()
+        vector = None
+        if answer is not None:
+            _record("exact_hit", language)
+        else:
+            vector = _unit(self.embeddings.embed_query(normalized))
+            pk = self._nearest(vector, language, audience)
+            answer = answers.filter(pk=pk).first() if pk else None
+            _record("semantic_hit" if answer else "miss", language)
+        if answer is not None:
+            answers.filter(pk=answer.pk).update(
+                hits=F("hits") + 1, last_hit_at=timezone.now()
+            )
+        return answer, vector
+
+    def store(self, question, answer, language, audience, private=(), vector=None):
+        from chatbot.models import CachedAnswer
+
+        # names, phone, email and account numbers of the customer
+        folded = answer.casefold()
+        if any(
+            re.search(rf"(?<!\w){re.escape(value.casefold())}(?!\w)", folded)
+            for value in private
+            if value
+        ):
+            # personalized reply, e.g. it greets the customer by name
+            _record("rejected", language)
+            return None
+        normalized = normalize(question)
+        if vector is None:
+            vector = _unit(self.embeddings.embed_query(normalized))
+        cached = CachedAnswer.objects.create(
+            question=question,
+            normalized_question=normalized[:500],
+            language=language,
+            audience=audience,
+            answer=answer,
+            embedding=vector,
+        )
+        _record("stored", language)
+        cache.set(STORED_KEY, uuid.uuid4().hex, None)
+        return cached
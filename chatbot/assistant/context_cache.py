@@ -0,0 +1,42 @@
+"""
+cache of the rendered system prompt per user and thread.
+
+every tool round-trip of an answer runs the chat node again, so the prompt
+is built once and reused for the rest of the turn. reusing it byte for byte
+also lets the provider's prompt-prefix caching apply. entries are keyed on
+a per-user version that is bumped whenever the user or their accounts
+change, which drops every cached prompt of that user at once.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _version_key(user_id):
+    return f"chatbot:context-version:{user_id}"
+
+
+def version(user_id):
+    return cache.get_or_set(_version_key(user_id), uuid.uuid4().hex, None)
+
+
+def invalidate(user_id):
+    cache.set(_version_key(user_id), uuid.uuid4().hex, None)
+
+
+def cache_key(user_id, thread_id, user_longitude, user_latitude):
+    return (
+        f"chatbot:context:{user_id}:{thread_id}:{version(user_id)}:"
+        f"{user_longitude}:{user_latitude}"
+    )
+
+
+def get_or_build(user_id, thread_id, user_longitude, user_latitude, build):
+    key = cache_key(user_id, thread_id, user_longitude, user_latitude)
+    prompt = cache.get(key)
+    if prompt is None:
+        prompt = build()
+        cache.set(key, prompt, settings.CHATBOT_CONTEXT_TTL)
+    return prompt
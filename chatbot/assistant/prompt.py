@@ -116,3 +116,18 @@ Note: Always respond in the language of the user (Swahili or English).
 About Consolidated Bank of Kenya:
 {about_the_bank}
 """.format(about_the_bank=ABOUT_THE_BANK)
+
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a bank customer and the Consolidated Bank of Kenya virtual assistant. The summary replaces older messages that are no longer sent to the assistant, so keep every fact it may need later: what the customer asked for, accounts, amounts, dates, card or complaint references, tool results and anything still pending. Leave out greetings and small talk. Write at most a few short paragraphs in the third person.
+
+Current summary:
+{summary}
+
+Extend the summary with the following messages and reply with the updated summary only.
+"""
+
+SUMMARY_CONTEXT = """
+Summary of the earlier conversation with this user:
+{summary}
+"""
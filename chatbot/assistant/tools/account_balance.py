@@ -3,6 +3,7 @@ from pydantic import BaseModel, Field
 from langchain_core.runnables import RunnableConfig
 
 from cbs.models import BankAccount
+from cbs import balance_cache
 from .base import GenericBaseTool
 
 
@@ -30,9 +31,13 @@ class AccountBalanceTool(GenericBaseTool):
         except BankAccount.DoesNotExist:
             raise ValueError(f"BankAccount with id {source_account_id} not found.")
 
+        # no T24 call from the assistant, revalidate_account_balances keeps
+        # the cached and stored balances current
+        entry = balance_cache.get(account.account_number) or {}
+        details = entry.get("details") or {}
         return {
             "account_id": source_account_id,
             "account_number": account.account_number,
-            "balance": str(account.account_balance),
+            "balance": str(details.get("workingBalance", account.account_balance)),
             "currency": account.currency,
         }
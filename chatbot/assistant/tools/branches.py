@@ -1,9 +1,10 @@
-import math
 from typing import Type
 
 from langchain_core.tools import BaseTool
+from django.db.models import Q
 from pydantic import BaseModel, Field
 
+from datatable import geo
 from datatable.models import BankBranch
 
 
@@ -35,13 +36,13 @@ class BranchLocatorTool(BaseTool):
         skip: int = 0,
     ) -> dict:
         if only_closest and latitude and longitude:
-            closest = BankBranch.find_closest(latitude, longitude)
+            closest = BankBranch.find_closest(latitude, longitude, limit=limit)
             branches = [
                 {
                     "id": branch["id"],
                     "name": branch["name"],
                     "address": branch["address"],
-                    "distance": branch["distance"],
+                    "distance": round(branch["distance"], 2),
                     "map_url": f"https://www.google.com/maps/dir/?api=1&destination={branch.get('langtitude_cordinates', '')},{branch.get('longitude_cordinates', '')}"
                     if branch.get("langtitude_cordinates")
                     and branch.get("longitude_cordinates")
@@ -58,65 +59,67 @@ class BranchLocatorTool(BaseTool):
                     "has_more": False,
                 },
             }
+        elif latitude and longitude:
+            # open branches, closest first, then those without coordinates
+            nearest = geo.index_for(BankBranch).nearest(latitude, longitude)
+            unlocated = (
+                BankBranch.objects.filter(closed=False)
+                .filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+                .order_by("id")
+            )
+            total_count = len(nearest) + unlocated.count()
+            end = skip + limit
+            page = nearest[skip:end]
+            by_id = BankBranch.objects.in_bulk([pk for _, pk in page])
+            distances = {pk: distance for distance, pk in page}
+            paginated_branches = [by_id[pk] for _, pk in page if pk in by_id]
+
+            first, last = max(skip - len(nearest), 0), max(end - len(nearest), 0)
+            if last > first:
+                for branch in unlocated[first:last]:
+                    distances[branch.id] = None
+                    paginated_branches.append(branch)
         else:
             all_branches = BankBranch.objects.all()
             total_count = all_branches.count()
+            distances = {}
 
-            paginated_branches = all_branches[skip : skip + limit]
+            end = skip + limit
+            paginated_branches = all_branches[skip:end]
 
-            branches = []
-            for branch in paginated_branches:
-                branch_data = {
-                    "id": getattr(branch, "id", None),
-                    "name": getattr(branch, "name", ""),
-                    "address": getattr(branch, "address", ""),
-                }
-
-                lat_coord = getattr(branch, "langtitude_cordinates", None)
-                lon_coord = getattr(branch, "longitude_cordinates", None)
-
-                if lat_coord and lon_coord:
-                    branch_data["map_url"] = (
-                        f"https://www.google.com/maps/dir/?api=1&destination={lat_coord},{lon_coord}"
-                    )
-
-                    if latitude and longitude:
-                        try:
-                            distance = self.haversine_distance(
-                                latitude, longitude, lat_coord, lon_coord
-                            )
-                            branch_data["distance"] = round(distance, 2)
-                        except (ValueError, TypeError):
-                            pass
-
-                branches.append(branch_data)
-
-            return {
-                "branches": branches,
-                "pagination": {
-                    "total": total_count,
-                    "skip": skip,
-                    "limit": limit,
-                    "has_more": skip + limit < total_count,
-                    "next_skip": skip + limit if skip + limit < total_count else None,
-                    "current_page": (skip // limit) + 1,
-                    "total_pages": (total_count + limit - 1) // limit,
-                },
+        branches = []
+        for branch in paginated_branches:
+            branch_data = {
+                "id": getattr(branch, "id", None),
+                "name": getattr(branch, "name", ""),
+                "address": getattr(branch, "address", ""),
             }
 
-    @staticmethod
-    def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        R = 6371.0
-        phi1 = math.radians(lat1)
-        phi2 = math.radians(lat2)
-        delta_phi = math.radians(lat2 - lat1)
-        delta_lambda = math.radians(lon2 - lon1)
-
-        a = (
-            math.sin(delta_phi / 2) ** 2
-            + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
-        )
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-        distance = R * c
-        return distance
+            lat_coord = getattr(branch, "langtitude_cordinates", None)
+            lon_coord = getattr(branch, "longitude_cordinates", None)
+
+            if lat_coord and lon_coord:
+                branch_data["map_url"] = (
+                    f"https://www.google.com/maps/dir/?api=1&destination={lat_coord},{lon_coord}"
+                )
+
+            if branch.id in distances:
+                distance = distances[branch.id]
+                branch_data["distance"] = (
+                    "unknown" if distance is None else round(distance, 2)
+                )
+
+            branches.append(branch_data)
+
+        return {
+            "branches": branches,
+            "pagination": {
+                "total": total_count,
+                "skip": skip,
+                "limit": limit,
+                "has_more": skip + limit < total_count,
+                "next_skip": skip + limit if skip + limit < total_count else None,
+                "current_page": (skip // limit) + 1,
+                "total_pages": (total_count + limit - 1) // limit,
+            },
+        }
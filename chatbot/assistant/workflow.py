@@ -1,6 +1,7 @@
-import operator
 from typing import Annotated, Any, Dict, List, TypedDict
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from loguru import logger
 import orjson
 from django.core.exceptions import ObjectDoesNotExist
@@ -10,41 +11,131 @@ from langchain_core.messages import (
     AIMessageChunk,
     AnyMessage,
     HumanMessage,
+    RemoveMessage,
     SystemMessage,
     ToolMessage,
+    get_buffer_string,
 )
-from langchain_core.runnables import RunnableConfig, ensure_config
+from langchain_core.messages.ai import add_usage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableConfig, RunnableLambda, ensure_config
 from langchain_core.tools import BaseTool
 from langgraph.checkpoint.base import BaseCheckpointSaver
-from langgraph.graph import StateGraph
+from langgraph.graph import StateGraph, add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 
 from accounts.models import CustomUser
 from cbs.models import BankAccount
-from chatbot.assistant.prompt import SYSTEM_PROMPT, NON_CUSTOMER_PROMPT
+from chatbot.assistant import context_cache
+from chatbot.assistant.answer_cache import AnswerCache
+from chatbot.assistant.prompt import (
+    NON_CUSTOMER_PROMPT,
+    SUMMARY_CONTEXT,
+    SUMMARY_PROMPT,
+    SYSTEM_PROMPT,
+)
 
 
 class WorkflowState(TypedDict):
-    messages: Annotated[List[AnyMessage], operator.add]
+    messages: Annotated[List[AnyMessage], add_messages]
+    # running summary of the turns no longer sent verbatim
+    summary: str
     user_longitude: float | None
     user_latitude: float | None
 
 
 class AssistantWorkflow:
-    def __init__(self, llm: BaseChatModel, tools: list[BaseTool]):
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        tools: list[BaseTool],
+        history_turns: int = settings.CHATBOT_HISTORY_TURNS,
+        token_budget: int = settings.CHATBOT_TOKEN_BUDGET,
+        answer_cache: AnswerCache | None = None,
+    ):
         self.llm = llm
+        self.answer_cache = answer_cache
+        # summaries are internal, their tokens stay out of the chat stream
+        self.summarizer = llm.with_config(tags=["nostream"], run_name="summarize")
+        self.history_turns = max(history_turns, 1)
+        self.token_budget = token_budget
         self.tools = tools
         self.llm_with_tools = llm.bind_tools(tools)
         self.tool_node = ToolNode(tools)
         self.graph = None
 
-    def call_llm(self, state: WorkflowState, config: RunnableConfig):
-        system_prompt = self.get_customer_context(
+    async def acall_llm(self, state: WorkflowState, config: RunnableConfig):
+        system_prompt = await sync_to_async(self.get_customer_context)(
             config, state.get("user_longitude", None), state.get("user_latitude", None)
         )
+        messages = self._context(system_prompt, state)
+        return {"messages": [await self.llm_with_tools.ainvoke(messages, config)]}
+
+    def _context(self, system_prompt: str, state: WorkflowState) -> list:
+        messages: list = [SystemMessage(content=system_prompt)]
+        if state.get("summary"):
+            messages.append(
+                SystemMessage(content=SUMMARY_CONTEXT.format(summary=state["summary"]))
+            )
+        messages += state["messages"]
+        logger.debug(
+            f"Chat context: {len(state['messages'])} messages, "
+            f"~{count_tokens_approximately(messages)} tokens"
+        )
+        return messages
+
+    async def acompact(self, state: WorkflowState, config: RunnableConfig):
         messages = state["messages"]
-        messages = [SystemMessage(content=system_prompt)] + messages
-        return {"messages": [self.llm_with_tools.invoke(messages)]}
+        split = self._split_history(messages)
+        if not split:
+            return {}
+        summary = await self.summarizer.ainvoke(
+            self._summary_request(state, messages[:split]), config
+        )
+        return self._compacted(messages, split, summary)
+
+    def _split_history(self, messages: list) -> int:
+        """
+        index of the first message kept verbatim, 0 when the history fits the
+        token budget. the history is only cut before a human message so tool
+        calls stay with their results, and the current turn is always kept.
+        """
+        if count_tokens_approximately(messages) <= self.token_budget:
+            return 0
+        turns = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+        # cutting before the first turn would summarize nothing
+        boundaries = turns[1:]
+        if not boundaries:
+            return 0
+        index = max(len(turns) - self.history_turns, 1) - 1
+        # the last turns alone can still be over budget (large tool results)
+        while index < len(boundaries) - 1:
+            start = boundaries[index]
+            if count_tokens_approximately(messages[start:]) <= self.token_budget:
+                break
+            index += 1
+        return boundaries[index]
+
+    def _summary_request(self, state: WorkflowState, messages: list) -> list:
+        return [
+            SystemMessage(
+                content=SUMMARY_PROMPT.format(
+                    summary=state.get("summary") or "No summary yet."
+                )
+            ),
+            HumanMessage(content=get_buffer_string(messages)),
+        ]
+
+    def _compacted(self, messages: list, split: int, summary: AIMessage):
+        logger.info(
+            f"Summarized {split} of {len(messages)} messages, history "
+            f"~{count_tokens_approximately(messages)} -> "
+            f"~{count_tokens_approximately(messages[split:])} tokens"
+        )
+        return {
+            "summary": str(summary.content),
+            "messages": [RemoveMessage(id=m.id) for m in messages[:split]],  # type: ignore
+        }
 
     def get_customer_context(
         self,
@@ -54,10 +145,27 @@ class AssistantWorkflow:
     ) -> str:
         user_id = None
         config = ensure_config(config)
-        user_cfg = config.get("configurable", {}).get("user", {})
-        user_id = user_cfg.get("id")
+        configurable = config.get("configurable", {})
+        user_id = configurable.get("user", {}).get("id")
         if not user_id:
             raise ValueError("User ID not found")
+        # built once per turn, the chat node runs again after every tool call
+        return context_cache.get_or_build(
+            user_id,
+            configurable.get("thread_id"),
+            user_longitude,
+            user_latitude,
+            lambda: self._build_customer_context(
+                user_id, user_longitude, user_latitude
+            ),
+        )
+
+    def _build_customer_context(
+        self,
+        user_id,
+        user_longitude: float | None,
+        user_latitude: float | None,
+    ) -> str:
         user = None
         try:
             logger.debug(f"User ID: {user_id}")
@@ -104,80 +212,196 @@ class AssistantWorkflow:
 
     def build_graph(self, checkpoint_saver: BaseCheckpointSaver):
         graph = StateGraph(WorkflowState)
-        graph.add_node("chat", self.call_llm)
+        graph.add_node("chat", RunnableLambda(self.acall_llm, name="chat"))
+        graph.add_node("compact", RunnableLambda(self.acompact, name="compact"))
         graph.add_node("tools", self.tool_node)
-        graph.set_entry_point("chat")
+        # history is compacted once per turn, before the first model call
+        graph.set_entry_point("compact")
+        graph.add_edge("compact", "chat")
         graph.add_conditional_edges("chat", tools_condition)
         graph.add_edge("tools", "chat")
         self.graph = graph.compile(checkpointer=checkpoint_saver)
 
-    def stream(
+    def _inputs(self, human_message, user_longitude, user_latitude):
+        return {
+            "messages": [HumanMessage(content=human_message)],
+            "user_longitude": user_longitude,
+            "user_latitude": user_latitude,
+        }
+
+    async def astream(
         self,
         human_message: str,
         user_longitude: float | None,
         user_latitude: float | None,
         config: RunnableConfig,
     ):
+        """
+        stream a chat turn, for a graph built with an async checkpointer.
+        closing the generator cancels the running LLM call.
+        """
         if self.graph is None:
             raise ValueError("Graph not built")
-        response: Dict[str, Any] = {"event": None, "data": None}
-        for mode, part in self.graph.stream(
-            {
-                "messages": [HumanMessage(content=human_message)],
-                "user_longitude": user_longitude,
-                "user_latitude": user_latitude,
-            },
+        scope, vector = None, None
+        if self.answer_cache and not (await self.graph.aget_state(config)).values.get(
+            "messages"
+        ):
+            scope, vector, cached = await sync_to_async(self._cache_lookup)(
+                human_message, config
+            )
+            if cached is not None:
+                await self.graph.aupdate_state(
+                    config,
+                    self._cached_turn(
+                        human_message, cached.answer, user_longitude, user_latitude
+                    ),
+                    as_node="chat",
+                )
+                yield {"event": "llm", "data": cached.answer}
+                return
+
+        usage, reply, used_tools = None, [], False
+        async for mode, part in self.graph.astream(
+            self._inputs(human_message, user_longitude, user_latitude),
             config=config,
             stream_mode=["messages"],
         ):
-            if mode == "messages":
-                seq = list(part)
-                msg = seq[0]
-                if isinstance(msg, ToolMessage):
-                    try:
-                        tool_call = orjson.loads(msg.content)  # type: ignore
-                    except orjson.JSONDecodeError:
-                        tool_call = (
-                            msg.content
-                            if "error" not in str(msg.content).lower()
-                            else []
-                        )
-                    response["event"] = "tool_response"
-                    response["data"] = tool_call
-                elif isinstance(msg, AIMessageChunk):
-                    if msg.content:
-                        content = str(msg.content)
-                        response["event"] = "llm"
-                        response["data"] = content
-                    else:
-                        continue
+            usage = add_usage(usage, self._usage(mode, part))
+            response = self._to_event(mode, part)
+            if response is not None:
+                if response["event"] == "llm":
+                    reply.append(response["data"])
+                elif response["event"] == "tool_response":
+                    used_tools = True
+                yield response
+        if usage:
+            yield self._usage_event(usage)
+        if scope is not None and reply and not used_tools:
+            await sync_to_async(self._cache_store)(
+                human_message, "".join(reply), scope, vector
+            )
+
+    def _cache_scope(self, user_id) -> Dict[str, Any]:
+        """
+        language and audience of the user, and their own details, which a
+        shared answer must not contain
+        """
+        user = CustomUser.objects.get(id=user_id)
+        accounts = list(
+            BankAccount.objects.filter(user=user).values_list(
+                "account_number", flat=True
+            )
+        )
+        return {
+            "language": getattr(user, "preferred_language", "English"),
+            "audience": "customer" if accounts else "non_customer",
+            "private": [
+                *str(user).split(),
+                user.username,
+                user.email or "",
+                str(user.phone_number or ""),
+                *accounts,
+            ],
+        }
+
+    def _cache_lookup(self, human_message, config):
+        """
+        (scope, question embedding, cached answer) for the first question of
+        a thread, the cache never fails a chat
+        """
+        try:
+            configurable = ensure_config(config).get("configurable", {})
+            scope = self._cache_scope(configurable["user"]["id"])
+            cached, vector = self.answer_cache.lookup(  # type: ignore
+                human_message, scope["language"], scope["audience"]
+            )
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None, None, None
+        return scope, vector, cached
+
+    def _cache_store(self, human_message, reply, scope, vector):
+        try:
+            self.answer_cache.store(  # type: ignore
+                human_message, reply, vector=vector, **scope
+            )
+        except Exception as e:
+            logger.warning(f"Answer cache store failed: {e}")
+
+    def _cached_turn(self, human_message, answer, user_longitude, user_latitude):
+        turn = self._inputs(human_message, user_longitude, user_latitude)
+        turn["messages"].append(AIMessage(content=answer))
+        return turn
+
+    @staticmethod
+    def _usage(mode, part):
+        """
+        token usage reported by a chat model call, summaries excluded
+        """
+        if mode != "messages":
+            return None
+        msg, metadata = part
+        if isinstance(msg, AIMessageChunk) and metadata.get("langgraph_node") == "chat":
+            return msg.usage_metadata
+        return None
+
+    @staticmethod
+    def _usage_event(usage) -> Dict[str, Any]:
+        logger.info(
+            f"Chat turn used {usage['input_tokens']} input and "
+            f"{usage['output_tokens']} output tokens"
+        )
+        return {"event": "usage", "data": dict(usage)}
+
+    @staticmethod
+    def _to_event(mode, part) -> Dict[str, Any] | None:
+        response: Dict[str, Any] = {"event": None, "data": None}
+        if mode == "messages":
+            seq = list(part)
+            msg = seq[0]
+            if isinstance(msg, ToolMessage):
+                try:
+                    tool_call = orjson.loads(msg.content)  # type: ignore
+                except orjson.JSONDecodeError:
+                    tool_call = (
+                        msg.content if "error" not in str(msg.content).lower() else []
+                    )
+                response["event"] = "tool_response"
+                response["data"] = tool_call
+            elif isinstance(msg, AIMessageChunk):
+                if msg.content:
+                    content = str(msg.content)
+                    response["event"] = "llm"
+                    response["data"] = content
                 else:
-                    continue
-            elif mode == "updates":
-                if (
-                    isinstance(part, dict)
-                    and "chat" in part
-                    and isinstance(part["chat"], dict)
-                    and "messages" in part["chat"]
-                ):
-                    messages = part["chat"]["messages"]
-                    if messages and isinstance(messages, list):
-                        last_message = messages[-1]
-                        if (
-                            isinstance(last_message, AIMessage)
-                            and hasattr(last_message, "tool_calls")
-                            and last_message.tool_calls
-                        ):
-                            tool_call = last_message.tool_calls[0]
-                            response["event"] = "tool_call"
-                            response["data"] = {
-                                "name": tool_call.get("name"),
-                                "args": tool_call.get("args"),
-                            }
-                        else:
-                            continue
+                    return None
+            else:
+                return None
+        elif mode == "updates":
+            if (
+                isinstance(part, dict)
+                and "chat" in part
+                and isinstance(part["chat"], dict)
+                and "messages" in part["chat"]
+            ):
+                messages = part["chat"]["messages"]
+                if messages and isinstance(messages, list):
+                    last_message = messages[-1]
+                    if (
+                        isinstance(last_message, AIMessage)
+                        and hasattr(last_message, "tool_calls")
+                        and last_message.tool_calls
+                    ):
+                        tool_call = last_message.tool_calls[0]
+                        response["event"] = "tool_call"
+                        response["data"] = {
+                            "name": tool_call.get("name"),
+                            "args": tool_call.get("args"),
+                        }
                     else:
-                        continue
+                        return None
                 else:
-                    continue
-            yield response
+                    return None
+            else:
+                return None
+        return response
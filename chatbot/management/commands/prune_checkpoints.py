@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from chatbot import retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Prune the LangGraph checkpoint tables: keep the latest checkpoints "
+        "of each conversation, drop those of deleted conversations and vacuum."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=settings.CHATBOT_CHECKPOINT_KEEP,
+            help="checkpoints kept per thread",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.CHATBOT_CHECKPOINT_BATCH_SIZE,
+            help="threads pruned per transaction",
+        )
+        parser.add_argument("--no-vacuum", action="store_true")
+
+    def handle(self, *args, **options):
+        report = retention.prune(
+            keep=options["keep"],
+            batch_size=options["batch_size"],
+            vacuum=not options["no_vacuum"],
+        )
+        self.stdout.write(
+            f"{report['threads']} threads scanned, "
+            f"{report['deleted_threads']} deleted conversations removed"
+        )
+        if report["failed_pages"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{report['failed_pages']} pages skipped on lock timeouts"
+                )
+            )
+        for table in retention.TABLES:
+            before = report["size_before"][table]
+            after = report["size_after"][table]
+            self.stdout.write(
+                f"{table}: {report['deleted'][table]} rows deleted, "
+                f"{filesizeformat(before)} -> {filesizeformat(after)}"
+            )
+        self.stdout.write(self.style.SUCCESS("Checkpoint retention done"))
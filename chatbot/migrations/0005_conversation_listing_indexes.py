@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chatbot", "0004_conversationentry_delete_conversationmessage"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="conversationentry",
+            index=models.Index(
+                fields=["thread", "-created_at"], name="chatbot_con_thread__11a8ff_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="conversationthread",
+            index=models.Index(
+                fields=["user", "-updated_at"], name="chatbot_con_user_id_bdb119_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:09
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chatbot", "0005_conversation_listing_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CachedAnswer",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("question", models.TextField()),
+                ("normalized_question", models.CharField(max_length=500)),
+                ("language", models.CharField(max_length=50)),
+                (
+                    "audience",
+                    models.CharField(
+                        choices=[
+                            ("customer", "Customer"),
+                            ("non_customer", "Non customer"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("answer", models.TextField()),
+                ("embedding", models.JSONField()),
+                ("hits", models.PositiveIntegerField(default=0)),
+                ("last_hit_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["language", "audience", "normalized_question"],
+                        name="chatbot_cac_languag_39a2b5_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,21 +1,61 @@
 import uuid
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Left
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.conf import settings
 
+from accounts.models import CustomUser
+from cbs.models import BankAccount
+from chatbot.assistant import answer_cache, context_cache
+
 User = settings.AUTH_USER_MODEL
 
 
+class ConversationThreadQuerySet(models.QuerySet):
+    def with_latest_entry(self, preview_length=200):
+        """
+        annotate the entry count and a truncated copy of the latest entry,
+        without loading the other entries
+        """
+        entries = ConversationEntry.objects.filter(thread=OuterRef("pk"))
+        latest = entries.order_by("-created_at")[:1]
+        return self.annotate(
+            entry_count=Coalesce(
+                Subquery(
+                    entries.order_by()
+                    .values("thread")
+                    .annotate(count=Count("*"))
+                    .values("count")
+                ),
+                0,
+            ),
+            latest_entry_id=Subquery(latest.values("id")),
+            latest_entry_created_at=Subquery(latest.values("created_at")),
+            latest_human_message=Subquery(
+                latest.values(preview=Left("human_message", preview_length))
+            ),
+            latest_ai_message=Subquery(
+                latest.values(preview=Left("ai_message", preview_length))
+            ),
+        )
+
+
 class ConversationThread(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ConversationThreadQuerySet.as_manager()
+
     def __str__(self):
         return f"Thread {self.id} - {self.user.username}"
 
     class Meta:
         ordering = ["-updated_at"]
+        indexes = [models.Index(fields=["user", "-updated_at"])]
 
 
 class ConversationEntry(models.Model):
@@ -32,6 +72,7 @@ class ConversationEntry(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [models.Index(fields=["thread", "-created_at"])]
 
 
 class Escalation(models.Model):
@@ -61,3 +102,74 @@ class Escalation(models.Model):
 
     def __str__(self):
         return f"Escalation {self.id} - {self.user}"
+
+
+class CachedAnswer(models.Model):
+    """
+    answer to a general question, reused for similar questions, see
+    chatbot/assistant/answer_cache.py
+    """
+
+    AUDIENCE_CHOICES = [
+        ("customer", "Customer"),
+        ("non_customer", "Non customer"),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    question = models.TextField()
+    normalized_question = models.CharField(max_length=500)
+    language = models.CharField(max_length=50)
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES)
+    answer = models.TextField()
+    # unit length query embedding
+    embedding = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.question[:80]
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["language", "audience", "normalized_question"])]
+
+
+# fields that end up in the assistant's system prompt
+PROMPT_USER_FIELDS = {"fullname", "username", "phone_number", "email"}
+PROMPT_ACCOUNT_FIELDS = {"user", "account_number", "account_category", "default"}
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_user_context(sender, instance, created, update_fields, **kwargs):
+    if not created and _touches(update_fields, PROMPT_USER_FIELDS):
+        context_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=BankAccount)
+def invalidate_account_context(sender, instance, update_fields, **kwargs):
+    if _touches(update_fields, PROMPT_ACCOUNT_FIELDS):
+        context_cache.invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=BankAccount)
+def invalidate_deleted_account_context(sender, instance, **kwargs):
+    context_cache.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=ConversationEntry)
+def touch_thread(sender, instance, created, **kwargs):
+    # threads are listed by their last activity
+    if created:
+        ConversationThread.objects.filter(pk=instance.thread_id).update(
+            updated_at=instance.created_at
+        )
+
+
+@receiver(post_delete, sender=CachedAnswer)
+def reload_answer_index(sender, instance, **kwargs):
+    # workers drop deleted answers from their in-process index
+    answer_cache.invalidate()
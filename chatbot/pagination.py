@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ConversationCursorPagination(CursorPagination):
+    ordering = "-updated_at"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class ConversationEntryCursorPagination(CursorPagination):
+    ordering = "-created_at"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
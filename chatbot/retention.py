@@ -0,0 +1,206 @@
+"""
+retention for the LangGraph checkpoint tables.
+
+PostgresSaver writes a checkpoint for every graph step and never deletes
+any. prune() walks the checkpointed threads a page at a time and, per page
+and in one short transaction:
+
+- drops every checkpoint of threads whose ConversationThread is gone
+- keeps the latest `keep` checkpoints of the other threads
+- drops the pending writes and channel blobs only older checkpoints used
+
+writes and blobs are only removed below the oldest version the kept
+checkpoints still reference, so a turn being written at the same time
+never loses data. the tables are vacuumed (not VACUUM FULL, which locks
+them) at the end.
+"""
+
+import uuid
+
+import psycopg
+from django.conf import settings
+from loguru import logger
+
+from chatbot.models import ConversationThread
+
+TABLES = ("checkpoints", "checkpoint_writes", "checkpoint_blobs")
+
+THREAD_PAGE = """
+SELECT DISTINCT thread_id FROM checkpoints
+WHERE thread_id > %s
+ORDER BY thread_id
+LIMIT %s
+"""
+
+DELETE_OLD_CHECKPOINTS = """
+DELETE FROM checkpoints c
+USING (
+    SELECT thread_id, checkpoint_ns, checkpoint_id
+    FROM (
+        SELECT
+            thread_id,
+            checkpoint_ns,
+            checkpoint_id,
+            row_number() OVER (
+                PARTITION BY thread_id, checkpoint_ns
+                ORDER BY checkpoint_id DESC
+            ) AS position
+        FROM checkpoints
+        WHERE thread_id = ANY(%s)
+    ) ranked
+    WHERE position > %s
+) old
+WHERE c.thread_id = old.thread_id
+AND c.checkpoint_ns = old.checkpoint_ns
+AND c.checkpoint_id = old.checkpoint_id
+"""
+
+# checkpoint ids are time ordered
+DELETE_OLD_WRITES = """
+DELETE FROM checkpoint_writes w
+USING (
+    SELECT thread_id, checkpoint_ns, min(checkpoint_id) AS checkpoint_id
+    FROM checkpoints
+    WHERE thread_id = ANY(%s)
+    GROUP BY thread_id, checkpoint_ns
+) kept
+WHERE w.thread_id = kept.thread_id
+AND w.checkpoint_ns = kept.checkpoint_ns
+AND w.checkpoint_id < kept.checkpoint_id
+"""
+
+# channel versions are zero padded, so they compare as text
+DELETE_OLD_BLOBS = """
+DELETE FROM checkpoint_blobs b
+USING (
+    SELECT c.thread_id, c.checkpoint_ns, v.key AS channel, min(v.value #>> '{}') AS version
+    FROM checkpoints c, jsonb_each(c.checkpoint -> 'channel_versions') v
+    WHERE c.thread_id = ANY(%s)
+    GROUP BY c.thread_id, c.checkpoint_ns, v.key
+) kept
+WHERE b.thread_id = kept.thread_id
+AND b.checkpoint_ns = kept.checkpoint_ns
+AND b.channel = kept.channel
+AND b.version < kept.version
+"""
+
+
+def connect():
+    return psycopg.connect(settings.DB_URI, autocommit=True)
+
+
+def table_sizes(conn):
+    """
+    total size in bytes of each checkpoint table, indexes and toast included
+    """
+    sizes = {}
+    for table in TABLES:
+        row = conn.execute(
+            "SELECT coalesce(pg_total_relation_size(to_regclass(%s)), 0)", (table,)
+        ).fetchone()
+        sizes[table] = row[0] if row else 0
+    return sizes
+
+
+def _existing_threads(thread_ids):
+    ids = []
+    for thread_id in thread_ids:
+        try:
+            ids.append(uuid.UUID(thread_id))
+        except ValueError:
+            # not a ConversationThread id, e.g. a test thread
+            continue
+    return {
+        str(pk)
+        for pk in ConversationThread.objects.filter(id__in=ids).values_list(
+            "id", flat=True
+        )
+    }
+
+
+def _delete_threads(conn, thread_ids, deleted):
+    for table in TABLES:
+        cur = conn.execute(
+            f"DELETE FROM {table} WHERE thread_id = ANY(%s)", (list(thread_ids),)
+        )
+        deleted[table] += cur.rowcount
+
+
+def delete_threads(thread_ids):
+    """
+    drop every checkpoint of the given threads
+    """
+    deleted = dict.fromkeys(TABLES, 0)
+    with connect() as conn, conn.transaction():
+        _delete_threads(conn, thread_ids, deleted)
+    return deleted
+
+
+def prune_page(conn, thread_ids, keep):
+    """
+    prune one page of threads, returns the deleted row counts per table
+    """
+    existing = _existing_threads(thread_ids)
+    orphans = [t for t in thread_ids if t not in existing]
+    live = [t for t in thread_ids if t in existing]
+    deleted = dict.fromkeys(TABLES, 0)
+    with conn.transaction():
+        # fail fast instead of queueing behind a long lock
+        conn.execute("SET LOCAL lock_timeout = '5s'")
+        if orphans:
+            _delete_threads(conn, orphans, deleted)
+        if live:
+            cur = conn.execute(DELETE_OLD_CHECKPOINTS, (live, keep))
+            deleted["checkpoints"] += cur.rowcount
+            cur = conn.execute(DELETE_OLD_WRITES, (live,))
+            deleted["checkpoint_writes"] += cur.rowcount
+            cur = conn.execute(DELETE_OLD_BLOBS, (live,))
+            deleted["checkpoint_blobs"] += cur.rowcount
+    return len(orphans), deleted
+
+
+def prune(
+    keep=settings.CHATBOT_CHECKPOINT_KEEP,
+    batch_size=settings.CHATBOT_CHECKPOINT_BATCH_SIZE,
+    vacuum=True,
+):
+    """
+    run a full retention pass, returns a report with the table sizes before
+    and after
+    """
+    keep = max(keep, 1)
+    report = {
+        "threads": 0,
+        "deleted_threads": 0,
+        "deleted": dict.fromkeys(TABLES, 0),
+        "failed_pages": 0,
+    }
+    with connect() as conn:
+        report["size_before"] = table_sizes(conn)
+        last = ""
+        while True:
+            rows = conn.execute(THREAD_PAGE, (last, batch_size)).fetchall()
+            if not rows:
+                break
+            thread_ids = [row[0] for row in rows]
+            last = thread_ids[-1]
+            report["threads"] += len(thread_ids)
+            try:
+                orphans, deleted = prune_page(conn, thread_ids, keep)
+            except psycopg.errors.LockNotAvailable as e:
+                # the next run gets these
+                logger.warning(f"=== [CHECKPOINTS] skipped a page of threads: {e}")
+                report["failed_pages"] += 1
+                continue
+            report["deleted_threads"] += orphans
+            for table, count in deleted.items():
+                report["deleted"][table] += count
+
+        if vacuum:
+            for table in TABLES:
+                # plain VACUUM does not block reads or writes
+                conn.execute(f"VACUUM (ANALYZE) {table}")
+        report["size_after"] = table_sizes(conn)
+
+    logger.info(f"=== [CHECKPOINTS] retention pass: {report}")
+    return report
@@ -0,0 +1,123 @@
+"""
+per-process chatbot runtime.
+
+the postgres pool behind the LangGraph checkpointer, the checkpointer itself
+and the compiled graph are created on first use and shared by every chat
+request in the worker. connections are checked before they are handed out
+and the pool is closed by the ASGI lifespan shutdown (config/asgi.py).
+
+views use `await runtime.aagent()`, which keeps a pool and graph per event
+loop, one per uvicorn worker.
+"""
+
+import asyncio
+import os
+import weakref
+
+from django.conf import settings
+from langchain_openai import ChatOpenAI
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from loguru import logger
+from psycopg_pool import AsyncConnectionPool
+
+from chatbot.assistant.answer_cache import AnswerCache
+from chatbot.assistant.tools.account_balance import AccountBalanceTool
+from chatbot.assistant.tools.branches import BranchLocatorTool
+from chatbot.assistant.tools.card_request import CardRequestTool
+from chatbot.assistant.tools.complaints import ComplaintTool
+from chatbot.assistant.tools.customer_accounts import CustomerAccountsTool
+from chatbot.assistant.tools.escation import EscalationTool
+from chatbot.assistant.workflow import AssistantWorkflow
+
+# stream_usage reports token counts with streamed replies
+llm = ChatOpenAI(model="gpt-4.1", temperature=0, stream_usage=True)
+tools = [
+    BranchLocatorTool(),
+    CustomerAccountsTool(),
+    CardRequestTool(),
+    ComplaintTool(),
+    AccountBalanceTool(),
+    EscalationTool(),
+]
+answer_cache = AnswerCache() if settings.CHATBOT_ANSWER_CACHE else None
+
+
+class ChatbotRuntime:
+    def __init__(self):
+        self._forget()
+
+    def _forget(self):
+        # a forked child must not use or close the parent's sockets
+        # event loop -> (pool, agent)
+        self._async = weakref.WeakKeyDictionary()
+        self._async_locks = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _pool_options():
+        return {
+            "conninfo": settings.DB_URI,
+            "min_size": settings.CHATBOT_POOL_MIN_SIZE,
+            "max_size": settings.CHATBOT_POOL_MAX_SIZE,
+            "max_idle": settings.CHATBOT_POOL_MAX_IDLE,
+            "kwargs": {
+                "autocommit": True,
+                "prepare_threshold": 0,
+            },
+            "name": "chatbot-checkpointer",
+        }
+
+    async def aagent(self) -> AssistantWorkflow:
+        loop = asyncio.get_running_loop()
+        started = self._async.get(loop)
+        if started is not None:
+            return started[1]
+
+        lock = self._async_locks.setdefault(loop, asyncio.Lock())
+        async with lock:
+            if loop not in self._async:
+                self._async[loop] = await self._astart()
+        return self._async[loop][1]
+
+    async def _astart(self):
+        pool = AsyncConnectionPool(
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+            **self._pool_options(),
+        )
+        await pool.open()
+        try:
+            checkpointer = AsyncPostgresSaver(pool)  # type: ignore
+            await checkpointer.setup()
+            agent = AssistantWorkflow(llm=llm, tools=tools, answer_cache=answer_cache)
+            agent.build_graph(checkpoint_saver=checkpointer)
+        except Exception:
+            await pool.close()
+            raise
+        logger.info(f"chatbot runtime started in worker {os.getpid()}")
+        return pool, agent
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        started = self._async.pop(loop, None)
+        if started is not None:
+            await started[0].close(timeout=5)
+
+    async def ahealth(self):
+        started = self._async.get(asyncio.get_running_loop())
+        if started is None:
+            return {"started": False, "healthy": True}
+        pool = started[0]
+        try:
+            async with pool.connection(timeout=2) as conn:
+                await conn.execute("SELECT 1")
+            healthy = True
+        except Exception as e:
+            logger.warning(f"chatbot checkpointer pool check failed: {e}")
+            healthy = False
+        return {"started": True, "healthy": healthy, "pool": pool.get_stats()}
+
+
+runtime = ChatbotRuntime()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=runtime._forget)
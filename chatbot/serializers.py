@@ -10,39 +10,12 @@ class ConversationEntrySerializer(serializers.ModelSerializer):
 
 
 class ConversationThreadSerializer(serializers.ModelSerializer):
-    entries = ConversationEntrySerializer(many=True, read_only=True)
-    message_count = serializers.SerializerMethodField()
-    latest_message = serializers.SerializerMethodField()
-
-    class Meta:
-        model = ConversationThread
-        fields = [
-            "id",
-            "created_at",
-            "updated_at",
-            "message_count",
-            "entries",
-            "latest_message",
-        ]
-        read_only_fields = ["id", "created_at", "updated_at"]
+    """
+    thread with its entry count and a preview of the latest entry, read from
+    the annotations of ConversationThread.objects.with_latest_entry()
+    """
 
-    def get_message_count(self, obj):
-        return obj.entries.count()
-
-    def get_latest_message(self, obj):
-        latest = obj.entries.last()
-        if latest:
-            return {
-                "id": str(latest.id),
-                "human_message": latest.human_message,
-                "ai_message": latest.ai_message,
-                "created_at": latest.created_at.isoformat(),
-            }
-        return None
-
-
-class ConversationThreadListSerializer(serializers.ModelSerializer):
-    message_count = serializers.SerializerMethodField()
+    message_count = serializers.IntegerField(source="entry_count", read_only=True)
     latest_message = serializers.SerializerMethodField()
 
     class Meta:
@@ -50,19 +23,15 @@ class ConversationThreadListSerializer(serializers.ModelSerializer):
         fields = ["id", "created_at", "updated_at", "message_count", "latest_message"]
         read_only_fields = ["id", "created_at", "updated_at"]
 
-    def get_message_count(self, obj):
-        return obj.entries.count()
-
     def get_latest_message(self, obj):
-        latest = obj.entries.last()
-        if latest:
-            return {
-                "id": str(latest.id),
-                "human_message": latest.human_message,
-                "ai_message": latest.ai_message,
-                "created_at": latest.created_at.isoformat(),
-            }
-        return None
+        if obj.latest_entry_id is None:
+            return None
+        return {
+            "id": str(obj.latest_entry_id),
+            "human_message": obj.latest_human_message,
+            "ai_message": obj.latest_ai_message,
+            "created_at": obj.latest_entry_created_at.isoformat(),
+        }
 
 
 class ChatMessageSerializer(serializers.Serializer):
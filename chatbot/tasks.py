@@ -0,0 +1,24 @@
+from loguru import logger
+
+from chatbot import retention
+from chatbot.assistant import answer_cache
+from config import celery_app
+
+
+@celery_app.task
+def prune_checkpoints():
+    return retention.prune()
+
+
+@celery_app.task
+def prune_answer_cache():
+    deleted = answer_cache.prune()
+    logger.info(f"=== [ANSWER CACHE] deleted {deleted} expired answers")
+    return deleted
+
+
+@celery_app.task
+def delete_thread_checkpoints(thread_id):
+    deleted = retention.delete_threads([thread_id])
+    logger.info(f"=== [CHECKPOINTS] deleted thread {thread_id}: {deleted}")
+    return deleted
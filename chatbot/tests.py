@@ -1 +1,101 @@
-# Create your tests here.
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse_lazy
+
+from accounts.models import CustomUser
+from cbs import balance_cache
+from cbs.models import BankAccount
+from chatbot.assistant.tools.account_balance import AccountBalanceTool
+from chatbot.assistant.tools.branches import BranchLocatorTool
+from datatable.models import BankBranch
+
+
+@override_settings(METRICS_TOKEN="scrape")
+class ChatbotHealthViewTests(TestCase):
+    url = reverse_lazy("chatbot:health")
+
+    def test_anonymous_users_are_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        user = CustomUser.objects.create(username="customer", email="c@example.com")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_staff_and_the_metrics_token_are_let_in(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer scrape")
+        self.assertEqual(response.status_code, 200)
+
+        staff = CustomUser.objects.create(
+            username="staff", email="s@example.com", is_staff=True
+        )
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+class BranchLocatorToolTests(TestCase):
+    def setUp(self):
+        self.near = BankBranch.objects.create(
+            name="Near", langtitude_cordinates="0.34", longitude_cordinates="6.73"
+        )
+        self.far = BankBranch.objects.create(
+            name="Far", langtitude_cordinates="1.64", longitude_cordinates="7.41"
+        )
+        self.unknown = BankBranch.objects.create(
+            name="Unknown", langtitude_cordinates="n/a", longitude_cordinates=""
+        )
+        BankBranch.objects.create(
+            name="Closed",
+            langtitude_cordinates="0.3",
+            longitude_cordinates="6.7",
+            closed=True,
+        )
+
+    def test_branches_without_coordinates_are_listed_last(self):
+        tool = BranchLocatorTool()
+        first = tool._run(latitude=0.33, longitude=6.73, limit=2)
+        second = tool._run(latitude=0.33, longitude=6.73, limit=2, skip=2)
+
+        self.assertEqual(first["pagination"]["total"], 3)
+        self.assertEqual(
+            [branch["id"] for branch in first["branches"]],
+            [self.near.id, self.far.id],
+        )
+        self.assertEqual(
+            second["branches"],
+            [
+                {
+                    "id": self.unknown.id,
+                    "name": "Unknown",
+                    "address": None,
+                    "distance": "unknown",
+                }
+            ],
+        )
+
+
+class AccountBalanceToolTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username="balance", email="b@example.com")
+        self.account = BankAccount.objects.create(
+            user=self.user,
+            account_number="BAL0000001",
+            account_name="Balance",
+            account_balance=Decimal("50.00"),
+        )
+        self.config = {"configurable": {"user": {"id": self.user.id}}}
+        patcher = mock.patch.object(balance_cache, "get", return_value=None)
+        self.cache_get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch("t24.t24_requests.T24Requests.get_account_details")
+    def test_balance_never_calls_t24(self, get_account_details):
+        tool = AccountBalanceTool()
+        stored = tool._run(self.account.id, config=self.config)
+
+        self.cache_get.return_value = balance_cache._entry({"workingBalance": "75.5"})
+        cached = tool._run(self.account.id, config=self.config)
+
+        self.assertEqual(stored["balance"], "50.00")
+        self.assertEqual(cached["balance"], "75.5")
+        get_account_details.assert_not_called()
@@ -6,6 +6,7 @@ app_name = "chatbot"
 urlpatterns = [
     # Streaming chat endpoint
     path("chat/stream/", views.ChatStreamView.as_view(), name="chat_stream"),
+    path("health/", views.ChatbotHealthView.as_view(), name="health"),
     # Conversation management endpoints
     path(
         "conversations/", views.ConversationListView.as_view(), name="conversation_list"
@@ -20,6 +21,11 @@ urlpatterns = [
         views.ConversationDetailView.as_view(),
         name="conversation_detail",
     ),
+    path(
+        "conversations/<uuid:thread_id>/entries/",
+        views.ConversationEntryListView.as_view(),
+        name="conversation_entries",
+    ),
     path(
         "conversations/<uuid:thread_id>/delete/",
         views.ConversationDeleteView.as_view(),
@@ -1,15 +1,12 @@
+import asyncio
 import time
 from venv import logger
 
 import orjson
-from django.conf import settings
-from django.db import transaction
 from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.postgres import PostgresSaver
-from psycopg_pool import ConnectionPool
 from rest_framework import status
 from rest_framework.generics import (
     CreateAPIView,
@@ -20,34 +17,29 @@ from rest_framework.generics import (
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.views import APIView
-
-from chatbot.assistant.tools.account_balance import AccountBalanceTool
-from chatbot.assistant.tools.branches import BranchLocatorTool
-from chatbot.assistant.tools.card_request import CardRequestTool
-from chatbot.assistant.tools.complaints import ComplaintTool
-from chatbot.assistant.tools.customer_accounts import CustomerAccountsTool
-from chatbot.assistant.tools.escation import EscalationTool
+from rest_framework.settings import api_settings
+
 from chatbot.assistant.workflow import AssistantWorkflow
+from chatbot.runtime import runtime
+from helpers.views import (
+    AsyncAPIView,
+    IsStaffOrMetricsToken,
+    MetricsTokenAuthentication,
+)
 
 from .models import ConversationEntry, ConversationThread
+from .pagination import (
+    ConversationCursorPagination,
+    ConversationEntryCursorPagination,
+)
+from .tasks import delete_thread_checkpoints
 from .serializers import (
     ChatMessageSerializer,
+    ConversationEntrySerializer,
     ConversationThreadCreateSerializer,
-    ConversationThreadListSerializer,
     ConversationThreadSerializer,
 )
 
-llm = ChatOpenAI(model="gpt-4.1", temperature=0)
-tools = [
-    BranchLocatorTool(),
-    CustomerAccountsTool(),
-    CardRequestTool(),
-    ComplaintTool(),
-    AccountBalanceTool(),
-    EscalationTool(),
-]
-
 
 @extend_schema_view(
     post=extend_schema(
@@ -56,63 +48,54 @@ tools = [
         description="Streaming chat endpoint with SSE",
     )
 )
-class ChatStreamView(APIView):
+class ChatStreamView(AsyncAPIView):
+    """
+    streams the assistant's reply as newline delimited JSON events.
+
+    the view and the stream are async, so an open chat holds no thread while
+    the LLM generates. when the client disconnects django cancels the
+    stream, which cancels the upstream LLM call.
+    """
+
     permission_classes = [IsAuthenticated]
 
-    def post(self, request: Request):
+    async def post(self, request: Request):
         serializer = ChatMessageSerializer(data=request.data)
 
         logger.debug(f"Creating new thread for user {request.user}")
 
-        with transaction.atomic():
-            serializer.is_valid(raise_exception=True)
-            message = serializer.validated_data["message"]  # type: ignore
-            thread_id = serializer.validated_data.get("thread_id")  # type: ignore
-            user_longitude = serializer.validated_data.get("user_longitude")  # type: ignore
-            user_latitude = serializer.validated_data.get("user_latitude")  # type: ignore
-
-            if thread_id:
-                try:
-                    thread = ConversationThread.objects.get(
-                        id=thread_id, user=request.user
-                    )
-                except ConversationThread.DoesNotExist:
-                    thread = ConversationThread.objects.create(user=request.user, id=thread_id)
-            else:
-                thread = ConversationThread.objects.create(user=request.user)
-
-            pool = ConnectionPool(
-                conninfo=settings.DB_URI,
-                max_size=20,
-                kwargs={
-                    "autocommit": True,
-                    "prepare_threshold": 0,
-                },
-            )
-            checkpointer = PostgresSaver(pool)  # type: ignore
-            checkpointer.setup()
-            agent = AssistantWorkflow(
-                llm=llm,
-                tools=tools,
-            )
-            agent.build_graph(checkpoint_saver=checkpointer)
-            return StreamingHttpResponse(
-                self._stream_response(
-                    agent,
-                    message,
-                    str(thread.id),
-                    request.user.id,
-                    thread,
-                    user_longitude,
-                    user_latitude,
-                ),
-                content_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                },
+        serializer.is_valid(raise_exception=True)
+        message = serializer.validated_data["message"]  # type: ignore
+        thread_id = serializer.validated_data.get("thread_id")  # type: ignore
+        user_longitude = serializer.validated_data.get("user_longitude")  # type: ignore
+        user_latitude = serializer.validated_data.get("user_latitude")  # type: ignore
+
+        if thread_id:
+            thread, _ = await ConversationThread.objects.aget_or_create(
+                id=thread_id, user=request.user
             )
+        else:
+            thread = await ConversationThread.objects.acreate(user=request.user)
+
+        # pool, checkpointer and compiled graph are shared by the worker
+        agent = await runtime.aagent()
+        return StreamingHttpResponse(
+            self._stream_response(
+                agent,
+                message,
+                str(thread.id),
+                request.user.id,
+                thread,
+                user_longitude,
+                user_latitude,
+            ),
+            content_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+            },
+        )
 
-    def _stream_response(
+    async def _stream_response(
         self,
         agent: AssistantWorkflow,
         message: str,
@@ -122,9 +105,9 @@ class ChatStreamView(APIView):
         user_longitude: float | None,
         user_latitude: float | None,
     ):
+        ai_response_content = ""
         try:
-            ai_response_content = ""
-            for event in agent.stream(
+            async for event in agent.astream(
                 human_message=message,
                 user_longitude=user_longitude,
                 user_latitude=user_latitude,
@@ -150,12 +133,23 @@ class ChatStreamView(APIView):
                     + b"\n"
                 )
 
-            ConversationEntry.objects.create(
+            await ConversationEntry.objects.acreate(
                 thread=thread,
                 human_message=message,
                 ai_message=ai_response_content or "Failed to generate response",
             )
 
+        except asyncio.CancelledError:
+            # client went away, keep what was generated so far
+            await asyncio.shield(
+                ConversationEntry.objects.acreate(
+                    thread=thread,
+                    human_message=message,
+                    ai_message=ai_response_content or "Response cancelled",
+                )
+            )
+            raise
+
         except Exception as e:
             yield (
                 orjson.dumps(
@@ -169,16 +163,38 @@ class ChatStreamView(APIView):
             )
 
 
+class ChatbotHealthView(AsyncAPIView):
+    authentication_classes = [
+        MetricsTokenAuthentication,
+        *api_settings.DEFAULT_AUTHENTICATION_CLASSES,
+    ]
+    permission_classes = [IsStaffOrMetricsToken]
+
+    async def get(self, request):
+        data = await runtime.ahealth()
+        return Response(
+            data=data,
+            status=(
+                status.HTTP_200_OK
+                if data["healthy"]
+                else status.HTTP_503_SERVICE_UNAVAILABLE
+            ),
+        )
+
+
 class ConversationListView(ListAPIView):
     permission_classes = [IsAuthenticated]
-    serializer_class = ConversationThreadListSerializer
+    serializer_class = ConversationThreadSerializer
+    pagination_class = ConversationCursorPagination
+    # ?ordering= would break the keyset the cursor pages on
+    filter_backends = []
 
     def get_queryset(self):  # type: ignore[override]
         if getattr(self, "swagger_fake_view", False):
             return ConversationThread.objects.none()
         return ConversationThread.objects.filter(
             user=self.request.user
-        ).prefetch_related("entries")
+        ).with_latest_entry()
 
 
 class ConversationDetailView(RetrieveAPIView):
@@ -192,7 +208,26 @@ class ConversationDetailView(RetrieveAPIView):
             return ConversationThread.objects.none()
         return ConversationThread.objects.filter(
             user=self.request.user
-        ).prefetch_related("entries")
+        ).with_latest_entry()
+
+
+class ConversationEntryListView(ListAPIView):
+    """
+    entries of one thread, newest first
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = ConversationEntrySerializer
+    pagination_class = ConversationEntryCursorPagination
+    filter_backends = []
+
+    def get_queryset(self):  # type: ignore[override]
+        if getattr(self, "swagger_fake_view", False):
+            return ConversationEntry.objects.none()
+        thread = get_object_or_404(
+            ConversationThread, id=self.kwargs["thread_id"], user=self.request.user
+        )
+        return ConversationEntry.objects.filter(thread=thread)
 
 
 class ConversationDeleteView(DestroyAPIView):
@@ -206,6 +241,12 @@ class ConversationDeleteView(DestroyAPIView):
             return ConversationThread.objects.none()
         return ConversationThread.objects.filter(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        thread_id = str(instance.id)
+        super().perform_destroy(instance)
+        # the LangGraph checkpoints are not tied to the thread row
+        delete_thread_checkpoints.delay(thread_id)
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         self.perform_destroy(instance)
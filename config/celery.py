@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from django.conf import settings
 import logging
 
 
@@ -10,6 +11,34 @@ app = Celery("paperless-branch")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.conf.beat_schedule = {
+    "flush_last_seen": {
+        "task": "accounts.tasks.flush_last_seen",
+        "schedule": settings.LAST_SEEN_FLUSH_INTERVAL,
+    },
+    "prune_checkpoints": {
+        "task": "chatbot.tasks.prune_checkpoints",
+        "schedule": settings.CHATBOT_CHECKPOINT_PRUNE_INTERVAL,
+    },
+    "prune_answer_cache": {
+        "task": "chatbot.tasks.prune_answer_cache",
+        "schedule": settings.CHATBOT_ANSWER_CACHE_PRUNE_INTERVAL,
+    },
+    "get_other_banks": {
+        "task": "datatable.tasks.get_other_banks",
+        "schedule": settings.REFERENCE_DATA_SYNC_INTERVAL,
+    },
+    "get_other_networks": {
+        "task": "datatable.tasks.get_other_networks",
+        "schedule": settings.REFERENCE_DATA_SYNC_INTERVAL,
+    },
+    "reconcile_statement_ledgers": {
+        "task": "cbs.tasks.reconcile_statement_ledgers",
+        "schedule": settings.STATEMENT_LEDGER_RECONCILE_INTERVAL,
+    },
+    "reconcile_expense_limits": {
+        "task": "cbs.tasks.reconcile_expense_limits",
+        "schedule": settings.EXPENSE_LIMIT_RECONCILE_INTERVAL,
+    },
     # "permanently_delete_deactivated_accounts": {
     #     "task": "accounts.tasks.permanently_delete_deactivated_accounts",
     #     "schedule": crontab(
@@ -81,9 +81,12 @@ INSTALLED_APPS = [
 ]
 
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
+# all of these can run async except WhiteNoise (6.x is sync only), so under
+# ASGI requests still pass through one thread switch at the top of the chain
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # WhiteNoise
+    "helpers.middleware.RequestMetricsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -145,6 +148,34 @@ else:
     }
 
 DB_URI = f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}"
+# connection pool of the chatbot checkpointer, one per worker
+CHATBOT_POOL_MIN_SIZE = int(os.getenv("CHATBOT_POOL_MIN_SIZE", default="1"))
+CHATBOT_POOL_MAX_SIZE = int(os.getenv("CHATBOT_POOL_MAX_SIZE", default="10"))
+CHATBOT_POOL_MAX_IDLE = float(os.getenv("CHATBOT_POOL_MAX_IDLE", default="300"))
+# seconds a rendered system prompt is reused within a conversation
+CHATBOT_CONTEXT_TTL = int(os.getenv("CHATBOT_CONTEXT_TTL", default="600"))
+# turns sent verbatim to the model, older ones are folded into a summary
+CHATBOT_HISTORY_TURNS = int(os.getenv("CHATBOT_HISTORY_TURNS", default="6"))
+# approximate tokens of history allowed before older turns are summarized
+CHATBOT_TOKEN_BUDGET = int(os.getenv("CHATBOT_TOKEN_BUDGET", default="6000"))
+# checkpoint retention, see chatbot/retention.py
+CHATBOT_CHECKPOINT_KEEP = int(os.getenv("CHATBOT_CHECKPOINT_KEEP", default="10"))
+CHATBOT_CHECKPOINT_BATCH_SIZE = int(
+    os.getenv("CHATBOT_CHECKPOINT_BATCH_SIZE", default="200")
+)
+CHATBOT_CHECKPOINT_PRUNE_INTERVAL = float(
+    os.getenv("CHATBOT_CHECKPOINT_PRUNE_INTERVAL", default="3600")
+)
+# reuse answers to general questions, see chatbot/assistant/answer_cache.py
+CHATBOT_ANSWER_CACHE = as_bool(os.getenv("CHATBOT_ANSWER_CACHE", "False"))
+CHATBOT_ANSWER_CACHE_THRESHOLD = float(
+    os.getenv("CHATBOT_ANSWER_CACHE_THRESHOLD", default="0.92")
+)
+CHATBOT_ANSWER_CACHE_TTL = int(os.getenv("CHATBOT_ANSWER_CACHE_TTL", default="604800"))
+CHATBOT_ANSWER_CACHE_SIZE = int(os.getenv("CHATBOT_ANSWER_CACHE_SIZE", default="2000"))
+CHATBOT_ANSWER_CACHE_PRUNE_INTERVAL = float(
+    os.getenv("CHATBOT_ANSWER_CACHE_PRUNE_INTERVAL", default="3600")
+)
 # Password validation
 # https://docs.djangoproject.com/en/dev/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -398,7 +429,7 @@ CACHE_TIMEOUT = int(os.getenv("CACHE_TIMEOUT", default=3600))
 CACHE_DB_ID = int(os.getenv("CACHE_DB_ID", default="1"))
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "BACKEND": "helpers.cache.InstrumentedRedisCache",
         "LOCATION": f"{REDIS_URL}/{CACHE_DB_ID}",
         # "OPTIONS": {"CACHE_TIMEOUT": CACHE_TIMEOUT},
     }
@@ -487,6 +518,93 @@ SMS_SENDER_ID = os.getenv("SMS_SENDER_ID")
 # T24 API
 T24_BASE_URL = os.getenv("T24_BASE_URL")
 T24_CREDENTIALS = os.getenv("T24_CREDENTIALS")
+T24_POOL_SIZE = int(os.getenv("T24_POOL_SIZE", default="20"))
+T24_CONNECT_TIMEOUT = float(os.getenv("T24_CONNECT_TIMEOUT", default="5"))
+T24_READ_TIMEOUT = float(os.getenv("T24_READ_TIMEOUT", default="30"))
+T24_KEEP_ALIVE = as_bool(os.getenv("T24_KEEP_ALIVE", default="True"))
+T24_REFRESH_DEADLINE = float(os.getenv("T24_REFRESH_DEADLINE", default="3"))
+# share one upstream call between identical concurrent reads, optionally
+# across processes through a redis lock
+T24_SINGLEFLIGHT = as_bool(os.getenv("T24_SINGLEFLIGHT", default="True"))
+T24_SINGLEFLIGHT_REDIS = as_bool(os.getenv("T24_SINGLEFLIGHT_REDIS", default="False"))
+# circuit breaker per T24 operation
+T24_BREAKER_FAILURE_RATE = float(os.getenv("T24_BREAKER_FAILURE_RATE", default="0.5"))
+T24_BREAKER_MIN_CALLS = int(os.getenv("T24_BREAKER_MIN_CALLS", default="10"))
+T24_BREAKER_WINDOW = int(os.getenv("T24_BREAKER_WINDOW", default="20"))
+T24_BREAKER_SLOW_CALL = float(os.getenv("T24_BREAKER_SLOW_CALL", default="10"))
+T24_BREAKER_OPEN_SECONDS = float(os.getenv("T24_BREAKER_OPEN_SECONDS", default="30"))
+# max concurrent T24 calls per process for each class of operation
+T24_BULKHEAD_READS = int(os.getenv("T24_BULKHEAD_READS", default="16"))
+T24_BULKHEAD_POSTINGS = int(os.getenv("T24_BULKHEAD_POSTINGS", default="8"))
+T24_BULKHEAD_ONBOARDING = int(os.getenv("T24_BULKHEAD_ONBOARDING", default="4"))
+T24_BULKHEAD_WAIT = float(os.getenv("T24_BULKHEAD_WAIT", default="0.5"))
+# statement entries per T24 page, and pages fetched ahead of the reader
+T24_STATEMENT_PAGE_SIZE = int(os.getenv("T24_STATEMENT_PAGE_SIZE", default="200"))
+T24_STATEMENT_PREFETCH = int(os.getenv("T24_STATEMENT_PREFETCH", default="2"))
+# seconds a cached balance is served without revalidation, and the hard limit
+# after which it is dropped and fetched synchronously
+BALANCE_CACHE_TTL = int(os.getenv("BALANCE_CACHE_TTL", default="30"))
+BALANCE_CACHE_MAX_STALENESS = int(
+    os.getenv("BALANCE_CACHE_MAX_STALENESS", default="300")
+)
+# seconds an encrypted e-statement PDF is kept for re-sends of the same range
+STATEMENT_PDF_CACHE_TTL = int(os.getenv("STATEMENT_PDF_CACHE_TTL", default="900"))
+# statement entries rendered into each part of an e-statement PDF
+STATEMENT_PDF_CHUNK_SIZE = int(os.getenv("STATEMENT_PDF_CHUNK_SIZE", default="1000"))
+# seconds before the open last day of a statement ledger is fetched again
+STATEMENT_LEDGER_FRESHNESS = int(os.getenv("STATEMENT_LEDGER_FRESHNESS", default="60"))
+# most days of a statement ledger fetched from T24 per locked swap
+STATEMENT_LEDGER_SYNC_DAYS = int(os.getenv("STATEMENT_LEDGER_SYNC_DAYS", default="31"))
+# days refetched per ledger and run of reconcile_statement_ledgers, ledgers
+# per run, and seconds between runs
+STATEMENT_LEDGER_RECONCILE_DAYS = int(
+    os.getenv("STATEMENT_LEDGER_RECONCILE_DAYS", default="7")
+)
+STATEMENT_LEDGER_RECONCILE_BATCH = int(
+    os.getenv("STATEMENT_LEDGER_RECONCILE_BATCH", default="100")
+)
+STATEMENT_LEDGER_RECONCILE_INTERVAL = float(
+    os.getenv("STATEMENT_LEDGER_RECONCILE_INTERVAL", default="3600")
+)
+# seconds an idle expense limit counter is kept in redis, limits written back
+# to ExpenseLimit.amount_spent per batch, and seconds between write backs
+EXPENSE_LIMIT_COUNTER_TTL = int(os.getenv("EXPENSE_LIMIT_COUNTER_TTL", default="86400"))
+EXPENSE_LIMIT_RECONCILE_BATCH = int(
+    os.getenv("EXPENSE_LIMIT_RECONCILE_BATCH", default="500")
+)
+EXPENSE_LIMIT_RECONCILE_INTERVAL = float(
+    os.getenv("EXPENSE_LIMIT_RECONCILE_INTERVAL", default="60")
+)
+
+# REQUEST METRICS
+REQUEST_METRICS = as_bool(os.getenv("REQUEST_METRICS", default="True"))
+# per request counts as X-DB-Queries, X-T24-Calls, ... response headers
+REQUEST_METRICS_HEADERS = as_bool(
+    os.getenv("REQUEST_METRICS_HEADERS", default=str(DEBUG))
+)
+REQUEST_METRICS_FLUSH_INTERVAL = float(
+    os.getenv("REQUEST_METRICS_FLUSH_INTERVAL", default="10")
+)
+# log requests running more queries than this, usually an N+1
+REQUEST_METRICS_QUERY_WARNING = int(
+    os.getenv("REQUEST_METRICS_QUERY_WARNING", default="50")
+)
+# bearer token for scrapers of /metrics/ and the T24 health check, without
+# it only staff users can read them
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# LAST SEEN
+# last_seen is recorded at most once per user per granularity (seconds) and
+# written to the database by the flush_last_seen beat task
+LAST_SEEN_GRANULARITY = int(os.getenv("LAST_SEEN_GRANULARITY", default="300"))
+LAST_SEEN_FLUSH_INTERVAL = float(os.getenv("LAST_SEEN_FLUSH_INTERVAL", default="60"))
+
+# AUDIT LOG
+# AccessGuardian and ActivityLog rows are queued in process and written in
+# batches by a background thread
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", default="200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", default="2"))
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", default="10000"))
 
 
 # allow all headers
@@ -529,6 +647,10 @@ TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", default="default")
 # PAYSTACK
 PAYSTACK_BASE_URL = os.getenv("PAYSTACK_BASE_URL", "")
 PAYSTACK_SECRET_KEY = os.getenv("PAYSTACK_SECRET_KEY", "")
+# seconds between syncs of the paystack banks and mobile money networks
+REFERENCE_DATA_SYNC_INTERVAL = float(
+    os.getenv("REFERENCE_DATA_SYNC_INTERVAL", default="86400")
+)
 
 
 USE_S3 = as_bool(os.getenv("USE_S3", default="False"))
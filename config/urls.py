@@ -9,6 +9,8 @@ from drf_spectacular.views import (
 )
 from django.views.i18n import set_language
 
+from helpers.views import metrics_view
+
 urlpatterns = [
     path("digital/control/", admin.site.urls),
     path("i18n/", set_language, name="set_language"),
@@ -19,6 +21,7 @@ urlpatterns = [
     path("cbs/", include("cbs.urls")),
     path("auth/", include("accounts.urls")),
     path("chatbot/", include("chatbot.urls")),
+    path("metrics/", metrics_view, name="metrics"),
     path("digital/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "digital/api-docs/",
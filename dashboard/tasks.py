@@ -2,6 +2,7 @@ from config import celery_app
 from accounts.models import CustomUser, ActivityLog
 
 
+# views log through helpers.audit now, kept for messages already queued
 @celery_app.task
 def log_action(user_id, action):
     # pass
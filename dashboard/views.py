@@ -10,7 +10,7 @@ from django.urls import reverse
 from accounts.tasks import generic_send_mail, generic_send_sms
 from helpers.functions import generate_otp, generate_reference_id
 from t24.t24_requests import T24Requests
-from .tasks import log_action
+from helpers.audit import log_action
 from helpers.decorator import view_permission, is_staff_user, edit_permission
 from django.http import JsonResponse
 from .utils import decode_token, create_token, mask_email
@@ -125,7 +125,7 @@ def index(request):
 @is_staff_user
 @view_permission("accounts.view_customuser")
 def customers(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Customers",
     )
@@ -159,7 +159,7 @@ def customer_detail(request, uuid):
     )[:15]
 
     context = {"customer": customer, "recent_transactions": recent_transactions}
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"View Customer Detail: {customer}",
     )
@@ -176,7 +176,7 @@ def customer_detail(request, uuid):
 @view_permission("accounts.change_customuser")
 def send_temporary_password(request, uuid):
     customer = CustomUser.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"Sent Temporary Password to Customer: {customer}",
     )
@@ -210,7 +210,7 @@ def send_temporary_password(request, uuid):
 @view_permission("accounts.change_customuser")
 def send_password_reset_link(request, uuid):
     customer = CustomUser.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"Sent Password Reset Link to Customer: {customer}",
     )
@@ -299,7 +299,7 @@ def customer_password_reest(request, uuid):
 @edit_permission("accounts.view_customuser", "accounts.change_customuser")
 def deactivate_customer_account(request, uuid):
     customer = CustomUser.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"Visit customer deactivation screen: {customer}",
     )
@@ -321,7 +321,7 @@ def deactivate_customer_account(request, uuid):
             customer.deactivated_account = True
             customer.save()
             messages.success(request, "Customer account deactivated successfully")
-            log_action.delay(
+            log_action(
                 user_id=request.user.id,
                 action=f"Deactivated customer account: {customer}",
             )
@@ -348,7 +348,7 @@ def deactivate_customer_account(request, uuid):
 @edit_permission("accounts.view_customuser", "accounts.change_customuser")
 def activate_customer_account(request, uuid):
     customer = CustomUser.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"Visit customer deactivation screen: {customer}",
     )
@@ -368,7 +368,7 @@ def activate_customer_account(request, uuid):
             customer.deactivated_account = False
             customer.save()
             messages.success(request, "Customer account activated successfully")
-            log_action.delay(
+            log_action(
                 user_id=request.user.id,
                 action=f"Activated customer account: {customer}",
             )
@@ -438,7 +438,7 @@ def customer_pin_reest(request, uuid):
 @view_permission("accounts.change_customuser")
 def send_pin_reset_link(request, uuid):
     customer = CustomUser.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"Sent PIN Reset Link to Customer: {customer}",
     )
@@ -521,7 +521,7 @@ def customer_requests(request):
 @is_staff_user
 @view_permission("cbs.view_bankstatement")
 def bank_statement(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Bank Statements",
     )
@@ -541,7 +541,7 @@ def bank_statement(request):
 @is_staff_user
 @view_permission("cbs.view_bankstatement")
 def bank_statement_hisotry(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Bank Statements History",
     )
@@ -563,7 +563,7 @@ def bank_statement_hisotry(request):
 @edit_permission("cbs.view_bankstatement", "cbs.change_bankstatement")
 def bank_statement_detail(request, uuid):
     bank_statement = cbsmodel.BankStatement.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"View Bank Statement Detail: {str(bank_statement)}",
     )
@@ -577,7 +577,7 @@ def bank_statement_detail(request, uuid):
             messages.success(request, "Status updated successfully")
             body = instnace.comments
             generic_send_sms.delay(str(bank_statement.user.phone_number), body)
-            log_action.delay(
+            log_action(
                 user_id=request.user.id,
                 action=f"Changed Bank Statement Status, with comments: {body}",
             )
@@ -600,7 +600,7 @@ def bank_statement_detail(request, uuid):
 @is_staff_user
 @view_permission("cbs.view_loanrequest")
 def loan_requests(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Lona requests",
     )
@@ -619,7 +619,7 @@ def loan_requests(request):
 @is_staff_user
 @view_permission("cbs.view_loanrequest")
 def loan_requests_history(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Load Request History",
     )
@@ -641,7 +641,7 @@ def loan_requests_history(request):
 @edit_permission("cbs.view_loanrequest", "cbs.change_loanrequest")
 def loan_request_detail(request, uuid):
     loan_request = cbsmodel.LoanRequest.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"View Loan Request Detail: {str(loan_request)}",
     )
@@ -657,7 +657,7 @@ def loan_request_detail(request, uuid):
             messages.success(request, "Status updated successfully")
             body = instnace.comments
             generic_send_sms.delay(str(loan_request.user.phone_number), body)
-            log_action.delay(
+            log_action(
                 user_id=request.user.id,
                 action=f"Changed Loan Request Status, with comments: {body}",
             )
@@ -680,7 +680,7 @@ def loan_request_detail(request, uuid):
 @is_staff_user
 @view_permission("cbs.view_transfer")
 def transfers(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Transfers Requests",
     )
@@ -700,7 +700,7 @@ def transfers(request):
 @edit_permission("cbs.view_transfer", "cbs.change_transfer")
 def transfer_requests_detail(request, uuid):
     transfer = cbsmodel.Transfer.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"View Transfers Requests Detail: {transfer}",
     )
@@ -713,7 +713,7 @@ def transfer_requests_detail(request, uuid):
             body = instnace.comments
             generic_send_sms.delay(str(transfer.user.phone_number), body)
             if body:
-                log_action.delay(
+                log_action(
                     user_id=request.user.id,
                     action=f"Changed Transfer request status, with reason: {body}",
                 )
@@ -736,7 +736,7 @@ def transfer_requests_detail(request, uuid):
 @is_staff_user
 @view_permission("cbs.view_transfer")
 def transfer_requests_history(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Transfers Requests History",
     )
@@ -758,7 +758,7 @@ def transfer_requests_history(request):
 @is_staff_user
 @view_permission("cbs.view_chequerequest")
 def cheque_requests(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Cheque Requests",
     )
@@ -782,7 +782,7 @@ def cheque_requests(request):
 @is_staff_user
 @view_permission("cbs.view_chequerequest")
 def cheque_request_history(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Cheque Request History",
     )
@@ -804,7 +804,7 @@ def cheque_request_history(request):
 @edit_permission("cbs.view_chequerequest", "cbs.change_chequerequest")
 def cheque_request_detail(request, uuid):
     cheque_request = cbsmodel.ChequeRequest.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"View Cheque Request Detail: {str(cheque_request)}",
     )
@@ -819,7 +819,7 @@ def cheque_request_detail(request, uuid):
             messages.success(request, "Status updated successfully")
             body = instnace.comments
             generic_send_sms.delay(str(cheque_request.user.phone_number), body)
-            log_action.delay(
+            log_action(
                 user_id=request.user.id,
                 action=f"Changed Cheque Request detail, with comments: {body}",
             )
@@ -842,7 +842,7 @@ def cheque_request_detail(request, uuid):
 @is_staff_user
 @view_permission("cbs.view_cardservice")
 def card_request(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Card Services Requests",
     )
@@ -866,7 +866,7 @@ def card_request(request):
 @is_staff_user
 @view_permission("cbs.view_cardservice")
 def card_request_history(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Card Service Request History",
     )
@@ -888,7 +888,7 @@ def card_request_history(request):
 @edit_permission("cbs.view_cardservice", "cbs.change_cardservice")
 def card_request_detail(request, uuid):
     card_request = cbsmodel.CardRequest.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"View Card Service Request Detail: {str(card_request)}",
     )
@@ -901,7 +901,7 @@ def card_request_detail(request, uuid):
             messages.success(request, "Status updated successfully")
             body = instnace.comments
             generic_send_sms.delay(str(card_request.user.phone_number), body)
-            log_action.delay(
+            log_action(
                 user_id=request.user.id,
                 action=f"Changed Card Service Request detail, with comments: {body}",
             )
@@ -924,7 +924,7 @@ def card_request_detail(request, uuid):
 @is_staff_user
 @view_permission("cbs.view_payment")
 def payments(request):
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action="View Payments",
     )
@@ -944,7 +944,7 @@ def payments(request):
 @view_permission("cbs.view_payment")
 def payments_detail(request, uuid):
     payment = cbsmodel.Payment.objects.get(uuid=uuid)
-    log_action.delay(
+    log_action(
         user_id=request.user.id,
         action=f"View Payments Detail: {payment}",
     )
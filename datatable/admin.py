@@ -163,3 +163,24 @@ class TelcoDataPlanAdmin(ImportExportAdmin):
         "data",
         "price",
     )
+
+
+@admin.register(models.ReferenceDataSync)
+class ReferenceDataSyncAdmin(admin.ModelAdmin):
+    list_display = [
+        "name",
+        "status",
+        "records",
+        "last_started",
+        "last_finished",
+        "last_success",
+    ]
+    readonly_fields = [
+        "name",
+        "status",
+        "records",
+        "error",
+        "last_started",
+        "last_finished",
+        "last_success",
+    ]
@@ -0,0 +1,156 @@
+"""
+in-memory nearest lookup for branches and ATMs.
+
+each process keeps the open locations of a model in a grid of
+GRID_DEGREES cells. a query scans rings of cells around the point and stops
+as soon as no unscanned cell can hold anything closer, so a lookup touches
+a handful of rows whatever the size of the table. saving or deleting a
+location bumps a version key and every process rebuilds its grid on the
+next lookup.
+"""
+
+import math
+import threading
+import uuid
+
+from django.core.cache import cache
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GRID_DEGREES = 0.25
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    a = (
+        math.sin(math.radians(lat2 - lat1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def parse_coordinate(value, limit):
+    """
+    float value of a coordinate stored as text, None when it is not one
+    """
+    try:
+        number = float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    if math.isfinite(number) and -limit <= number <= limit:
+        return number
+    return None
+
+
+def _cell(latitude, longitude):
+    return (
+        math.floor(latitude / GRID_DEGREES),
+        math.floor(longitude / GRID_DEGREES),
+    )
+
+
+def _ring(center, radius):
+    i, j = center
+    if radius == 0:
+        yield center
+        return
+    for dj in range(-radius, radius + 1):
+        yield (i - radius, j + dj)
+        yield (i + radius, j + dj)
+    for di in range(-radius + 1, radius):
+        yield (i + di, j - radius)
+        yield (i + di, j + radius)
+
+
+class SpatialIndex:
+    def __init__(self, model):
+        self.model = model
+        self.version_key = f"geo:version:{model._meta.label_lower}"
+        self._lock = threading.Lock()
+        self._version = None
+        self._cells = {}
+        self._bounds = None
+        self._max_latitude = 0.0
+
+    def invalidate(self):
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def _load(self):
+        version = cache.get_or_set(self.version_key, uuid.uuid4().hex, None)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            cells = {}
+            rows = self.model.objects.filter(
+                closed=False, latitude__isnull=False, longitude__isnull=False
+            ).values_list("pk", "latitude", "longitude")
+            for pk, latitude, longitude in rows:
+                cells.setdefault(_cell(latitude, longitude), []).append(
+                    (pk, latitude, longitude)
+                )
+            self._cells = cells
+            if cells:
+                rows_i = [i for i, _ in cells]
+                rows_j = [j for _, j in cells]
+                self._bounds = (min(rows_i), max(rows_i), min(rows_j), max(rows_j))
+                self._max_latitude = max(
+                    abs(latitude)
+                    for points in cells.values()
+                    for _, latitude, _ in points
+                )
+            else:
+                self._bounds = None
+            self._version = version
+
+    def nearest(self, latitude, longitude, limit=None, radius_km=None):
+        """
+        [(distance in km, pk)] of the open locations, closest first
+        """
+        self._load()
+        cells, bounds = self._cells, self._bounds
+        if bounds is None:
+            return []
+        center = _cell(latitude, longitude)
+        min_i, max_i, min_j, max_j = bounds
+        last_ring = max(
+            abs(center[0] - min_i),
+            abs(center[0] - max_i),
+            abs(center[1] - min_j),
+            abs(center[1] - max_j),
+        )
+        # a degree of longitude is shortest at the highest latitude involved
+        shrink = math.cos(
+            math.radians(min(89.0, max(abs(latitude), self._max_latitude)))
+        )
+
+        found = []
+        radius = 0
+        while radius <= last_ring:
+            for cell in _ring(center, radius):
+                for pk, lat, lon in cells.get(cell, ()):
+                    distance = haversine_km(latitude, longitude, lat, lon)
+                    if radius_km is None or distance <= radius_km:
+                        found.append((distance, pk))
+            # anything in a farther ring is at least this far away
+            floor_km = radius * GRID_DEGREES * KM_PER_DEGREE * shrink
+            if radius_km is not None and floor_km > radius_km:
+                break
+            if limit is not None and len(found) >= limit:
+                found.sort()
+                if found[limit - 1][0] <= floor_km:
+                    break
+            radius += 1
+        found.sort()
+        return found if limit is None else found[:limit]
+
+
+_indexes = {}
+
+
+def index_for(model):
+    if model not in _indexes:
+        _indexes[model] = SpatialIndex(model)
+    return _indexes[model]
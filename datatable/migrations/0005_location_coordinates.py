@@ -0,0 +1,70 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:11
+
+import math
+
+from django.db import migrations, models
+
+
+def parse_coordinate(value, limit):
+    # a copy of datatable.geo.parse_coordinate as it was, migrations must not
+    # change with the app code
+    try:
+        number = float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    if math.isfinite(number) and -limit <= number <= limit:
+        return number
+    return None
+
+
+def fill_coordinates(apps, schema_editor):
+    for name in ("BankBranch", "Atm"):
+        model = apps.get_model("datatable", name)
+        rows = list(model.objects.all())
+        for row in rows:
+            row.latitude = parse_coordinate(row.langtitude_cordinates, 90)
+            row.longitude = parse_coordinate(row.longitude_cordinates, 180)
+        model.objects.bulk_update(rows, ["latitude", "longitude"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datatable", "0004_telcodataplan"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="atm",
+            name="latitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="atm",
+            name="longitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="bankbranch",
+            name="latitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="bankbranch",
+            name="longitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="atm",
+            index=models.Index(
+                fields=["latitude", "longitude"], name="datatable_a_latitud_2a3d40_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bankbranch",
+            index=models.Index(
+                fields=["latitude", "longitude"], name="datatable_b_latitud_3895e5_idx"
+            ),
+        ),
+        migrations.RunPython(fill_coordinates, migrations.RunPython.noop),
+    ]
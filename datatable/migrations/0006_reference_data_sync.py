@@ -0,0 +1,71 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:13
+
+from django.db import migrations, models
+
+
+def release_duplicate_codes(apps, schema_editor):
+    # rows sharing a country and code with an older row keep their data and
+    # references but lose the code, so the unique constraint can be added
+    for name in ("OtherBank", "NetworkProvider"):
+        model = apps.get_model("datatable", name)
+        seen = set()
+        for row in model.objects.exclude(code=None).order_by("id"):
+            key = (row.country, row.code)
+            if key in seen:
+                row.code = None
+                row.save(update_fields=["code"])
+            seen.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("datatable", "0005_location_coordinates"),
+    ]
+
+    operations = [
+        migrations.RunPython(release_duplicate_codes, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name="ReferenceDataSync",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("running", "Running"),
+                            ("success", "Success"),
+                            ("failed", "Failed"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("records", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True, default="")),
+                ("last_started", models.DateTimeField(blank=True, null=True)),
+                ("last_finished", models.DateTimeField(blank=True, null=True)),
+                ("last_success", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="networkprovider",
+            constraint=models.UniqueConstraint(
+                fields=("country", "code"), name="unique_network_provider_code"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="otherbank",
+            constraint=models.UniqueConstraint(
+                fields=("country", "code"), name="unique_other_bank_code"
+            ),
+        ),
+    ]
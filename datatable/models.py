@@ -1,9 +1,11 @@
 from django.db import models
-from django.db.models import FloatField
-from django.db.models.functions import Cast, Sin, Cos, Sqrt, Radians, ATan2
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from ckeditor.fields import RichTextField
 import uuid
 
+from . import geo
+
 # from geopy.geocoders import GoogleV3
 
 # Create your models here.
@@ -91,6 +93,9 @@ class BankBranch(models.Model):
     country = models.CharField(max_length=240, default="São Tomé and Príncipe")
     langtitude_cordinates = models.CharField(max_length=240, null=True, blank=True)
     longitude_cordinates = models.CharField(max_length=240, null=True, blank=True)
+    # parsed from the coordinate text on save, used for distance lookups
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
     address = models.CharField(max_length=400, null=True, blank=True)
     closed = models.BooleanField(default=False)
     secrets = models.UUIDField(default=uuid.uuid4, blank=True, null=True)
@@ -102,34 +107,34 @@ class BankBranch(models.Model):
 
     class Meta:
         ordering = ("name",)
+        indexes = [models.Index(fields=["latitude", "longitude"])]
 
     def save(self, *args, **kwargs):
         # geolocator = GoogleV3()
         # location = geolocator.reverse("52.509669, 13.376294")
         # self.address = location.address
+        self.latitude = geo.parse_coordinate(self.langtitude_cordinates, 90)
+        self.longitude = geo.parse_coordinate(self.longitude_cordinates, 180)
         super().save(*args, **kwargs)
 
     @classmethod
-    def find_closest(cls, latitude: float, longitude: float) -> list[dict]:
-        R = 6371
-        lat1_rad = Radians(latitude)
-        lon1_rad = Radians(longitude)
-        lat2_rad = Radians(Cast("langtitude_cordinates", FloatField()))
-        lon2_rad = Radians(Cast("longitude_cordinates", FloatField()))
-
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
-
-        a = Sin(dlat / 2) ** 2 + Cos(lat1_rad) * Cos(lat2_rad) * Sin(dlon / 2) ** 2
-        c = 2 * ATan2(Sqrt(a), Sqrt(1 - a))
-        distance = R * c
-
-        closest_branches = list(
-            cls.objects.annotate(distance=distance)
-            .exclude(closed=True)
-            .order_by("distance")
-            .values("id", "name", "address", "distance")[:3]
-        )
+    def find_closest(
+        cls, latitude: float, longitude: float, limit: int = 3
+    ) -> list[dict]:
+        nearest = geo.index_for(cls).nearest(latitude, longitude, limit=limit)
+        branches = cls.objects.in_bulk([pk for _, pk in nearest])
+        closest_branches = [
+            {
+                "id": pk,
+                "name": branches[pk].name,
+                "address": branches[pk].address,
+                "langtitude_cordinates": branches[pk].langtitude_cordinates,
+                "longitude_cordinates": branches[pk].longitude_cordinates,
+                "distance": distance,
+            }
+            for distance, pk in nearest
+            if pk in branches
+        ]
 
         if not closest_branches:
             raise cls.DoesNotExist("No branches available")
@@ -141,6 +146,8 @@ class Atm(models.Model):
     country = models.CharField(max_length=240, default="São Tomé and Príncipe")
     langtitude_cordinates = models.CharField(max_length=240, null=True, blank=True)
     longitude_cordinates = models.CharField(max_length=240, null=True, blank=True)
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
     address = models.CharField(max_length=400, null=True, blank=True)
     closed = models.BooleanField(default=False)
     date_created = models.DateTimeField(auto_now_add=True)
@@ -151,11 +158,14 @@ class Atm(models.Model):
 
     class Meta:
         ordering = ("-date_created",)
+        indexes = [models.Index(fields=["latitude", "longitude"])]
 
     def save(self, *args, **kwargs):
         # geolocator = GoogleV3()
         # location = geolocator.reverse("52.509669, 13.376294")
         # self.address = location.address
+        self.latitude = geo.parse_coordinate(self.langtitude_cordinates, 90)
+        self.longitude = geo.parse_coordinate(self.longitude_cordinates, 180)
         super().save(*args, **kwargs)
 
 
@@ -229,6 +239,11 @@ class OtherBank(models.Model):
 
     class Meta:
         ordering = ("name",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["country", "code"], name="unique_other_bank_code"
+            )
+        ]
 
 
 class FileManager(models.Model):
@@ -294,6 +309,33 @@ class NetworkProvider(models.Model):
 
     class Meta:
         ordering = ("name",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["country", "code"], name="unique_network_provider_code"
+            )
+        ]
+
+
+class ReferenceDataSync(models.Model):
+    """
+    outcome of the last scheduled sync of a reference table
+    """
+
+    class Status(models.TextChoices):
+        RUNNING = "running", "Running"
+        SUCCESS = "success", "Success"
+        FAILED = "failed", "Failed"
+
+    name = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=20, choices=Status.choices)
+    records = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    last_started = models.DateTimeField(null=True, blank=True)
+    last_finished = models.DateTimeField(null=True, blank=True)
+    last_success = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} - {self.status}"
 
 
 class TelcoDataPlan(models.Model):
@@ -309,3 +351,11 @@ class TelcoDataPlan(models.Model):
 
     def __str__(self) -> str:
         return self.name
+
+
+@receiver(post_save, sender=BankBranch)
+@receiver(post_delete, sender=BankBranch)
+@receiver(post_save, sender=Atm)
+@receiver(post_delete, sender=Atm)
+def invalidate_location_index(sender, **kwargs):
+    geo.index_for(sender).invalidate()
@@ -1,98 +1,103 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from loguru import logger
-from .models import OtherBank, NetworkProvider
-from django.core.cache import cache
+from .models import OtherBank, NetworkProvider, ReferenceDataSync
 from django.conf import settings
+from django.utils import timezone
+from config import celery_app
 
 
 payStackSecretKey = settings.PAYSTACK_SECRET_KEY
 payStackBaseUrl = settings.PAYSTACK_BASE_URL
 
 
-# @celery_app.task
+PAYSTACK_COUNTRIES = ["ghana", "kenya", "nigeria"]
+MOBILE_MONEY_TYPES = ["mobile_money", "mobile_money_business"]
+
+
+def fetch_paystack_banks(country):
+    response = requests.get(
+        f"{payStackBaseUrl}/bank",
+        params={"country": country},
+        headers={"Authorization": f"Bearer {payStackSecretKey}"},
+        timeout=30,
+    )
+    response.raise_for_status()
+    return response.json()["data"]
+
+
+def fetch_all_paystack_banks():
+    # one request per country, sent side by side
+    with ThreadPoolExecutor(max_workers=len(PAYSTACK_COUNTRIES)) as executor:
+        return [
+            bank
+            for banks in executor.map(fetch_paystack_banks, PAYSTACK_COUNTRIES)
+            for bank in banks
+        ]
+
+
+def sync_paystack_institutions(name, model, mobile_money):
+    """
+    upsert the paystack banks (or mobile money networks) into model, keyed
+    on country and code, and record the outcome in ReferenceDataSync
+    """
+    sync, _ = ReferenceDataSync.objects.get_or_create(
+        name=name, defaults={"status": ReferenceDataSync.Status.RUNNING}
+    )
+    sync.status = ReferenceDataSync.Status.RUNNING
+    sync.last_started = timezone.now()
+    sync.save(update_fields=["status", "last_started"])
+
+    try:
+        rows = {}
+        for bank in fetch_all_paystack_banks():
+            if not bank.get("code"):
+                continue
+            if (bank.get("type") in MOBILE_MONEY_TYPES) != mobile_money:
+                continue
+            rows[(bank["country"], bank["code"])] = model(
+                name=bank["name"],
+                country=bank["country"],
+                currency=bank["currency"],
+                code=bank["code"],
+                active=bank["active"],
+            )
+        model.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=["country", "code"],
+            update_fields=["name", "currency", "active", "last_udpated"],
+            batch_size=500,
+        )
+    except Exception as e:
+        logger.error(f"=== ERROR: [Sync {name}] {e}")
+        sync.status = ReferenceDataSync.Status.FAILED
+        sync.error = str(e)
+        sync.last_finished = timezone.now()
+        sync.save(update_fields=["status", "error", "last_finished"])
+        return f"Failed to sync {name}"
+
+    sync.status = ReferenceDataSync.Status.SUCCESS
+    sync.records = len(rows)
+    sync.error = ""
+    sync.last_finished = sync.last_success = timezone.now()
+    sync.save()
+    logger.info(f"=== [Sync {name}] {len(rows)} records")
+    return f"Synced {len(rows)} {name}"
+
+
+@celery_app.task
 def get_other_banks():
-    cached_key = "get_other_banks"
-    if cache.get(cached_key):
-        return "Already fetched other bank accounts"
-    cache.set(cached_key, True, 2678400)
-    headers = {
-        "Authorization": f"Bearer {payStackSecretKey}",
-        "country": "ghana",
-    }
-
-    countries = ["ghana", "kenya", "nigeria"]
-    for country in countries:
-        base_url = f"{payStackBaseUrl}/bank?country={country}"
-        # now make API request
-        response = requests.get(base_url, headers=headers)
-        logger.info(response)
-        if response.status_code != 200:
-            return logger.error("=== ERROR: [Get Other Banks] ", response.text)
-
-        json_response = json.loads(response.text)
-
-        data = json_response["data"]
-
-        logger.info("=== data ===")
-        logger.info(data)
-
-        for bank in data:
-            if (
-                bank["type"] not in ["mobile_money", "mobile_money_business"]
-                and not OtherBank.objects.filter(code=bank["code"]).exists()
-            ):
-                OtherBank.objects.create(
-                    name=bank["name"],
-                    country=bank["country"],
-                    currency=bank["currency"],
-                    code=bank["code"],
-                    active=bank["active"],
-                )
-
-    return "Fetched other bank accounts"
+    return sync_paystack_institutions("other_banks", OtherBank, mobile_money=False)
 
 
+@celery_app.task
 def get_other_networks():
-    cached_key = "get_other_networks"
-    if cache.get(cached_key):
-        return "Already fetched other networks accounts"
-    cache.set(cached_key, True, 2678400)
-    headers = {
-        "Authorization": f"Bearer {payStackSecretKey}",
-        "country": "ghana",
-    }
-
-    countries = ["ghana", "kenya", "nigeria"]
-    for country in countries:
-        base_url = f"{payStackBaseUrl}/bank?country={country}"
-        # now make API request
-        response = requests.get(base_url, headers=headers)
-        logger.info(response)
-        if response.status_code != 200:
-            return logger.error("=== ERROR: [Get Other Networks] ", response.text)
-
-        json_response = json.loads(response.text)
-
-        data = json_response["data"]
-
-        logger.info("=== data ===")
-        logger.info(data)
-
-        for bank in data:
-            if (
-                bank["type"] in ["mobile_money", "mobile_money_business"]
-                and not NetworkProvider.objects.filter(code=bank["code"]).exists()
-            ):
-                NetworkProvider.objects.create(
-                    name=bank["name"],
-                    country=bank["country"],
-                    currency=bank["currency"],
-                    code=bank["code"],
-                    active=bank["active"],
-                )
-
-    return "Fetched other bank accounts"
+    return sync_paystack_institutions(
+        "network_providers", NetworkProvider, mobile_money=True
+    )
 
 
 def resolve_phone_number(phone_number, network_provider_code):
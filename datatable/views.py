@@ -6,8 +6,9 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.http import HttpRequest
-from .tasks import get_other_banks, get_other_networks, resolve_phone_number
-from drf_spectacular.utils import extend_schema
+from .tasks import resolve_phone_number
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from . import geo
 from helpers import exceptions
 
 
@@ -53,7 +54,58 @@ class TransactionPurposeViewset(ModelViewSet):
     http_method_names = ["get"]
 
 
-class BranchesViewset(ModelViewSet):
+class NearestLocationMixin:
+    """
+    with ?latitude=&longitude= the list is ordered by distance and every
+    item carries its distance in km, ?radius= limits that distance
+    """
+
+    def _location_params(self):
+        params = self.request.query_params
+        if "latitude" not in params or "longitude" not in params:
+            return None
+        latitude = geo.parse_coordinate(params.get("latitude"), 90)
+        longitude = geo.parse_coordinate(params.get("longitude"), 180)
+        if latitude is None or longitude is None:
+            raise exceptions.GeneralException("Invalid latitude or longitude")
+        radius = params.get("radius")
+        if radius is not None:
+            try:
+                radius = float(radius)
+            except ValueError:
+                raise exceptions.GeneralException("Invalid radius")
+        return latitude, longitude, radius
+
+    def list(self, request, *args, **kwargs):
+        location = self._location_params()
+        if location is None:
+            return super().list(request, *args, **kwargs)
+        latitude, longitude, radius = location
+        nearest = geo.index_for(self.queryset.model).nearest(
+            latitude, longitude, radius_km=radius
+        )
+        page = self.paginate_queryset(nearest)
+        if page is None:
+            page = nearest
+        objects = self.get_queryset().in_bulk([pk for _, pk in page])
+        data = []
+        for distance, pk in page:
+            if pk in objects:
+                item = self.get_serializer(objects[pk]).data
+                item["distance"] = round(distance, 2)
+                data.append(item)
+        return self.get_paginated_response(data)
+
+
+LOCATION_PARAMETERS = [
+    OpenApiParameter("latitude", float, description="closest first when given"),
+    OpenApiParameter("longitude", float),
+    OpenApiParameter("radius", float, description="maximum distance in km"),
+]
+
+
+@extend_schema_view(list=extend_schema(parameters=LOCATION_PARAMETERS))
+class BranchesViewset(NearestLocationMixin, ModelViewSet):
     serializer_class = serializers.BankBranchSerializer
     queryset = models.BankBranch.objects.all()
     # permission_classes = [rest_permissions.IsAuthenticated]
@@ -63,7 +115,8 @@ class BranchesViewset(ModelViewSet):
         return self.queryset.filter(closed=False)
 
 
-class ATMsViewset(ModelViewSet):
+@extend_schema_view(list=extend_schema(parameters=LOCATION_PARAMETERS))
+class ATMsViewset(NearestLocationMixin, ModelViewSet):
     serializer_class = serializers.ATMSerializer
     queryset = models.Atm.objects.all()
     # permission_classes = [rest_permissions.IsAuthenticated]
@@ -100,8 +153,7 @@ class OtherBankViewset(ModelViewSet):
     filterset_fields = ("country",)
 
     def get_queryset(self):
-        # get other bank celery task here
-        get_other_banks()
+        # kept up to date by the get_other_banks beat task
         return self.queryset.filter(active=True)
 
     @action(
@@ -215,7 +267,7 @@ class NetworkProvidersViewset(ModelViewSet):
     filteset_fields = "country"
 
     def get_queryset(self):
-        get_other_networks()
+        # kept up to date by the get_other_networks beat task
         return super().get_queryset().filter(active=True)
 
     @action(
@@ -0,0 +1,222 @@
+"""
+buffered writer for audit rows (AccessGuardian, ActivityLog).
+
+the request only captures the raw values and puts an event on an
+in-process queue. a background thread parses user agents (memoized per UA
+string) and inserts the rows with bulk_create every AUDIT_FLUSH_INTERVAL
+seconds or AUDIT_BATCH_SIZE events, whichever comes first. the queue is
+drained at interpreter exit so a graceful worker shutdown loses nothing.
+
+rows get their date_created when flushed, at most a flush interval after
+the event.
+"""
+
+import atexit
+import os
+import queue
+import threading
+from functools import lru_cache
+
+import user_agents
+from django.conf import settings
+from django.db import connection
+from loguru import logger
+
+
+@lru_cache(maxsize=2048)
+def parse_user_agent(user_agent_string):
+    agent = user_agents.parse(user_agent_string)
+    if agent.is_mobile:
+        device = "Mobile"
+    elif agent.is_tablet:
+        device = "Tablet"
+    elif agent.is_pc:
+        device = "PC"
+    else:
+        device = "Unknown"
+    return {
+        "device": device,
+        "browser": agent.browser.family,
+        "browser_version": agent.browser.version_string,
+        "os": agent.os.family,
+        "os_version": agent.os.version_string,
+    }
+
+
+def _access_guardian_row(event):
+    from accounts.models import AccessGuardian
+
+    agent = parse_user_agent(event["user_agent"])
+    values = {
+        "log_type": event["log_type"],
+        "phone_number": event["phone_number"],
+        "device": event["channel"] or agent["device"],
+        "browser": agent["browser"],
+        "browser_version": agent["browser_version"],
+        "os": agent["os"],
+        "os_version": agent["os_version"],
+        "ip_address": event["ip_address"],
+    }
+    # a value too long for its column would fail the whole batch
+    for field, value in values.items():
+        max_length = AccessGuardian._meta.get_field(field).max_length
+        if value and max_length:
+            values[field] = str(value)[:max_length]
+    return AccessGuardian(**values)
+
+
+def _activity_log_row(event):
+    from accounts.models import ActivityLog
+
+    return ActivityLog(user_id=event["user_id"], action=event["action"])
+
+
+ROW_BUILDERS = {
+    "access_guardian": _access_guardian_row,
+    "activity_log": _activity_log_row,
+}
+
+
+class AuditWriter:
+    def __init__(
+        self,
+        batch_size=settings.AUDIT_BATCH_SIZE,
+        flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+        max_queue=settings.AUDIT_QUEUE_SIZE,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.reset()
+
+    def reset(self):
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def put(self, kind, **event):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((kind, event))
+        except queue.Full:
+            # the database is falling behind, write this one on the spot
+            logger.warning("=== [AUDIT] queue full, writing {} inline", kind)
+            self._write([(kind, event)])
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="audit-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take(block=True)
+            if batch:
+                self._write(batch)
+                connection.close()
+
+    def _take(self, block):
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            else:
+                batch.append(self._queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch):
+        from accounts.models import AccessGuardian, ActivityLog
+
+        models = {"access_guardian": AccessGuardian, "activity_log": ActivityLog}
+        rows = {kind: [] for kind in models}
+        for kind, event in batch:
+            try:
+                rows[kind].append(ROW_BUILDERS[kind](event))
+            except Exception as e:
+                logger.error("=== [AUDIT] dropping malformed {} event: {}", kind, e)
+
+        with self._flush_lock:
+            for kind, objs in rows.items():
+                if not objs:
+                    continue
+                try:
+                    models[kind].objects.bulk_create(objs)
+                except Exception as e:
+                    logger.warning(
+                        "=== [AUDIT] batch of {} {} failed, retrying one by one: {}",
+                        len(objs),
+                        kind,
+                        e,
+                    )
+                    for obj in objs:
+                        try:
+                            obj.save()
+                        except Exception as e:
+                            logger.error("=== [AUDIT] could not save {}: {}", kind, e)
+
+    def drain(self):
+        """
+        write everything still queued, called at exit
+        """
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            # let the writer finish the batch it is holding
+            thread.join(timeout=self.flush_interval + 10)
+        while True:
+            batch = self._take(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+
+writer = AuditWriter()
+atexit.register(writer.drain)
+
+if hasattr(os, "register_at_fork"):
+    # events queued before the fork belong to the parent
+    os.register_at_fork(after_in_child=writer.reset)
+
+
+def client_ip(request):
+    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if x_forwarded_for:
+        return x_forwarded_for.split(",")[0]
+    return request.META.get("REMOTE_ADDR")
+
+
+def log_access_guardian(request, log_type, phone_number="", channel=None):
+    """
+    queue an AccessGuardian row. without a channel it is read from the
+    CHANNEL header, falling back to the device type of the user agent.
+    """
+    if channel is None:
+        channel = request.META.get("HTTP_CHANNEL", "")
+    writer.put(
+        "access_guardian",
+        log_type=str(log_type),
+        phone_number=phone_number,
+        channel=channel,
+        user_agent=request.META.get("HTTP_USER_AGENT", ""),
+        ip_address=client_ip(request),
+    )
+
+
+def log_action(user_id, action):
+    """
+    queue an ActivityLog row for a staff action
+    """
+    writer.put("activity_log", user_id=user_id, action=action)
@@ -0,0 +1,25 @@
+from django.core.cache.backends.redis import RedisCache
+
+from helpers import metrics
+
+_missing = object()
+
+
+class InstrumentedRedisCache(RedisCache):
+    """
+    redis cache that reports hits and misses to the request metrics
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        if value is _missing:
+            metrics.record_cache(misses=1)
+            return default
+        metrics.record_cache(hits=1)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        metrics.record_cache(hits=len(values), misses=len(keys) - len(values))
+        return values
@@ -0,0 +1,358 @@
+"""
+per-request instrumentation: database queries, T24 calls, cache hits and
+misses, and celery tasks enqueued.
+
+RequestMetricsMiddleware opens a RequestMetrics for each request in a
+context variable and the hooks below add to it from wherever the work
+happens, including sync_to_async threads, which copy the context, and the
+body of streamed responses, which runs after the middleware returned. totals
+are folded into a per-process registry that is flushed to a redis hash every
+few seconds, so /metrics/ renders all workers in the prometheus text format.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from celery.signals import before_task_publish
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from loguru import logger
+
+from helpers.redis import get_redis
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        # operation -> [calls, seconds]
+        self.t24 = defaultdict(lambda: [0, 0.0])
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.celery_tasks = Counter()
+        # hooks can fire from several threads at once (refresh executor)
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def t24_calls(self):
+        return sum(calls for calls, _ in self.t24.values())
+
+    @property
+    def t24_time(self):
+        return sum(seconds for _, seconds in self.t24.values())
+
+    def headers(self):
+        return {
+            "X-DB-Queries": str(self.db_queries),
+            "X-DB-Time-Ms": f"{self.db_time * 1000:.1f}",
+            "X-T24-Calls": str(self.t24_calls),
+            "X-T24-Time-Ms": f"{self.t24_time * 1000:.1f}",
+            "X-Cache-Hits": str(self.cache_hits),
+            "X-Cache-Misses": str(self.cache_misses),
+            "X-Celery-Tasks": str(sum(self.celery_tasks.values())),
+            "Server-Timing": (
+                f"db;dur={self.db_time * 1000:.1f}, "
+                f"t24;dur={self.t24_time * 1000:.1f}, "
+                f"total;dur={self.elapsed * 1000:.1f}"
+            ),
+        }
+
+
+def current() -> RequestMetrics | None:
+    return _current.get()
+
+
+def begin():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end(token):
+    _current.reset(token)
+
+
+def measure_stream(content, metrics, done):
+    """
+    iterate a streamed body under `metrics`, then call `done`
+    """
+    try:
+        while True:
+            token = _current.set(metrics)
+            try:
+                chunk = next(content)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        done()
+
+
+async def ameasure_stream(content, metrics, done):
+    """
+    measure_stream for async bodies. the context variable is only set while
+    a chunk is produced, it would otherwise leak into the server's task
+    """
+    try:
+        while True:
+            token = _current.set(metrics)
+            try:
+                chunk = await anext(content)
+            except StopAsyncIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        done()
+
+
+# hooks
+
+
+def record_db(elapsed):
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics._lock:
+            metrics.db_queries += 1
+            metrics.db_time += elapsed
+
+
+def record_t24(operation, elapsed):
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics._lock:
+            metrics.t24[operation][0] += 1
+            metrics.t24[operation][1] += elapsed
+
+
+def record_cache(hits=0, misses=0):
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics._lock:
+            metrics.cache_hits += hits
+            metrics.cache_misses += misses
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    if _current.get() is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record_db(time.perf_counter() - started)
+
+
+def _add_db_wrapper(connection):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _add_db_wrapper(connection)
+
+
+def _on_task_publish(sender=None, **kwargs):
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics._lock:
+            metrics.celery_tasks[sender] += 1
+
+
+def install():
+    connection_created.connect(
+        _on_connection_created, dispatch_uid="request_metrics_db"
+    )
+    for connection in connections.all(initialized_only=True):
+        _add_db_wrapper(connection)
+    before_task_publish.connect(
+        _on_task_publish, dispatch_uid="request_metrics_celery", weak=False
+    )
+
+
+# aggregation
+
+METRICS = {
+    "digital_http_requests_total": ("counter", "HTTP requests by view and status"),
+    "digital_http_request_duration_seconds": (
+        "histogram",
+        "HTTP request duration by view",
+    ),
+    "digital_db_queries_total": ("counter", "Database queries by view"),
+    "digital_db_query_seconds_total": ("counter", "Database time by view"),
+    "digital_t24_calls_total": ("counter", "T24 calls by view and operation"),
+    "digital_t24_call_seconds_total": (
+        "counter",
+        "T24 time by view and operation",
+    ),
+    "digital_cache_hits_total": ("counter", "Cache hits by view"),
+    "digital_cache_misses_total": ("counter", "Cache misses by view"),
+    "digital_celery_tasks_enqueued_total": (
+        "counter",
+        "Celery tasks enqueued by view and task",
+    ),
+    "digital_chatbot_answer_cache_total": (
+        "counter",
+        "Chatbot answer cache lookups and stores by result and language",
+    ),
+}
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class MetricsRegistry:
+    """
+    per-process totals, flushed into a redis hash shared by all workers
+    """
+
+    REDIS_KEY = "metrics:requests"
+
+    def __init__(self, flush_interval=settings.REQUEST_METRICS_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+        self._last_flush = time.monotonic()
+
+    def _inc(self, name, labels, value=1):
+        self._values[(name, tuple(sorted(labels.items())))] += value
+
+    def increment(self, name, labels, value=1):
+        """
+        count an event outside of the per-request metrics
+        """
+        with self._lock:
+            self._inc(name, labels, value)
+
+    def observe(self, metrics: RequestMetrics, view, method, status):
+        elapsed = metrics.elapsed
+        labels = {"view": view, "method": method}
+        with self._lock:
+            self._inc("digital_http_requests_total", {**labels, "status": status})
+            duration = "digital_http_request_duration_seconds"
+            for bucket in DURATION_BUCKETS:
+                self._inc(
+                    f"{duration}_bucket",
+                    {**labels, "le": str(bucket)},
+                    int(elapsed <= bucket),
+                )
+            self._inc(f"{duration}_bucket", {**labels, "le": "+Inf"})
+            self._inc(f"{duration}_sum", labels, elapsed)
+            self._inc(f"{duration}_count", labels)
+
+            labels = {"view": view}
+            self._inc("digital_db_queries_total", labels, metrics.db_queries)
+            self._inc("digital_db_query_seconds_total", labels, metrics.db_time)
+            self._inc("digital_cache_hits_total", labels, metrics.cache_hits)
+            self._inc("digital_cache_misses_total", labels, metrics.cache_misses)
+            for operation, (calls, seconds) in metrics.t24.items():
+                t24_labels = {**labels, "operation": operation}
+                self._inc("digital_t24_calls_total", t24_labels, calls)
+                self._inc("digital_t24_call_seconds_total", t24_labels, seconds)
+            for task, count in metrics.celery_tasks.items():
+                self._inc(
+                    "digital_celery_tasks_enqueued_total",
+                    {**labels, "task": task},
+                    count,
+                )
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            values, self._values = self._values, defaultdict(float)
+            self._last_flush = time.monotonic()
+        if not values:
+            return
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for (name, labels), value in values.items():
+                pipe.hincrbyfloat(self.REDIS_KEY, json.dumps([name, labels]), value)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("=== [METRICS] could not flush to redis: {}", e)
+            # keep the totals for the next attempt
+            with self._lock:
+                for key, value in values.items():
+                    self._values[key] += value
+
+    def collect(self):
+        self.flush()
+        values = defaultdict(float)
+        try:
+            for field, value in get_redis().hgetall(self.REDIS_KEY).items():
+                name, labels = json.loads(field)
+                values[(name, tuple(tuple(label) for label in labels))] = float(value)
+        except Exception as e:
+            logger.warning("=== [METRICS] could not read from redis: {}", e)
+        with self._lock:
+            for key, value in self._values.items():
+                values[key] += value
+        return values
+
+    def render(self):
+        """
+        prometheus text exposition format 0.0.4
+        """
+        samples = defaultdict(list)
+        for (name, labels), value in sorted(self.collect().items(), key=_sort_key):
+            family = name
+            for suffix in ("_bucket", "_sum", "_count"):
+                if name.endswith(suffix) and name[: -len(suffix)] in METRICS:
+                    family = name[: -len(suffix)]
+            samples[family].append((name, labels, value))
+
+        lines = []
+        for family, (kind, help_text) in METRICS.items():
+            if family not in samples:
+                continue
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            for name, labels, value in samples[family]:
+                rendered = ",".join(
+                    f'{key}="{_escape(label)}"' for key, label in labels
+                )
+                lines.append(f"{name}{{{rendered}}} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _sort_key(item):
+    (name, labels), _ = item
+    # one series per label set, its buckets in ascending order
+    le = dict(labels).get("le")
+    return (
+        name,
+        [label for label in labels if label[0] != "le"],
+        float(le) if le is not None else 0.0,
+    )
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=registry.reset)
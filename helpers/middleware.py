@@ -0,0 +1,94 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpRequest
+from loguru import logger
+
+from helpers import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    counts database queries, T24 calls, cache hits and celery tasks for each
+    request. debug builds get them back as response headers; every request
+    feeds the prometheus metrics served at /metrics/.
+
+    streamed responses are observed once their body has been sent, so the
+    work done while streaming counts too. their headers go out first and
+    only carry what the view did before returning.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        metrics.install()
+
+    @staticmethod
+    def measured(request: HttpRequest):
+        return settings.REQUEST_METRICS and request.path != "/metrics/"
+
+    def __call__(self, request: HttpRequest):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.measured(request):
+            return self.get_response(request)
+
+        request_metrics, token = metrics.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end(token)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request: HttpRequest):
+        if not self.measured(request):
+            return await self.get_response(request)
+
+        request_metrics, token = metrics.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end(token)
+        return self.finish(request, response, request_metrics)
+
+    def finish(self, request, response, request_metrics):
+        if settings.REQUEST_METRICS_HEADERS:
+            for header, value in request_metrics.headers().items():
+                response[header] = value
+
+        def done():
+            self.observe(request, response, request_metrics)
+
+        if not response.streaming:
+            done()
+        elif response.is_async:
+            response.streaming_content = metrics.ameasure_stream(
+                aiter(response.streaming_content), request_metrics, done
+            )
+        else:
+            response.streaming_content = metrics.measure_stream(
+                iter(response.streaming_content), request_metrics, done
+            )
+        return response
+
+    @staticmethod
+    def observe(request, response, request_metrics):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+        metrics.registry.observe(
+            request_metrics, view, request.method, str(response.status_code)
+        )
+        metrics.registry.maybe_flush()
+
+        if request_metrics.db_queries > settings.REQUEST_METRICS_QUERY_WARNING:
+            logger.warning(
+                "=== [METRICS] {} {} ran {} queries ({})",
+                request.method,
+                request.path,
+                request_metrics.db_queries,
+                view,
+            )
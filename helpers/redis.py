@@ -0,0 +1,38 @@
+import asyncio
+import os
+import weakref
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client = None
+_client_pid = None
+# event loop -> client, redis.asyncio connections belong to one loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_redis() -> redis.Redis:
+    """
+    raw redis client on the cache database, for the few places that need
+    more than the django cache api (locks, hashes, scripts).
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = redis.Redis.from_url(f"{settings.REDIS_URL}/{settings.CACHE_DB_ID}")
+        _client_pid = os.getpid()
+    return _client
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """
+    get_redis for coroutines, one client per running event loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = redis.asyncio.Redis.from_url(
+            f"{settings.REDIS_URL}/{settings.CACHE_DB_ID}"
+        )
+        _async_clients[loop] = client
+    return client
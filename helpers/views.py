@@ -0,0 +1,96 @@
+import hmac
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.permissions import BasePermission
+from rest_framework.views import APIView
+
+from helpers import metrics
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are coroutines.
+
+    authentication, permissions and throttling still run through DRF, in a
+    worker thread since they may hit the database. handlers must be declared
+    with `async def`.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if hasattr(response, "__await__"):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+def has_metrics_token(request):
+    """
+    whether the request carries METRICS_TOKEN as its bearer token
+    """
+    if not settings.METRICS_TOKEN:
+        return False
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    given = request.META.get("HTTP_AUTHORIZATION", "")
+    return hmac.compare_digest(given.encode(), expected.encode())
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """
+    accepts METRICS_TOKEN before the JWT authentication rejects it as a
+    malformed access token
+    """
+
+    def authenticate(self, request):
+        if has_metrics_token(request):
+            return AnonymousUser(), settings.METRICS_TOKEN
+        return None
+
+
+class IsStaffOrMetricsToken(BasePermission):
+    """
+    monitoring endpoints: staff users, or scrapers holding METRICS_TOKEN
+    """
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_staff) or has_metrics_token(
+            request
+        )
+
+
+def metrics_view(request):
+    """
+    request metrics of all workers in the prometheus text format, for staff
+    users and scrapers holding METRICS_TOKEN
+    """
+    if not (request.user.is_staff or has_metrics_token(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.registry.render(), content_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,312 @@
+import asyncio
+import json
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+from django.utils import timezone
+from loguru import logger
+
+from cbs.models import BankAccount
+from helpers import metrics
+from t24.resilience import T24Unavailable, resilience, unavailable_body
+from t24.singleflight import AsyncSingleFlight, SingleFlight
+
+base_url = settings.T24_BASE_URL
+headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
+
+# one pooled client per running event loop. under uvicorn that is a single
+# client per worker; async_to_sync callers get a short lived one.
+_clients = weakref.WeakKeyDictionary()
+
+singleflight = (
+    AsyncSingleFlight(
+        use_redis=settings.T24_SINGLEFLIGHT_REDIS,
+        wait=settings.T24_READ_TIMEOUT,
+    )
+    if settings.T24_SINGLEFLIGHT
+    else None
+)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.T24_POOL_SIZE,
+                max_keepalive_connections=(
+                    settings.T24_POOL_SIZE if settings.T24_KEEP_ALIVE else 0
+                ),
+            ),
+            timeout=httpx.Timeout(
+                settings.T24_READ_TIMEOUT,
+                connect=settings.T24_CONNECT_TIMEOUT,
+            ),
+        )
+        _clients[loop] = client
+    return client
+
+
+class AsyncT24Requests:
+    """
+    asyncio counterpart of T24Requests for async views.
+
+    methods mirror T24Requests and return the same values.
+    """
+
+    @staticmethod
+    async def _request(method, path, **kwargs):
+        """
+        upstream call behind the same per-operation bulkhead and breaker as
+        the sync client
+        """
+        url = f"{base_url}/{path}"
+        operation = resilience.operation(url)
+        breaker = resilience.breaker(operation)
+        try:
+            async with resilience.abulkhead(method, operation):
+                if not breaker.allow():
+                    return AsyncT24Requests._unavailable(
+                        method, url, f"Core banking {operation} is unavailable"
+                    )
+
+                started = time.monotonic()
+                try:
+                    response = await get_async_client().request(
+                        method, url, headers=headers, **kwargs
+                    )
+                except Exception:
+                    breaker.record(False, time.monotonic() - started)
+                    raise
+                finally:
+                    metrics.record_t24(operation, time.monotonic() - started)
+                breaker.record(response.status_code < 500, time.monotonic() - started)
+                return response
+        except T24Unavailable as e:
+            return AsyncT24Requests._unavailable(method, url, str(e))
+
+    @staticmethod
+    def _unavailable(method, url, detail):
+        return httpx.Response(
+            503, json=unavailable_body(detail), request=httpx.Request(method, url)
+        )
+
+    @staticmethod
+    async def _get(path, params=None):
+        if singleflight is None:
+            return await AsyncT24Requests._request("GET", path, params=params)
+
+        # identical reads in flight share one upstream call
+        key = SingleFlight.make_key("GET", f"{base_url}/{path}", params, headers)
+        return await singleflight.do(
+            key, lambda: AsyncT24Requests._request("GET", path, params=params)
+        )
+
+    @staticmethod
+    async def _post(path, payload):
+        return await AsyncT24Requests._request(
+            "POST", path, json=json.dumps({"body": payload})
+        )
+
+    @staticmethod
+    async def health_check():
+        response = await AsyncT24Requests._get(
+            "party/getGtCustomerInfo", params={"customerNumber": str(208)}
+        )
+        return response.status_code == 200
+
+    @staticmethod
+    async def verify_phone_number(phone_number):
+        response = await AsyncT24Requests._get(
+            "party/getGtCustomerInfo", params={"mobileNumber": phone_number}
+        )
+        if response.status_code == 200:
+            body = response.json()["body"]
+            return True if body else False
+
+        logger.error("=== ERROR: [Verify Phone] {}", response.text)
+        return False
+
+    @staticmethod
+    async def get_customer_info_with_phone(phone_number):
+        formated_phone_number = str(phone_number).replace("+", "")
+        response = await AsyncT24Requests._get(
+            "party/getGtCustomerInfo",
+            params={"mobileNumber": str(formated_phone_number)},
+        )
+        if response.status_code == 200:
+            body = response.json()["body"]
+            return body[0] if body else None
+
+        logger.error("=== ERROR: [Get Customer Info] {}", response.text)
+        return None
+
+    get_customer_dob_phone = get_customer_info_with_phone
+
+    @staticmethod
+    async def get_customer_accounts(customer_number):
+        response = await AsyncT24Requests._get(
+            "party/getGtiAccountDetails", params={"customerNumber": customer_number}
+        )
+        if response.status_code == 200:
+            body = response.json()["body"]
+            return body if body else None
+        logger.error("=== ERROR: [Get Customer Accounts] {}", response.text)
+        return None
+
+    @staticmethod
+    async def get_account_details(account_number):
+        response = await AsyncT24Requests._get(
+            "party/getGtiAccountDetails", params={"accountNumber": account_number}
+        )
+        if response.status_code == 200:
+            body = response.json()["body"]
+            return body if body else None
+        logger.error("=== ERROR: [Get Account Details] {}", response.text)
+        return None
+
+    @staticmethod
+    async def update_account_details(account_number):
+        body = await AsyncT24Requests.get_account_details(account_number)
+        if not body:
+            return None
+
+        account = body[0]
+        fields = {
+            "account_restricted": "postingRestrict" in account,
+            "last_updated": timezone.now(),
+        }
+        if "workingBalance" in account:
+            fields["account_balance"] = account["workingBalance"]
+        await BankAccount.objects.filter(account_number=account_number).aupdate(
+            **fields
+        )
+        return body
+
+    @staticmethod
+    async def check_balance(account_number):
+        body = await AsyncT24Requests.get_account_details(account_number)
+        if not body:
+            return False, None
+        return True, body[0].get("workingBalance", 0)
+
+    @staticmethod
+    async def get_exchange_rate():
+        response = await AsyncT24Requests._get("party/getExchangeRates")
+        if response.status_code == 200:
+            body = response.json()["body"]
+            return body if body else None
+        logger.error("=== ERROR: [Get exchange Rate] {}", response.text)
+        return None
+
+    @staticmethod
+    async def get_account_statements(account_number, start_date, end_date):
+        from t24.statements import StatementUnavailable, astatement_pages
+
+        statement = []
+        try:
+            async for entries, _ in astatement_pages(
+                account_number, start_date, end_date
+            ):
+                statement.extend(entries)
+        except StatementUnavailable:
+            return None
+        return statement
+
+    sync_account_statement = get_account_statements
+
+    @staticmethod
+    async def paperless_get_customer_info(url):
+        response = await AsyncT24Requests._get(url)
+        if response.status_code == 200:
+            body = response.json()["body"]
+            return body if body else None
+        logger.error("=== ERROR: [PAPERLESS Get Customer Info] {}", response.text)
+        return None
+
+    @staticmethod
+    async def get_loans(url):
+        response = await AsyncT24Requests._get(url)
+        if response.status_code == 200:
+            body = response.json()["body"]
+            return body if body else None
+        logger.error("=== ERROR: [GET Loans] {}", response.text)
+        return None
+
+    @staticmethod
+    async def create_funds_transfer(payload):
+        """
+        post a funds transfer; returns the status code and decoded T24 response
+        so callers can read the header/error/override blocks themselves.
+        """
+        response = await AsyncT24Requests._post("party/creategtiFundsTransfer", payload)
+        logger.info(" [FUNDS TRANSFER]: {}", response.text)
+        return response.status_code, response.json()
+
+    @staticmethod
+    async def reverse_transfer(reference_id):
+        response = await AsyncT24Requests._request(
+            "DELETE", f"party/reversegtiFundsTransfer/{reference_id}"
+        )
+        if response.status_code == 200:
+            response = response.json()
+            return response if response else None
+        logger.error("=== ERROR: [REVERSE ACCOUNT TRANSFER] {}", response.text)
+        return None
+
+    @staticmethod
+    async def _subscribe_to_alert(path, account_number, customer_id):
+        payload = {
+            "event": "",
+            "contractRef": account_number,
+            "subscribe": "YES",
+            "whatsappAlert": "YES",
+            "estatement": "YES",
+            "alertLanguage": "PT",
+            "customerId": customer_id,
+            "recordStatus": "",
+            "authoriser": "",
+            "companyCode": "",
+            "extensions": {},
+        }
+        response = await AsyncT24Requests._post(path, payload)
+        if response.status_code == 200:
+            body = response.json()["body"]
+            return body if body else None
+        logger.error("=== ERROR: [{}] {}", path, response.text)
+        return None
+
+    @staticmethod
+    async def subscribe_to_credit_alert(account_number, customer_id):
+        return await AsyncT24Requests._subscribe_to_alert(
+            "party/createAlertRequestDebit", account_number, customer_id
+        )
+
+    @staticmethod
+    async def subscribe_to_debit_alert(account_number, customer_id):
+        return await AsyncT24Requests._subscribe_to_alert(
+            "party/createAlertRequestCredit", account_number, customer_id
+        )
+
+    @staticmethod
+    async def commit_cash_deposit(body, reference):
+        response = await AsyncT24Requests._post(
+            f"party/createCashDepositLocal/{reference}", body
+        )
+        logger.info("=== t24 response === {}", response.text)
+        if response.status_code == 200:
+            return True, response.json()
+        return False, response.text
+
+    @staticmethod
+    async def commit_cash_withdrawal(body, reference):
+        response = await AsyncT24Requests._post(
+            f"party/createCashWithdrawalLocal/{reference}", body
+        )
+        logger.info("=== t24 response === {}", response.text)
+        if response.status_code == 200:
+            return True, response.json()
+        return False, response.text
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+
+ONBOARDING_OPERATIONS = ("createNewCustomer", "createGtiNewAccountCreation")
+
+
+class T24Unavailable(Exception):
+    """
+    raised when a breaker is open or a bulkhead is full
+    """
+
+
+def unavailable_body(detail):
+    return {
+        "header": {"status": "failed"},
+        "error": {"errorDetails": [{"message": detail}]},
+    }
+
+
+def unavailable_response(url, detail):
+    """
+    a 503 shaped like a T24 error so callers fall into their usual failure
+    handling instead of blowing up
+    """
+    response = requests.Response()
+    response.status_code = 503
+    response.url = url
+    response.encoding = "utf-8"
+    response.headers["Content-Type"] = "application/json"
+    response._content = json.dumps(unavailable_body(detail)).encode()
+    return response
+
+
+class CircuitBreaker:
+    """
+    per-endpoint breaker over a rolling window of recent calls.
+
+    a call counts as failed when it raises, returns a 5xx or takes longer than
+    `slow_call`. once the failure rate in the window crosses `failure_rate`
+    the breaker opens and calls fail fast for `open_for` seconds, after which
+    a single probe is let through to decide whether to close again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name,
+        failure_rate=settings.T24_BREAKER_FAILURE_RATE,
+        min_calls=settings.T24_BREAKER_MIN_CALLS,
+        window=settings.T24_BREAKER_WINDOW,
+        slow_call=settings.T24_BREAKER_SLOW_CALL,
+        open_for=settings.T24_BREAKER_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call = slow_call
+        self.open_for = open_for
+        self.state = self.CLOSED
+        self.opened_at = None
+        self._outcomes = deque(maxlen=window)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.open_for:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, success, elapsed=0.0):
+        failed = not success or elapsed > self.slow_call
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append(failed)
+            calls = len(self._outcomes)
+            if (
+                calls >= self.min_calls
+                and sum(self._outcomes) / calls >= self.failure_rate
+            ):
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def snapshot(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                "state": self.state,
+                "calls": calls,
+                "failure_rate": round(sum(self._outcomes) / calls, 2) if calls else 0,
+            }
+
+
+class Bulkhead:
+    """
+    caps concurrent in-flight calls for one class of T24 operations
+    """
+
+    def __init__(self, name, max_concurrent, wait=settings.T24_BULKHEAD_WAIT):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.wait = wait
+        self.in_flight = 0
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if not self._semaphore.acquire(timeout=self.wait):
+            raise T24Unavailable(f"T24 {self.name} bulkhead is full")
+        with self._lock:
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+        return False
+
+    def snapshot(self):
+        return {"in_flight": self.in_flight, "max_concurrent": self.max_concurrent}
+
+
+class AsyncBulkhead:
+    """
+    Bulkhead for coroutines. an asyncio.Semaphore belongs to the event loop
+    it is first used on, so every loop gets its own set, with the limits and
+    wait of the sync bulkheads
+    """
+
+    def __init__(self, name, max_concurrent, wait=settings.T24_BULKHEAD_WAIT):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.wait = wait
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def __aenter__(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.wait)
+        except asyncio.TimeoutError:
+            raise T24Unavailable(f"T24 {self.name} bulkhead is full")
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.in_flight -= 1
+        self._semaphore.release()
+        return False
+
+
+class Resilience:
+    """
+    registry of breakers and bulkheads for one process
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.breakers = {}
+        self.bulkheads = {
+            "reads": Bulkhead("reads", settings.T24_BULKHEAD_READS),
+            "postings": Bulkhead("postings", settings.T24_BULKHEAD_POSTINGS),
+            "onboarding": Bulkhead("onboarding", settings.T24_BULKHEAD_ONBOARDING),
+        }
+        # event loop -> {name: AsyncBulkhead}
+        self.async_bulkheads = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def operation(url):
+        """
+        T24 operation name of a url, e.g. getGtiAccountDetails
+        """
+        parts = [part for part in urlparse(url).path.split("/") if part]
+        if "party" in parts and parts.index("party") + 1 < len(parts):
+            return parts[parts.index("party") + 1]
+        return parts[-1] if parts else ""
+
+    @staticmethod
+    def operation_class(method, operation):
+        if operation in ONBOARDING_OPERATIONS:
+            return "onboarding"
+        if method.upper() == "GET":
+            return "reads"
+        return "postings"
+
+    def breaker(self, operation):
+        with self._lock:
+            if operation not in self.breakers:
+                self.breakers[operation] = CircuitBreaker(operation)
+            return self.breakers[operation]
+
+    def bulkhead(self, method, operation):
+        return self.bulkheads[self.operation_class(method, operation)]
+
+    def abulkhead(self, method, operation):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            bulkheads = self.async_bulkheads.get(loop)
+            if bulkheads is None:
+                bulkheads = self.async_bulkheads[loop] = {
+                    name: AsyncBulkhead(name, bulkhead.max_concurrent, bulkhead.wait)
+                    for name, bulkhead in self.bulkheads.items()
+                }
+        return bulkheads[self.operation_class(method, operation)]
+
+    def status(self):
+        in_flight = {
+            name: bulkhead.in_flight for name, bulkhead in self.bulkheads.items()
+        }
+        for bulkheads in list(self.async_bulkheads.values()):
+            for name, bulkhead in bulkheads.items():
+                in_flight[name] += bulkhead.in_flight
+        return {
+            "breakers": {
+                name: breaker.snapshot() for name, breaker in self.breakers.items()
+            },
+            # async bulkheads have the same limits, per event loop
+            "bulkheads": {
+                name: {**bulkhead.snapshot(), "in_flight": in_flight[name]}
+                for name, bulkhead in self.bulkheads.items()
+            },
+        }
+
+
+resilience = Resilience()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=resilience.reset)
@@ -0,0 +1,476 @@
+"""
+stand-in for the T24 `/party/...` api used by T24Requests and cbs/views.py.
+
+responses follow the shapes the client code parses. accounts, customers and
+statements are generated deterministically from the seed, and postings move
+money between in-memory balances so repeated reads stay consistent.
+"""
+
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+POSTING_OPERATIONS = (
+    "creategtiFundsTransfer",
+    "createNewCustomer",
+    "createGtiNewAccountCreation",
+    "createCashDepositLocal",
+    "createCashWithdrawalLocal",
+    "createFixedStandingOrder",
+    "createAlertRequestDebit",
+    "createAlertRequestCredit",
+    "reversegtiFundsTransfer",
+)
+
+
+@dataclass
+class SimulatorConfig:
+    # latency in milliseconds
+    latency_dist: str = "lognormal"
+    latency_mean: float = 80.0
+    latency_stddev: float = 40.0
+    # per operation overrides of latency_mean, e.g. {"getAccountStatement": 400}
+    operation_latency: dict = field(default_factory=dict)
+    # share of calls answered with an error
+    error_rate: float = 0.0
+    # data volumes
+    accounts_per_customer: int = 3
+    statement_entries_per_day: float = 4.0
+    loan_products: int = 12
+    seed: int = 24
+
+    def latency(self, rng: random.Random, operation: str) -> float:
+        """
+        seconds to sleep before answering `operation`
+        """
+        mean = self.operation_latency.get(operation, self.latency_mean)
+        if mean <= 0:
+            return 0.0
+        # overrides keep the configured spread relative to the mean
+        stddev = self.latency_stddev * (
+            mean / self.latency_mean if self.latency_mean else 1
+        )
+        if self.latency_dist == "fixed":
+            value = mean
+        elif self.latency_dist == "uniform":
+            value = rng.uniform(max(mean - stddev, 0), mean + stddev)
+        elif self.latency_dist == "normal":
+            value = rng.gauss(mean, stddev)
+        elif self.latency_dist == "exponential":
+            value = rng.expovariate(1 / mean)
+        else:
+            # lognormal with the requested mean and stddev
+            sigma2 = math.log(1 + (stddev / mean) ** 2)
+            value = rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        return max(value, 0.0) / 1000
+
+
+class T24Data:
+    """
+    deterministic fake core-banking data with mutable balances
+    """
+
+    CURRENCIES = (("USD", 21.5, 22.9), ("EUR", 24.0, 25.1), ("GBP", 27.8, 29.3))
+    FIRST_NAMES = ("Ana", "Joao", "Maria", "Carlos", "Ines", "Pedro", "Sofia")
+    LAST_NAMES = ("Costa", "Pires", "Neto", "Lima", "Santos", "Afonso", "Vaz")
+
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self.balances = {}
+        self.customers = {}
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def _rng(self, *key):
+        return random.Random(f"{self.config.seed}:{':'.join(map(str, key))}")
+
+    def next_sequence(self):
+        with self.lock:
+            self.sequence += 1
+            return self.sequence
+
+    def next_reference(self, prefix):
+        return f"{prefix}{date.today():%y%j}{self.next_sequence():05d}"
+
+    def customer(self, customer_number):
+        customer_number = str(customer_number)
+        if customer_number in self.customers:
+            return self.customers[customer_number]
+        rng = self._rng("customer", customer_number)
+        first, last = rng.choice(self.FIRST_NAMES), rng.choice(self.LAST_NAMES)
+        return {
+            "customerNumber": customer_number,
+            "firstName": first,
+            "lastName": last,
+            "fullName": f"{first} {last}".upper(),
+            "mobileNumber": f"2399{int(customer_number) % 1000000:06d}",
+            "dateOfBirth": date(
+                rng.randint(1960, 2004), rng.randint(1, 12), rng.randint(1, 28)
+            ).isoformat(),
+            "email": f"{first}.{last}{customer_number}@example.com".lower(),
+            "nationality": "ST",
+            "residence": "ST",
+        }
+
+    def customer_for_phone(self, phone_number):
+        digits = "".join(ch for ch in str(phone_number) if ch.isdigit())
+        return self.customer(int(digits[-6:] or 0) + 100000)
+
+    def customer_accounts(self, customer_number):
+        return [
+            self.account(f"{int(customer_number):07d}{index:03d}")
+            for index in range(self.config.accounts_per_customer)
+        ]
+
+    def account(self, account_number):
+        account_number = str(account_number)
+        rng = self._rng("account", account_number)
+        customer_number = (
+            str(int(account_number[:-3]))
+            if len(account_number) > 3 and account_number[:-3].isdigit()
+            else str(rng.randint(100000, 999999))
+        )
+        with self.lock:
+            if account_number not in self.balances:
+                self.balances[account_number] = round(rng.uniform(500, 250000), 2)
+            balance = self.balances[account_number]
+
+        customer = self.customer(customer_number)
+        account = {
+            "accountNo": account_number,
+            "accountName": customer["fullName"],
+            "accountCategory": rng.choice(("6220", "6001", "1001")),
+            "accountShortName": customer["fullName"],
+            "currency": "STN",
+            "customerNumber": customer_number,
+            "workingBalance": f"{balance:.2f}",
+            "onlineActualBalance": f"{balance:.2f}",
+            "openingDate": f"20{rng.randint(10, 24)}0{rng.randint(1, 9)}15",
+        }
+        if rng.random() < 0.02:
+            account["postingRestrict"] = "1"
+        return account
+
+    def move(self, debit_account, credit_account, amount):
+        self.account(debit_account)
+        self.account(credit_account)
+        with self.lock:
+            if self.balances[debit_account] < amount:
+                return False
+            self.balances[debit_account] = round(
+                self.balances[debit_account] - amount, 2
+            )
+            self.balances[credit_account] = round(
+                self.balances[credit_account] + amount, 2
+            )
+            return True
+
+    def statement(self, account_number, start_date, end_date):
+        try:
+            start = datetime.strptime(start_date, "%Y%m%d").date()
+            end = datetime.strptime(end_date, "%Y%m%d").date()
+        except (TypeError, ValueError):
+            end = date.today()
+            start = end - timedelta(days=30)
+
+        entries = []
+        balance = 10000.0
+        day = start
+        while day <= end:
+            rng = self._rng("statement", account_number, day)
+            count = (
+                int(rng.expovariate(1 / self.config.statement_entries_per_day))
+                if self.config.statement_entries_per_day > 0
+                else 0
+            )
+            for index in range(count):
+                amount = round(rng.uniform(5, 2500), 2)
+                is_debit = rng.random() < 0.6
+                balance += -amount if is_debit else amount
+                counterparty = (
+                    f"{rng.randint(1000000, 9999999)}{rng.randint(0, 999):03d}"
+                )
+                entries.append(
+                    {
+                        "bookingDate": f"{day:%Y%m%d}",
+                        "valueDate": f"{day:%Y%m%d}",
+                        "transactionNarration": rng.choice(
+                            ("Funds Transfer", "Bill Payment", "Cash Deposit", "ATM")
+                        ),
+                        "debitAccount": account_number if is_debit else counterparty,
+                        "creditAccount": counterparty if is_debit else account_number,
+                        "transactionRef": f"FT{day:%y%j}{index:05d}",
+                        "debitAmount": f"{amount:.2f}" if is_debit else "",
+                        "creditAmount": "" if is_debit else f"{amount:.2f}",
+                        "closingBalance": f"{balance:.2f}",
+                    }
+                )
+            day += timedelta(days=1)
+        return entries
+
+    def exchange_rates(self):
+        return [
+            {"ccy": ccy, "ccyName": ccy, "buyRate": f"{buy}", "sellRate": f"{sell}"}
+            for ccy, buy, sell in self.CURRENCIES
+        ]
+
+    def loan_products(self):
+        products = []
+        for index in range(self.config.loan_products):
+            rng = self._rng("loan", index)
+            products.append(
+                {
+                    "productId": f"LOAN.PRODUCT.{index:03d}",
+                    "loanProductGroup": rng.choice(
+                        ("PERSONAL.LOANS", "SALARY.ADVANCE", "MORTGAGE")
+                    ),
+                    "amount": f"{rng.randint(10, 500) * 1000}",
+                    "interest": f"{rng.uniform(8, 24):.2f}",
+                    "description": f"Loan product {index}",
+                    "term": f"{rng.choice((6, 12, 24, 36, 60))}M",
+                    "processingFee": f"{rng.uniform(0.5, 3):.2f}",
+                }
+            )
+        return products
+
+
+class T24SimulatorHandler(BaseHTTPRequestHandler):
+    server_version = "T24Simulator/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # helpers
+
+    def _parts(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        if "party" in parts:
+            first = parts.index("party") + 1
+            parts = parts[first:]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return (parts[0] if parts else ""), parts[1:], query
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            payload = json.loads(raw or b"{}")
+            # the client json-encodes an already encoded string
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+        except ValueError:
+            payload = {}
+        return payload.get("body", payload) if isinstance(payload, dict) else {}
+
+    def _send(self, status, payload):
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _error(self, message, status=400):
+        self._send(
+            status,
+            {
+                "header": {"status": "failed"},
+                "error": {"type": "BUSINESS", "errorDetails": [{"message": message}]},
+            },
+        )
+
+    def _success(self, body, reference=None):
+        header = {"status": "success", "transactionStatus": "Live"}
+        if reference:
+            header["id"] = reference
+        self._send(200, {"header": header, "body": body})
+
+    def _simulate(self, operation):
+        self.server.count(operation)
+        time.sleep(self.server.config.latency(self.server.rng, operation))
+        if self.server.rng.random() < self.server.config.error_rate:
+            if operation in POSTING_OPERATIONS and self.server.rng.random() < 0.5:
+                self._error("SIMULATED BUSINESS ERROR")
+            else:
+                self._send(500, {"error": "simulated upstream failure"})
+            return False
+        return True
+
+    # verbs
+
+    def do_GET(self):
+        operation, args, query = self._parts()
+        if not self._simulate(operation):
+            return
+        data = self.server.data
+
+        if operation == "getGtCustomerInfo":
+            if "customerNumber" in query:
+                body = [data.customer(query["customerNumber"])]
+            elif "mobileNumber" in query:
+                body = [data.customer_for_phone(query["mobileNumber"])]
+            else:
+                body = []
+            return self._success(body)
+
+        if operation == "getGtiAccountDetails":
+            if "accountNumber" in query:
+                body = [data.account(query["accountNumber"])]
+            elif "customerNumber" in query:
+                body = data.customer_accounts(query["customerNumber"])
+            else:
+                body = []
+            return self._success(body)
+
+        if operation == "getAccountStatement":
+            entries = data.statement(
+                query.get("accountNo", ""),
+                query.get("startDate"),
+                query.get("endDate"),
+            )
+            page_size = int(query.get("page_size") or len(entries) or 1)
+            page_start = int(query.get("page_start") or 1)
+            first, last = (page_start - 1) * page_size, page_start * page_size
+            page = entries[first:last]
+            return self._send(
+                200,
+                {
+                    "header": {
+                        "status": "success",
+                        "page_size": page_size,
+                        "page_start": page_start,
+                        "total_size": len(entries),
+                    },
+                    "body": page,
+                },
+            )
+
+        if operation == "getExchangeRates":
+            return self._success(data.exchange_rates())
+
+        if operation == "getGtiLoanInfomation":
+            return self._success(data.loan_products())
+
+        self._send(404, {"error": f"unknown operation {operation}"})
+
+    def do_POST(self):
+        operation, args, query = self._parts()
+        body = self._body()
+        if not self._simulate(operation):
+            return
+        data = self.server.data
+
+        if operation == "creategtiFundsTransfer":
+            try:
+                amount = float(body.get("debitAmount") or 0)
+            except ValueError:
+                return self._error("INVALID AMOUNT")
+            debit, credit = body.get("debitAccountId"), body.get("creditAccountId")
+            if not debit or not credit or amount <= 0:
+                return self._error("MISSING MANDATORY FIELD")
+            if not data.move(str(debit), str(credit), amount):
+                return self._send(
+                    400,
+                    {
+                        "header": {"status": "failed"},
+                        "override": {
+                            "overrideDetails": [
+                                {
+                                    "id": "AC.UNAUTH.OD",
+                                    "description": "Unauthorised overdraft",
+                                }
+                            ]
+                        },
+                    },
+                )
+            return self._success(
+                {**body, "debitAmount": f"{amount:.2f}"},
+                reference=data.next_reference("FT"),
+            )
+
+        if operation == "createNewCustomer":
+            customer_number = str(900000 + data.next_sequence())
+            data.customers[customer_number] = {
+                "customerNumber": customer_number,
+                "fullName": body.get("fullName", ""),
+                "mobileNumber": body.get("mobileNumber", ""),
+                "email": body.get("customerEmail", ""),
+            }
+            return self._success(body, reference=customer_number)
+
+        if operation == "createGtiNewAccountCreation":
+            customer_number = str(body.get("customerNo") or "0")
+            index = data.config.accounts_per_customer + data.next_sequence() % 900
+            account_number = f"{int(customer_number):07d}{index:03d}"
+            with data.lock:
+                data.balances[account_number] = 0.0
+            return self._success(
+                {
+                    "category": body.get("category", "6220"),
+                    "currency": body.get("currency", "STN"),
+                    "accountShortName": body.get("accountShortName", ""),
+                },
+                reference=account_number,
+            )
+
+        if operation in ("createCashDepositLocal", "createCashWithdrawalLocal"):
+            return self._success(body, reference=data.next_reference("TT"))
+
+        if operation in (
+            "createFixedStandingOrder",
+            "createAlertRequestDebit",
+            "createAlertRequestCredit",
+        ):
+            return self._success(body, reference=data.next_reference("SO"))
+
+        self._send(404, {"error": f"unknown operation {operation}"})
+
+    def do_DELETE(self):
+        operation, args, query = self._parts()
+        if not self._simulate(operation):
+            return
+        if operation == "reversegtiFundsTransfer":
+            return self._success({}, reference=args[0] if args else "")
+        self._send(404, {"error": f"unknown operation {operation}"})
+
+
+class T24Simulator(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: SimulatorConfig, verbose=False):
+        super().__init__(address, T24SimulatorHandler)
+        self.config = config
+        self.verbose = verbose
+        self.rng = random.Random(config.seed)
+        self.data = T24Data(config)
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+
+    def count(self, operation):
+        with self._calls_lock:
+            self.calls[operation] += 1
+
+    def reset_calls(self):
+        with self._calls_lock:
+            calls, self.calls = self.calls, Counter()
+        return calls
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start_in_thread(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,237 @@
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+import weakref
+from urllib.parse import urlencode
+
+import httpx
+import requests
+from loguru import logger
+
+from helpers.redis import get_async_redis, get_redis
+
+# decoded by the first reader, the cached content is already plain
+DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    collapses identical concurrent T24 reads into one upstream call.
+
+    callers sharing a key within the process wait on the first caller and get
+    its response. with `use_redis` the first caller across all processes also
+    takes a short redis lock and publishes the response, which waiting
+    processes pick up instead of calling T24 themselves.
+    """
+
+    LOCK_PREFIX = "t24:singleflight:lock"
+    RESULT_PREFIX = "t24:singleflight:result"
+    POLL_INTERVAL = 0.02
+
+    def __init__(self, use_redis: bool = False, wait: float = 10.0):
+        self.use_redis = use_redis
+        self.wait = wait
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    @staticmethod
+    def make_key(method, url, params=None, headers=None):
+        # built by hand, preparing the request fails on a url without a scheme
+        items = params.items() if isinstance(params, dict) else params or []
+        query = urlencode(sorted(items, key=lambda item: str(item[0])), doseq=True)
+        company = (headers or {}).get("companyId", "")
+        return hashlib.sha1(
+            f"{method.upper()} {url}?{query}|{company}".encode()
+        ).hexdigest()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._redis_do(key, fn) if self.use_redis else fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _redis_do(self, key, fn):
+        lock_key = f"{self.LOCK_PREFIX}:{key}"
+        result_key = f"{self.RESULT_PREFIX}:{key}"
+        token = uuid.uuid4().hex
+        wait_ms = int(self.wait * 1000)
+
+        try:
+            client = get_redis()
+            leader = client.set(lock_key, token, nx=True, px=wait_ms)
+        except Exception as e:
+            logger.warning("=== [T24 singleflight] redis unavailable: {}", e)
+            return fn()
+
+        if leader:
+            try:
+                client.delete(result_key)
+                response = fn()
+                client.set(result_key, self._dump(response), px=wait_ms)
+                return response
+            finally:
+                if client.get(lock_key) == token.encode():
+                    client.delete(lock_key)
+
+        deadline = time.monotonic() + self.wait
+        while time.monotonic() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+            payload = client.get(result_key)
+            if payload is not None:
+                return self._load(payload)
+            if not client.exists(lock_key):
+                # leader failed without publishing a result
+                break
+        return fn()
+
+    @staticmethod
+    def _dump(response: requests.Response):
+        return json.dumps(
+            {
+                "status_code": response.status_code,
+                "url": response.url,
+                "encoding": response.encoding,
+                "headers": dict(response.headers),
+                "content": base64.b64encode(response.content).decode(),
+            }
+        )
+
+    @staticmethod
+    def _load(payload):
+        data = json.loads(payload)
+        response = requests.Response()
+        response.status_code = data["status_code"]
+        response.url = data["url"]
+        response.encoding = data["encoding"]
+        response.headers.update(data["headers"])
+        response._content = base64.b64decode(data["content"])
+        return response
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight for AsyncT24Requests.
+
+    calls in flight are kept per event loop, a task cannot be awaited from
+    another one. with `use_redis` it shares the lock and result keys of
+    SingleFlight, so sync and async workers wait on each other's calls.
+    """
+
+    POLL_INTERVAL = SingleFlight.POLL_INTERVAL
+
+    def __init__(self, use_redis: bool = False, wait: float = 10.0):
+        self.use_redis = use_redis
+        self.wait = wait
+        self._calls = weakref.WeakKeyDictionary()
+
+    def reset(self):
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, fn):
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        call = calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(
+                self._redis_do(key, fn) if self.use_redis else fn()
+            )
+            calls[key] = call
+            call.add_done_callback(lambda done: calls.pop(key, None))
+        # a cancelled caller must not cancel the call the others wait on
+        return await asyncio.shield(call)
+
+    async def _redis_do(self, key, fn):
+        lock_key = f"{SingleFlight.LOCK_PREFIX}:{key}"
+        result_key = f"{SingleFlight.RESULT_PREFIX}:{key}"
+        token = uuid.uuid4().hex
+        wait_ms = int(self.wait * 1000)
+
+        try:
+            client = get_async_redis()
+            leader = await client.set(lock_key, token, nx=True, px=wait_ms)
+        except Exception as e:
+            logger.warning("=== [T24 singleflight] redis unavailable: {}", e)
+            return await fn()
+
+        if leader:
+            try:
+                await client.delete(result_key)
+                response = await fn()
+                await client.set(result_key, self._dump(response), px=wait_ms)
+                return response
+            finally:
+                if await client.get(lock_key) == token.encode():
+                    await client.delete(lock_key)
+
+        deadline = time.monotonic() + self.wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            payload = await client.get(result_key)
+            if payload is not None:
+                return self._load(payload)
+            if not await client.exists(lock_key):
+                # leader failed without publishing a result
+                break
+        return await fn()
+
+    @staticmethod
+    def _dump(response: httpx.Response):
+        return json.dumps(
+            {
+                "status_code": response.status_code,
+                "url": str(response.url),
+                "encoding": response.encoding,
+                "headers": dict(response.headers),
+                "content": base64.b64encode(response.content).decode(),
+            }
+        )
+
+    @staticmethod
+    def _load(payload):
+        data = json.loads(payload)
+        response = httpx.Response(
+            data["status_code"],
+            headers={
+                name: value
+                for name, value in data["headers"].items()
+                if name.lower() not in DROPPED_HEADERS
+            },
+            content=base64.b64decode(data["content"]),
+            request=httpx.Request("GET", data["url"]),
+        )
+        if data["encoding"]:
+            response.encoding = data["encoding"]
+        return response
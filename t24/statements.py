@@ -0,0 +1,191 @@
+"""
+paged reads of T24 account statements.
+
+getAccountStatement takes page_size and page_start and reports total_size in
+its header. the readers below yield a statement one page at a time while the
+next `prefetch` pages are already being fetched, so a caller holds at most
+prefetch + 1 pages whatever the length of the range. when T24 leaves out
+total_size the readers stop at the first short page.
+
+a page that cannot be fetched raises StatementUnavailable, whether T24
+answered with an error, timed out, could not be reached or sent a body that
+is not JSON; a statement with a hole in it is never returned.
+"""
+
+import asyncio
+import contextvars
+from collections import deque
+
+import httpx
+import requests
+from django.conf import settings
+from loguru import logger
+
+from t24.async_requests import AsyncT24Requests
+from t24.t24_requests import get_refresh_executor
+from t24.transport import t24_http
+
+PATH = "party/getAccountStatement"
+headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
+
+
+class StatementUnavailable(Exception):
+    """
+    raised when a page of a statement cannot be fetched
+    """
+
+
+def _params(account_number, start_date, end_date, page_start, page_size):
+    return {
+        "accountNo": account_number,
+        "startDate": start_date,
+        "endDate": end_date,
+        "page_size": page_size,
+        "page_start": page_start,
+    }
+
+
+def _parse(response, page_start):
+    """
+    (entries, total_size or None) of a page response
+    """
+    if response.status_code != 200:
+        logger.error(
+            "=== ERROR: [ACCOUNT STATEMENT] page {}: {}", page_start, response.text
+        )
+        raise StatementUnavailable(f"Failed to retrieve statement page {page_start}")
+    try:
+        data = response.json()
+    except ValueError as e:
+        logger.error("=== ERROR: [ACCOUNT STATEMENT] page {}: {}", page_start, e)
+        raise StatementUnavailable(f"Failed to read statement page {page_start}") from e
+    total_size = (data.get("header") or {}).get("total_size")
+    return data.get("body") or [], int(total_size) if total_size else None
+
+
+def _last_page(total_size, page_size):
+    if total_size is None:
+        return None
+    return max(-(-total_size // page_size), 1)
+
+
+def _done(page_start, entries, last_page, page_size):
+    if last_page is not None:
+        return page_start >= last_page
+    # a short page, or T24 ignoring page_size and sending everything at once
+    return len(entries) != page_size
+
+
+def statement_pages(
+    account_number,
+    start_date,
+    end_date,
+    page_size=settings.T24_STATEMENT_PAGE_SIZE,
+    prefetch=settings.T24_STATEMENT_PREFETCH,
+):
+    """
+    yields (entries, total_size or None) for each page, in order. dates are
+    YYYYMMDD strings
+    """
+    url = f"{settings.T24_BASE_URL}/{PATH}"
+
+    def fetch(page_start):
+        try:
+            response = t24_http.get(
+                url,
+                headers=headers,
+                params=_params(
+                    account_number, start_date, end_date, page_start, page_size
+                ),
+            )
+        except requests.RequestException as e:
+            logger.error("=== ERROR: [ACCOUNT STATEMENT] page {}: {}", page_start, e)
+            raise StatementUnavailable(
+                f"Failed to retrieve statement page {page_start}"
+            ) from e
+        return _parse(response, page_start)
+
+    executor = get_refresh_executor()
+    entries, total_size = fetch(1)
+    last_page = _last_page(total_size, page_size)
+    page_start, next_page = 1, 2
+    pending = deque()
+    try:
+        while True:
+            done = _done(page_start, entries, last_page, page_size)
+            # keep the next pages in flight while the caller works on this one
+            while (
+                not done
+                and len(pending) < prefetch
+                and (last_page is None or next_page <= last_page)
+            ):
+                pending.append(
+                    executor.submit(contextvars.copy_context().run, fetch, next_page)
+                )
+                next_page += 1
+            yield entries, total_size
+            if done:
+                break
+            page_start += 1
+            entries, _ = pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def iter_statement(account_number, start_date, end_date, **kwargs):
+    """
+    the entries of a statement, one at a time
+    """
+    for entries, _ in statement_pages(account_number, start_date, end_date, **kwargs):
+        yield from entries
+
+
+async def astatement_pages(
+    account_number,
+    start_date,
+    end_date,
+    page_size=settings.T24_STATEMENT_PAGE_SIZE,
+    prefetch=settings.T24_STATEMENT_PREFETCH,
+):
+    """
+    asyncio counterpart of statement_pages
+    """
+
+    async def fetch(page_start):
+        try:
+            response = await AsyncT24Requests._get(
+                PATH,
+                params=_params(
+                    account_number, start_date, end_date, page_start, page_size
+                ),
+            )
+        except httpx.HTTPError as e:
+            logger.error("=== ERROR: [ACCOUNT STATEMENT] page {}: {}", page_start, e)
+            raise StatementUnavailable(
+                f"Failed to retrieve statement page {page_start}"
+            ) from e
+        return _parse(response, page_start)
+
+    entries, total_size = await fetch(1)
+    last_page = _last_page(total_size, page_size)
+    page_start, next_page = 1, 2
+    pending = deque()
+    try:
+        while True:
+            done = _done(page_start, entries, last_page, page_size)
+            while (
+                not done
+                and len(pending) < prefetch
+                and (last_page is None or next_page <= last_page)
+            ):
+                pending.append(asyncio.ensure_future(fetch(next_page)))
+                next_page += 1
+            yield entries, total_size
+            if done:
+                break
+            page_start += 1
+            entries, _ = await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -1,6 +1,10 @@
 from django.conf import settings
-import requests
+from t24.transport import t24_http
+from concurrent.futures import ThreadPoolExecutor, wait
+import contextvars
 import json
+import os
+import time
 
 # from cbs import models
 from django.utils import timezone
@@ -8,12 +12,32 @@ from datatable import models as data_tables
 from unidecode import unidecode
 from loguru import logger
 from cbs.models import BankAccount
+from cbs import balance_cache
+from t24.resilience import CircuitBreaker, resilience
 
 credentials = settings.T24_CREDENTIALS
 base_url = settings.T24_BASE_URL
 
 models = None
 
+_refresh_executor = None
+_refresh_executor_pid = None
+
+
+def get_refresh_executor():
+    """
+    thread pool used to fan out T24 reads; rebuilt after a fork since the
+    parent's worker threads do not exist in the child.
+    """
+    global _refresh_executor, _refresh_executor_pid
+    if _refresh_executor is None or _refresh_executor_pid != os.getpid():
+        _refresh_executor = ThreadPoolExecutor(
+            max_workers=settings.T24_POOL_SIZE,
+            thread_name_prefix="t24-refresh",
+        )
+        _refresh_executor_pid = os.getpid()
+    return _refresh_executor
+
 
 class T24Requests:
     """
@@ -25,12 +49,25 @@ class T24Requests:
         url = f"{base_url}/party/getGtCustomerInfo"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
         params = {"customerNumber": str(208)}
-        response = requests.get(url, headers=headers, params=params)
+        response = t24_http.get(url, headers=headers, params=params)
 
         if response.status_code == 200:
             return True
         return False
 
+    @staticmethod
+    def health_status():
+        """
+        breaker and bulkhead state of this process. T24 counts as reachable
+        while none of its breakers is open, so polling this never calls T24
+        """
+        status = resilience.status()
+        reachable = all(
+            breaker["state"] != CircuitBreaker.OPEN
+            for breaker in status["breakers"].values()
+        )
+        return {"reachable": reachable, **status}
+
     @staticmethod
     def verify_phone_number(phone_number):
         """
@@ -39,7 +76,7 @@ class T24Requests:
         url = f"{base_url}/party/getGtCustomerInfo"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
         params = {"mobileNumber": phone_number}
-        response = requests.get(url, headers=headers, params=params)
+        response = t24_http.get(url, headers=headers, params=params)
 
         if response.status_code == 200:
             response = json.loads(response.text)
@@ -55,7 +92,7 @@ class T24Requests:
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
         formated_phone_number = str(phone_number).replace("+", "")
         params = {"mobileNumber": str(formated_phone_number)}
-        response = requests.get(url, headers=headers, params=params)
+        response = t24_http.get(url, headers=headers, params=params)
 
         if response.status_code == 200:
             logger.info("==== response is 200")
@@ -71,7 +108,7 @@ class T24Requests:
         url = f"{base_url}/party/getGtiAccountDetails"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
         params = {"customerNumber": customer_number}
-        response = requests.get(url, headers=headers, params=params)
+        response = t24_http.get(url, headers=headers, params=params)
 
         if response.status_code == 200:
             response = json.loads(response.text)
@@ -85,7 +122,7 @@ class T24Requests:
         url = f"{base_url}/party/getGtiAccountDetails"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
         params = {"accountNumber": account_number}
-        response = requests.get(url, headers=headers, params=params)
+        response = t24_http.get(url, headers=headers, params=params)
 
         if response.status_code == 200:
             response = json.loads(response.text)
@@ -99,7 +136,7 @@ class T24Requests:
         url = f"{base_url}/party/getGtiAccountDetails"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
         params = {"accountNumber": account_number}
-        response = requests.get(url, headers=headers, params=params)
+        response = t24_http.get(url, headers=headers, params=params)
 
         if response.status_code == 200:
             response = json.loads(response.text)
@@ -128,12 +165,87 @@ class T24Requests:
         logger.error("=== ERROR: [Update Account Detail] ", response.text)
         return None
 
+    @staticmethod
+    def bulk_update_account_details(
+        accounts, customer_number=None, deadline=settings.T24_REFRESH_DEADLINE
+    ):
+        """
+        refresh balance and restriction of `accounts` concurrently and save
+        them with a single bulk_update.
+
+        with a customer number all accounts come back in one call, any account
+        missing from that response is fetched on its own. whatever has not
+        answered by `deadline` seconds keeps its last known balance.
+        """
+        accounts = list(accounts)
+        if not accounts:
+            return accounts
+
+        executor = get_refresh_executor()
+        expires_at = time.monotonic() + deadline
+        details = {}
+
+        if customer_number:
+            # run in a copy of the caller's context so request metrics see the calls
+            future = executor.submit(
+                contextvars.copy_context().run,
+                T24Requests.get_customer_accounts,
+                customer_number,
+            )
+            wait([future], timeout=deadline)
+            if future.done() and not future.exception():
+                for account in future.result() or []:
+                    if "accountNo" in account:
+                        details[account["accountNo"]] = account
+
+        missing = {obj.account_number for obj in accounts} - set(details)
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run,
+                T24Requests.get_account_details,
+                account_number,
+            ): account_number
+            for account_number in missing
+        }
+        done, not_done = wait(futures, timeout=max(expires_at - time.monotonic(), 0))
+        for future in done:
+            if future.exception():
+                logger.error("=== ERROR: [Bulk Account Refresh] {}", future.exception())
+                continue
+            body = future.result()
+            if body:
+                details[futures[future]] = body[0]
+        if not_done:
+            logger.warning(
+                "=== [Bulk Account Refresh] {} account(s) past deadline",
+                len(not_done),
+            )
+
+        balance_cache.store_many(details)
+
+        updated = []
+        now = timezone.now()
+        for obj in accounts:
+            account = details.get(obj.account_number)
+            if account is None:
+                continue
+            obj.account_balance = account.get("workingBalance", obj.account_balance)
+            obj.account_restricted = "postingRestrict" in account
+            obj.last_updated = now
+            updated.append(obj)
+
+        if updated:
+            BankAccount.objects.bulk_update(
+                updated, ["account_balance", "account_restricted", "last_updated"]
+            )
+        return accounts
+
     # @staticmethod
     # def get_customer_accounts(customerNumber):
     #     url = f"{base_url}/party/getGtiAccountDetails"
     #     headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
     #     params = {"customerNumber": customerNumber}
-    #     response = requests.get(url, headers=headers, params=params)
+    #     response = t24_http.get(url, headers=headers, params=params)
 
     #     if response.status_code == 200:
     #         response = json.loads(response.text)
@@ -151,7 +263,7 @@ class T24Requests:
         url = f"{base_url}/party/getGtiAccountDetails"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
         params = {"accountNumber": account_number}
-        response = requests.get(url, headers=headers, params=params)
+        response = t24_http.get(url, headers=headers, params=params)
 
         if response.status_code == 200:
             response = json.loads(response.text)
@@ -208,7 +320,7 @@ class T24Requests:
             }
             logger.info("==== user payload for account ====")
             logger.info(payload)
-            response = requests.post(
+            response = t24_http.post(
                 url,
                 headers=headers,
                 json=json.dumps({"body": payload}),
@@ -239,7 +351,7 @@ class T24Requests:
                 }
                 logger.info("====== account payload ====")
                 logger.info(payload)
-                account_request_response = requests.post(
+                account_request_response = t24_http.post(
                     account_url, headers=headers, json=json.dumps({"body": payload})
                 )
                 logger.info("====== account response ====")
@@ -293,7 +405,7 @@ class T24Requests:
     def get_exchange_rate():
         url = f"{base_url}/party/getExchangeRates"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-        response = requests.get(url, headers=headers)
+        response = t24_http.get(url, headers=headers)
         if response.status_code == 200:
             response = json.loads(response.text)
             body = response["body"]
@@ -358,7 +470,7 @@ class T24Requests:
             "statementReference": standing_order.purpose_of_transaction,
             "paymentDetails": standing_order.purpose_of_transaction,
         }
-        response = requests.post(
+        response = t24_http.post(
             url, headers=headers, json=json.dumps({"body": payload})
         )
 
@@ -389,7 +501,7 @@ class T24Requests:
             "extensions": {},
         }
 
-        account_request_response = requests.post(
+        account_request_response = t24_http.post(
             account_url, headers=headers, json=json.dumps({"body": payload})
         )
         if account_request_response.status_code == 200:
@@ -433,7 +545,7 @@ class T24Requests:
             "companyCode": "",
             "extensions": {},
         }
-        response = requests.post(
+        response = t24_http.post(
             account_url, headers=headers, json=json.dumps({"body": payload})
         )
         if response.status_code == 200:
@@ -461,7 +573,7 @@ class T24Requests:
             "companyCode": "",
             "extensions": {},
         }
-        response = requests.post(
+        response = t24_http.post(
             account_url, headers=headers, json=json.dumps({"body": payload})
         )
         if response.status_code == 200:
@@ -473,16 +585,16 @@ class T24Requests:
 
     @staticmethod
     def get_account_statements(account_number, start_date, end_date):
-        account_url = f"{base_url}/party/getAccountStatement?accountNo={account_number}&startDate={start_date}&endDate={end_date}"
-        headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
+        """
+        the whole statement as a list; prefer t24.statements.iter_statement
+        for long ranges
+        """
+        from t24.statements import StatementUnavailable, iter_statement
 
-        response = requests.get(account_url, headers=headers)
-        if response.status_code == 200:
-            alert_response = json.loads(response.text)
-            body = alert_response["body"]
-            return body if body else []
-        logger.error("=== ERROR: [ACCOUNT STATEMENT] ", response.text)
-        return None
+        try:
+            return list(iter_statement(account_number, start_date, end_date))
+        except StatementUnavailable:
+            return None
 
     @staticmethod
     def get_customer_dob_phone(phone_number):
@@ -490,7 +602,7 @@ class T24Requests:
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
         formated_phone_number = str(phone_number).replace("+", "")
         params = {"mobileNumber": str(formated_phone_number)}
-        response = requests.get(url, headers=headers, params=params)
+        response = t24_http.get(url, headers=headers, params=params)
 
         if response.status_code == 200:
             logger.info("==== response is 200")
@@ -560,7 +672,7 @@ class T24Requests:
             "statementReference": standing_order.purpose_of_transaction,
             "paymentDetails": standing_order.purpose_of_transaction,
         }
-        response = requests.post(
+        response = t24_http.post(
             url, headers=headers, json=json.dumps({"body": payload})
         )
 
@@ -575,7 +687,7 @@ class T24Requests:
     def paperless_get_customer_info(url):
         url = f"{base_url}/{url}"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-        response = requests.get(url, headers=headers)
+        response = t24_http.get(url, headers=headers)
 
         if response.status_code == 200:
             logger.info("=== response is 200")
@@ -589,7 +701,7 @@ class T24Requests:
     def get_loans(url):
         url = f"{base_url}/{url}"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-        response = requests.get(url, headers=headers)
+        response = t24_http.get(url, headers=headers)
         if response.status_code == 200:
             response = json.loads(response.text)
             body = response["body"]
@@ -601,7 +713,7 @@ class T24Requests:
     def reverse_transfer(reference_id):
         url = f"{base_url}/party/reversegtiFundsTransfer/{reference_id}"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-        response = requests.delete(url, headers=headers)
+        response = t24_http.delete(url, headers=headers)
 
         if response.status_code == 200:
             response = json.loads(response.text)
@@ -613,7 +725,7 @@ class T24Requests:
     def commit_cash_deposit(body, reference):
         url = f"{base_url}/party/createCashDepositLocal/{reference}"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-        response = requests.post(url, headers=headers, json=json.dumps({"body": body}))
+        response = t24_http.post(url, headers=headers, json=json.dumps({"body": body}))
 
         logger.info("=== icoming body ===")
         logger.info(body)
@@ -631,7 +743,7 @@ class T24Requests:
     def commit_cash_withdrawal(body, reference):
         url = f"{base_url}/party/createCashWithdrawalLocal/{reference}"
         headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-        response = requests.post(url, headers=headers, json=json.dumps({"body": body}))
+        response = t24_http.post(url, headers=headers, json=json.dumps({"body": body}))
 
         logger.info("=== t24 response ===")
         logger.info(response.text)
@@ -644,13 +756,4 @@ class T24Requests:
 
     @staticmethod
     def sync_account_statement(account_number, start_date, end_date):
-        account_url = f"{base_url}/party/getAccountStatement?accountNo={account_number}&startDate={start_date}&endDate={end_date}&page_size=200"
-        headers = {"Content-Type": "application/json", "companyId": "ST0010002"}
-
-        response = requests.get(account_url, headers=headers)
-        if response.status_code == 200:
-            alert_response = json.loads(response.text)
-            body = alert_response["body"]
-            return body if body else []
-        logger.error("=== ERROR: [ACCOUNT STATEMENT] ", response.text)
-        return None
+        return T24Requests.get_account_statements(account_number, start_date, end_date)
@@ -0,0 +1,119 @@
+import os
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from helpers import metrics
+from t24.resilience import T24Unavailable, resilience, unavailable_response
+from t24.singleflight import SingleFlight
+
+
+class T24Session(requests.Session):
+    """
+    pooled keep-alive session used for every call made to T24.
+
+    one instance is shared per process; the connection pool is dropped in
+    forked children (celery prefork, gunicorn preload) so sockets are never
+    shared across processes.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = settings.T24_POOL_SIZE,
+        connect_timeout: float = settings.T24_CONNECT_TIMEOUT,
+        read_timeout: float = settings.T24_READ_TIMEOUT,
+        keep_alive: bool = settings.T24_KEEP_ALIVE,
+        singleflight: SingleFlight | None = None,
+    ):
+        super().__init__()
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.keep_alive = keep_alive
+        self.singleflight = singleflight
+        self._mount_adapters()
+
+        if not keep_alive:
+            self.headers["Connection"] = "close"
+
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._mount_adapters()
+        if self.singleflight is not None:
+            self.singleflight.reset()
+
+    def _mount_adapters(self):
+        for prefix in ("https://", "http://"):
+            adapter = self.adapters.get(prefix)
+            if adapter is not None:
+                adapter.close()
+            self.mount(
+                prefix,
+                HTTPAdapter(
+                    pool_connections=self.pool_size,
+                    pool_maxsize=self.pool_size,
+                    pool_block=False,
+                ),
+            )
+
+    def request(self, method, url, *args, **kwargs):
+        # never let a hung T24 endpoint hold a worker forever
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+
+        started = time.perf_counter()
+        try:
+            return self._request(method, url, *args, **kwargs)
+        finally:
+            metrics.record_t24(resilience.operation(url), time.perf_counter() - started)
+
+    def _request(self, method, url, *args, **kwargs):
+        if self.singleflight is None or method.upper() != "GET":
+            return self._guarded_request(method, url, *args, **kwargs)
+
+        # identical reads in flight share one upstream call
+        key = SingleFlight.make_key(
+            method, url, kwargs.get("params"), kwargs.get("headers")
+        )
+        return self.singleflight.do(
+            key, lambda: self._guarded_request(method, url, *args, **kwargs)
+        )
+
+    def _guarded_request(self, method, url, *args, **kwargs):
+        """
+        the upstream call, behind the operation's bulkhead and breaker
+        """
+        operation = resilience.operation(url)
+        breaker = resilience.breaker(operation)
+        try:
+            with resilience.bulkhead(method, operation):
+                if not breaker.allow():
+                    return unavailable_response(
+                        url, f"Core banking {operation} is unavailable"
+                    )
+
+                started = time.monotonic()
+                try:
+                    response = super().request(method, url, *args, **kwargs)
+                except Exception:
+                    breaker.record(False, time.monotonic() - started)
+                    raise
+                breaker.record(response.status_code < 500, time.monotonic() - started)
+                return response
+        except T24Unavailable as e:
+            return unavailable_response(url, str(e))
+
+
+t24_http = T24Session(
+    singleflight=(
+        SingleFlight(
+            use_redis=settings.T24_SINGLEFLIGHT_REDIS,
+            wait=settings.T24_READ_TIMEOUT,
+        )
+        if settings.T24_SINGLEFLIGHT
+        else None
+    )
+)